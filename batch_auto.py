@@ -0,0 +1,89 @@
+#! /usr/bin/python3
+import sys
+import json
+import time
+import argparse
+
+import plugin_engine
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            if path.endswith(".yaml") or path.endswith(".yml"):
+                try:
+                    import yaml
+                except ImportError:
+                    print("    PyYAML is required for YAML manifests (pip3 install pyyaml), or use a JSON manifest")
+                    return False
+                manifest=yaml.safe_load(f)
+            else:
+                manifest=json.load(f)
+    except Exception as e:
+        print(f"    Unable to read manifest {path} : {str(e)}")
+        return False
+
+    if isinstance(manifest, list):
+        manifest={"targets": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("targets"), list):
+        print(f"    Manifest {path} must be a list of targets or contain a \"targets\" list")
+        return False
+    return manifest
+
+
+def build_targets(manifest):
+    targets=[]
+    names=set()
+    defaults=manifest.get("defaults") or {}
+    for index, entry in enumerate(manifest["targets"]):
+        entry=dict(defaults, **entry)
+        backend_name=plugin_engine.backend_key(entry.pop("backend", ""))
+        backend=plugin_engine.load_backend(backend_name)
+        if not backend:
+            print(f"    Target #{index+1}: unknown backend \"{backend_name}\" (expected one of {', '.join(plugin_engine.BACKEND_MODULES)})")
+            return False
+
+        name=str(entry.pop("name", None) or f"{backend.name}-{index+1}")
+        if name in names:
+            print(f"    Target #{index+1}: duplicate target name \"{name}\"")
+            return False
+        names.add(name)
+
+        args, missing=backend.build_args(entry)
+        if missing:
+            print(f"    Target \"{name}\": missing {', '.join(missing)}")
+            return False
+        # Targets of the same backend share one plugin directory, each as its own instance section named after
+        # its endpoint, as the interactive scripts name it, unless the entry gives an "instance"
+        targets.append(plugin_engine.Target(name, backend, args))
+    return targets
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Install Site24x7 database plugins for every target listed in a YAML/JSON manifest, across any mix of backends")
+    parser.add_argument('manifest', help='path to the YAML or JSON manifest of targets')
+    parser.add_argument('--workers', help='number of targets installed concurrently', type=int, default=None)
+    plugin_engine.add_engine_arguments(parser)
+
+    args=parser.parse_args()
+
+    manifest=load_manifest(args.manifest)
+    if not manifest: sys.exit(2)
+    targets=build_targets(manifest)
+    if not targets: print("No targets to install"); sys.exit(2)
+
+    workers=args.workers or int(manifest.get("workers", 8))
+    engine=plugin_engine.Engine(
+        agent_path=manifest.get("agent_path", plugin_engine.AGENT_PATH),
+        workers=max(1, workers),
+        validation_workers=int(manifest.get("validation_workers", 4)),
+        **plugin_engine.engine_options(args, manifest)
+    )
+    start=time.monotonic()
+    try:
+        results=engine.install_all(targets)
+    finally:
+        engine.close()
+    plugin_engine.print_report(targets, results, time.monotonic()-start)
+
+    sys.exit(0 if all(status for status, duration in results.values()) else 1)
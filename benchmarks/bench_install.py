@@ -0,0 +1,375 @@
+#! /usr/bin/python3
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import argparse
+import threading
+import contextlib
+import subprocess
+import http.server
+
+BENCH_DIR=os.path.dirname(os.path.abspath(__file__))
+REPO_DIR=os.path.dirname(BENCH_DIR)
+STUBS_DIR=os.path.join(BENCH_DIR, "stubs")
+
+# The stub drivers (and their dist-info) must shadow any real psycopg2/pymongo/oracledb
+sys.path[:0]=[REPO_DIR, STUBS_DIR]
+
+import plugin_engine
+import plugin_downloader
+import plugin_validation
+
+
+HISTORY_FILE=os.path.join(BENCH_DIR, "history.jsonl")
+
+BACKEND_OPTIONS={
+    "postgres": {"superuser": "bench", "superpass": "bench", "password": "bench"},
+    "mongodb": {"admin_username": "bench", "admin_password": "bench", "site24x7_pass": "bench"},
+    "oracle": {"sysusername": "bench", "syspassword": "bench", "password": "bench", "sid": "BENCH", "oracle_home": "/tmp"},
+}
+
+PLUGIN_TEMPLATE='''#! /usr/bin/python3
+import json
+import argparse
+
+{padding}
+
+class Plugin:
+
+    def __init__(self, args):
+        self.args=args
+
+    def metricCollector(self):
+        return {{"plugin_version": 1, "heartbeat_required": "true", "status": 1}}
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser()
+    args, extras=parser.parse_known_args()
+    print(json.dumps(Plugin(args).metricCollector()))
+'''
+
+FAKE_PIP='''#! /bin/sh
+sleep {latency}
+exit 0
+'''
+
+
+def plugin_source(size_kb):
+    padding=[]
+    length=0
+    while length < size_kb*1024:
+        line=f"# padding line {len(padding):08d} " + "x"*40
+        padding.append(line)
+        length+=len(line)+1
+    return PLUGIN_TEMPLATE.format(padding="\n".join(padding))
+
+
+class PluginFiles:
+
+    def __init__(self, size_kb):
+        self.files={}
+        for name in BACKEND_OPTIONS:
+            backend=plugin_engine.load_backend(name)
+            for filename in backend.plugin_files():
+                if filename.endswith(".py"):
+                    body=plugin_source(size_kb).encode()
+                else:
+                    body=f"[{backend.config_section}]\n".encode()
+                self.files[f"/{backend.plugin_name}/{filename}"]=(body, '"'+hashlib.sha256(body).hexdigest()[:16]+'"')
+
+
+def handler_class(files, latency, bandwidth):
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version="HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_HEAD(self):
+            self.do_GET(head=True)
+
+        def do_GET(self, head=False):
+            if latency:
+                time.sleep(latency)
+            if self.path not in files.files:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body, etag=files.files[self.path]
+            if self.headers.get("If-None-Match")==etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if head:
+                return
+            chunk_size=16*1024
+            for offset in range(0, len(body), chunk_size):
+                chunk=body[offset:offset+chunk_size]
+                self.wfile.write(chunk)
+                if bandwidth:
+                    time.sleep(len(chunk)/bandwidth)
+
+    return Handler
+
+
+@contextlib.contextmanager
+def plugin_server(files, latency, bandwidth):
+    server=http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler_class(files, latency, bandwidth))
+    server.daemon_threads=True
+    thread=threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Accepts and drops connections, so the preflight TCP check of the database endpoints passes
+@contextlib.contextmanager
+def database_listener():
+    listener=socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(64)
+
+    def accept():
+        while True:
+            try:
+                connection, address=listener.accept()
+            except OSError:
+                return
+            connection.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    try:
+        yield listener.getsockname()[1]
+    finally:
+        listener.close()
+
+
+def make_agent(root):
+    agent_path=os.path.join(root, "monagent/")
+    for directory in ("temp/", "plugins/"):
+        os.makedirs(agent_path+directory, exist_ok=True)
+    return agent_path
+
+
+def make_fake_pip(root, latency):
+    bin_dir=os.path.join(root, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    with open(os.path.join(bin_dir, "pip3"), "w") as f:
+        f.write(FAKE_PIP.format(latency=latency))
+    os.chmod(os.path.join(bin_dir, "pip3"), 0o755)
+    return bin_dir
+
+
+def run_once(backend, args, agent_path, keep_cache):
+    if keep_cache:
+        shutil.rmtree(agent_path+"plugins/"+backend.plugin_name, ignore_errors=True)
+        shutil.rmtree(agent_path+"temp/plugins/", ignore_errors=True)
+    else:
+        shutil.rmtree(agent_path, ignore_errors=True)
+        make_agent(os.path.dirname(os.path.dirname(agent_path)))
+
+    output=io.StringIO()
+    start=time.monotonic()
+    with contextlib.redirect_stdout(output):
+        status=plugin_engine.initiate(backend, args, interactive=False, agent_path=agent_path)
+    total=time.monotonic()-start
+    # initiate() leaves keep-alive connections open, close them so every run starts cold
+    plugin_downloader.shared_downloader().close()
+
+    if not status:
+        print(output.getvalue())
+        return None
+    with open(agent_path+"temp/plugin_install_metrics.json") as f:
+        install=json.load(f)["targets"][0]
+    steps=dict((step["step"], step["seconds"]) for step in install["steps"])
+    return total, steps
+
+
+def summarize(samples):
+    return {
+        "p50": plugin_validation.percentile(samples, 0.50),
+        "p95": plugin_validation.percentile(samples, 0.95),
+    }
+
+
+def bench_backend(name, root, config, port):
+    backend=plugin_engine.load_backend(name)
+    args, missing=backend.build_args(dict(BACKEND_OPTIONS[name], host="127.0.0.1", port=port))
+    agent_path=make_agent(os.path.join(root, name))
+
+    totals=[]
+    steps={}
+    for run in range(config["warmup"]+config["runs"]):
+        sample=run_once(backend, args, agent_path, config["warm"])
+        if not sample:
+            print(f"    {name} install failed on run {run+1}")
+            return False
+        if run < config["warmup"]:
+            continue
+        totals.append(sample[0])
+        for step, seconds in sample[1].items():
+            steps.setdefault(step, []).append(seconds)
+
+    return {
+        "total": summarize(totals),
+        "steps": dict((step, summarize(samples)) for step, samples in steps.items()),
+    }
+
+
+def current_commit():
+    try:
+        commit=subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout.decode().strip()
+        dirty=bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.strip())
+    except Exception:
+        return None, False
+    return commit, dirty
+
+
+def load_history(path):
+    records=[]
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except (OSError, ValueError):
+        pass
+    return records
+
+
+# Uncommitted changes are compared with a clean run of the same commit, a clean run with the previous commit
+def baseline(records, config, commit, dirty):
+    for record in reversed(records):
+        if record.get("config")!=config or record.get("dirty"):
+            continue
+        if record.get("commit")!=commit or dirty:
+            return record
+    return None
+
+
+def regressions(results, previous, threshold, floor):
+    found=[]
+    for name, result in results.items():
+        before=previous["results"].get(name)
+        if not before:
+            continue
+        pairs=[("total", result["total"], before["total"])]
+        pairs+=[(step, stats, before["steps"][step]) for step, stats in result["steps"].items() if step in before.get("steps", {})]
+        for label, now, then in pairs:
+            if now["p50"] > then["p50"]*(1+threshold) and now["p50"]-then["p50"] > floor:
+                found.append(f"{name} {label} p50 {then['p50']*1000:.1f}ms -> {now['p50']*1000:.1f}ms")
+    return found
+
+
+def print_report(results, previous):
+    print()
+    print("------------------------------ Plugin Install Benchmark ------------------------------")
+    for name, result in results.items():
+        before=previous["results"].get(name) if previous else None
+        print(f"    {name}")
+        rows=[("end-to-end", result["total"], before["total"] if before else None)]
+        rows+=[(step, stats, before["steps"].get(step) if before else None) for step, stats in result["steps"].items()]
+        for label, stats, then in rows:
+            line=f"      {label.ljust(12)} p50 {stats['p50']*1000:9.1f}ms  p95 {stats['p95']*1000:9.1f}ms"
+            if then:
+                line+=f"  (was p50 {then['p50']*1000:9.1f}ms)"
+            print(line)
+    if previous:
+        print()
+        print(f"    Compared with {previous['commit'][:12]} recorded {time.strftime('%Y-%m-%d %H:%M', time.localtime(previous['recorded']))}")
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Benchmark the plugin install of every backend against a local HTTP server, a fake pip3, a fake agent tree and stub database drivers")
+    parser.add_argument('--backends', help='comma separated backends to benchmark', default=",".join(BACKEND_OPTIONS))
+    parser.add_argument('--runs', help='measured installs per backend', type=int, default=10)
+    parser.add_argument('--warmup', help='unmeasured installs per backend before the measured ones', type=int, default=1)
+    parser.add_argument('--http_latency', help='seconds the plugin server waits before every response', type=float, default=0.05)
+    parser.add_argument('--http_bandwidth', help='plugin server bandwidth in KB/s (0 for unlimited)', type=float, default=1024)
+    parser.add_argument('--plugin_size', help='size of the served plugin files in KB', type=int, default=32)
+    parser.add_argument('--db_latency', help='seconds every stub database round trip takes', type=float, default=0.005)
+    parser.add_argument('--pip_latency', help='seconds the fake pip3 takes to install a driver', type=float, default=2.0)
+    parser.add_argument('--force_pip', help='report the drivers as missing so every install runs the fake pip3', action='store_true')
+    parser.add_argument('--warm', help='keep the plugin cache between runs so downloads are revalidated instead of fetched', action='store_true')
+    parser.add_argument('--history', help='JSON lines file the results are appended to, keyed by git commit', default=HISTORY_FILE)
+    parser.add_argument('--threshold', help='relative p50 slowdown against the previous commit reported as a regression', type=float, default=0.2)
+    parser.add_argument('--floor_ms', help='ignore slowdowns smaller than this many milliseconds', type=float, default=5.0)
+    parser.add_argument('--fail_on_regression', help='exit with status 1 when a regression is found', action='store_true')
+    parser.add_argument('--no_record', help='do not append the results to the history file', action='store_true')
+
+    args=parser.parse_args()
+
+    names=[plugin_engine.backend_key(name) for name in args.backends.split(",") if name.strip()]
+    unknown=[name for name in names if name not in BACKEND_OPTIONS]
+    if unknown: print(f"Unknown backends: {', '.join(unknown)}"); sys.exit(2)
+
+    config={
+        "backends": names,
+        "runs": args.runs,
+        "warmup": args.warmup,
+        "http_latency": args.http_latency,
+        "http_bandwidth": args.http_bandwidth,
+        "plugin_size": args.plugin_size,
+        "db_latency": args.db_latency,
+        "pip_latency": args.pip_latency,
+        "force_pip": args.force_pip,
+        "warm": args.warm,
+    }
+
+    root=tempfile.mkdtemp(prefix="plugin-bench-")
+    os.environ["PATH"]=make_fake_pip(root, args.pip_latency)+os.pathsep+os.environ.get("PATH", "")
+    os.environ["PLUGIN_BENCH_DB_LATENCY"]=str(args.db_latency)
+    os.environ["no_proxy"]=os.environ["NO_PROXY"]="127.0.0.1,localhost"
+    if args.force_pip:
+        plugin_engine.installed_driver=lambda backend: None
+
+    results={}
+    try:
+        with plugin_server(PluginFiles(args.plugin_size), args.http_latency, args.http_bandwidth*1024) as url, database_listener() as port:
+            for name in names:
+                backend=plugin_engine.load_backend(name)
+                backend.plugin_url=f"{url}/{backend.plugin_name}"
+                print(f"    Benchmarking {name} ({args.warmup} warmup + {args.runs} runs)")
+                result=bench_backend(name, root, config, port)
+                if not result:
+                    sys.exit(1)
+                results[name]=result
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    commit, dirty=current_commit()
+    history=load_history(args.history)
+    previous=baseline(history, config, commit, dirty)
+    print_report(results, previous)
+
+    found=regressions(results, previous, args.threshold, args.floor_ms/1000) if previous else []
+    if found:
+        print()
+        print("------------------------------ Performance Regressions ------------------------------")
+        for regression in found:
+            print(f"    {regression}")
+
+    if not args.no_record and commit:
+        record={"commit": commit, "dirty": dirty, "recorded": time.time(), "config": config, "results": results}
+        with open(args.history, "a") as f:
+            f.write(json.dumps(record)+"\n")
+
+    sys.exit(1 if found and args.fail_on_regression else 0)
@@ -0,0 +1,8 @@
+import os
+import time
+
+
+def round_trip():
+    delay=float(os.environ.get("PLUGIN_BENCH_DB_LATENCY", "0"))
+    if delay:
+        time.sleep(delay)
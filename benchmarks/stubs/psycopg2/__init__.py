@@ -0,0 +1,52 @@
+from bench_latency import round_trip
+
+from . import sql
+
+
+class Error(Exception):
+    pgcode=None
+
+
+class cursor:
+
+    def __init__(self):
+        self.rows=[]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        round_trip()
+        self.rows=[]
+
+    def fetchall(self):
+        return self.rows
+
+
+class connection:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return cursor()
+
+    def commit(self):
+        round_trip()
+
+    def rollback(self):
+        round_trip()
+
+    def close(self):
+        pass
+
+
+def connect(**kwargs):
+    round_trip()
+    return connection()
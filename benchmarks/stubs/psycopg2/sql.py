@@ -0,0 +1,31 @@
+class Composable:
+
+    def format(self, *args, **kwargs):
+        return Composed([self])
+
+    def join(self, seq):
+        return Composed(list(seq))
+
+
+class Composed(Composable):
+
+    def __init__(self, parts):
+        self.parts=parts
+
+
+class SQL(Composable):
+
+    def __init__(self, string):
+        self.string=string
+
+
+class Identifier(Composable):
+
+    def __init__(self, *strings):
+        self.strings=strings
+
+
+class Literal(Composable):
+
+    def __init__(self, value):
+        self.value=value
@@ -0,0 +1,25 @@
+from bench_latency import round_trip
+
+
+class Database:
+
+    def __init__(self, name):
+        self.name=name
+
+    def command(self, command, value=None, **kwargs):
+        round_trip()
+        if command=="usersInfo":
+            return {"users": [], "ok": 1.0}
+        return {"ok": 1.0}
+
+
+class MongoClient:
+
+    def __init__(self, uri, **kwargs):
+        self.uri=uri
+
+    def __getitem__(self, name):
+        return Database(name)
+
+    def close(self):
+        pass
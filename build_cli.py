@@ -0,0 +1,42 @@
+#! /usr/bin/python3
+import os
+import sys
+import glob
+import shutil
+import zipapp
+import argparse
+import tempfile
+import py_compile
+
+REPO_DIR=os.path.dirname(os.path.abspath(__file__))
+SKIPPED=("build_cli.py",)
+
+
+# zipimport never writes bytecode, so every module is compiled into the archive next to its
+# source, otherwise each run would compile the engine again before doing anything
+def build(output, interpreter):
+    work=tempfile.mkdtemp(prefix="plugin-automation-")
+    try:
+        for path in sorted(glob.glob(os.path.join(REPO_DIR, "*.py"))):
+            if os.path.basename(path) in SKIPPED:
+                continue
+            target=os.path.join(work, os.path.basename(path))
+            shutil.copy2(path, target)
+            py_compile.compile(target, cfile=target+"c", doraise=True, invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        zipapp.create_archive(work, output, interpreter=interpreter, main="plugin_automation:main_exit", compressed=True)
+    except Exception as e:
+        print(str(e))
+        return False
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(f"    Wrote {output}")
+    return True
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Build the single file plugin-automation executable")
+    parser.add_argument('--output', help='executable to write', default="plugin-automation")
+    parser.add_argument('--interpreter', help='interpreter written to the shebang line', default="/usr/bin/env python3")
+
+    args=parser.parse_args()
+    sys.exit(0 if build(args.output, args.interpreter) else 1)
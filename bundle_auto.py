@@ -0,0 +1,119 @@
+#! /usr/bin/python3
+import os
+import sys
+import time
+import glob
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+import plugin_engine
+import generic_auto
+import plugin_bundle
+import plugin_catalog
+import plugin_downloader
+
+
+def sha256_file(path):
+    digest=hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in plugin_downloader.read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_bundle(output, backends, wheelhouse=None, checksums=None, with_drivers=True, catalog=None, python_version=None, platforms=None):
+    work=tempfile.mkdtemp(prefix="plugin-bundle-")
+    try:
+        manifest={
+            "format": plugin_bundle.BUNDLE_FORMAT,
+            "version": time.strftime("%Y%m%d-%H%M%S", time.gmtime()),
+            "created": time.time(),
+            "backends": {},
+            "wheels": {},
+            # Where the driver wheels install, checked before an air-gapped host extracts them
+            "python_version": python_version or plugin_bundle.host_python_version(),
+            "platforms": list(platforms or [plugin_bundle.host_platform()]),
+        }
+
+        print("    Downloading the plugin files")
+        for backend in backends:
+            plugin_dir=os.path.join(work, "plugins", backend.plugin_name, "")
+            # The same file list an online install resolves, so a bundle install ends up with identical files
+            files=plugin_engine.resolve_plugin_files(backend, catalog)
+            for filename, url in files:
+                os.makedirs(os.path.dirname(plugin_dir+filename), exist_ok=True)
+            downloads=[(url, plugin_dir+filename) for filename, url in files]
+            if not plugin_downloader.download_files(downloads, checksums=checksums):
+                return False
+            manifest["backends"][backend.name]={
+                "plugin_name": backend.plugin_name,
+                "plugin_url": backend.plugin_url,
+                "driver": plugin_engine.driver_requirement(backend) if backend.driver else None,
+                "files": dict((filename, sha256_file(plugin_dir+filename)) for filename, url in files),
+            }
+            if catalog and plugin_engine.catalog_plugin(backend) and catalog.find(backend.plugin_name)[1]:
+                manifest["backends"][backend.name]["upstream"]=plugin_catalog.upstream_record(catalog, backend.plugin_name)
+
+        wheel_dir=os.path.join(work, "wheels")
+        os.makedirs(wheel_dir)
+        requirements=[plugin_engine.driver_requirement(backend) for backend in backends if backend.driver]
+        if with_drivers and requirements:
+            print(f"    Collecting the driver wheels for {', '.join(requirements)}")
+            # pip download also resolves the drivers' own dependencies, e.g. dnspython for pymongo
+            cmd=["pip3", "download", "--only-binary=:all:", "--dest", wheel_dir]
+            if wheelhouse:
+                cmd+=["--no-index", "--find-links", wheelhouse]
+            if python_version:
+                cmd+=["--python-version", python_version]
+            for platform in platforms or ():
+                cmd+=["--platform", platform]
+            if not plugin_engine.execute_command(cmd+requirements):
+                return False
+            for path in sorted(glob.glob(os.path.join(wheel_dir, "*.whl"))):
+                manifest["wheels"][os.path.basename(path)]=sha256_file(path)
+
+        plugin_bundle.write_bundle(output, manifest, work)
+        print(f"    Wrote bundle {output} version {manifest['version']} : {len(manifest['backends'])} plugins, {len(manifest['wheels'])} wheels for Python {manifest['python_version']} on {', '.join(manifest['platforms'])}")
+
+    except Exception as e:
+        print(str(e))
+        return False
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return True
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Export the plugin files and driver wheels of the chosen backends into one offline bundle, installed on air-gapped hosts with --bundle")
+    parser.add_argument('output', help='bundle file to write, e.g. site24x7-plugins.tar.gz')
+    parser.add_argument('--backends', help='comma separated backends or catalog plugins to include', default=",".join(plugin_engine.BACKEND_MODULES))
+    parser.add_argument('--wheelhouse', help='collect the driver wheels from this local wheel directory instead of the package index', default=None)
+    parser.add_argument('--checksums', help='sha256sum file (local path or URL) the plugin files are verified against', default=None)
+    parser.add_argument('--no_drivers', help='leave the driver wheels out of the bundle', action='store_true')
+    parser.add_argument('--python_version', help='Python version of the target hosts the driver wheels are collected for, e.g. 3.9 (default: this interpreter)', default=None)
+    parser.add_argument('--platform', help='wheel platform tag of the target hosts, e.g. manylinux2014_x86_64, may be repeated (default: this host)', action='append', default=[])
+    parser.add_argument('--catalog', help='plugin catalog index the plugin files are resolved from, refreshed when stale', default=plugin_catalog.CATALOG_FILE)
+    parser.add_argument('--no_catalog', help='bundle only <plugin>.py and <plugin>.cfg instead of every file the plugin catalog lists', action='store_true')
+
+    args=parser.parse_args()
+
+    catalog=None if args.no_catalog else plugin_catalog.load_catalog(args.catalog)
+
+    backends=[]
+    for name in args.backends.split(","):
+        backend=plugin_engine.load_backend(name.strip())
+        if not backend and catalog and catalog.find(name.strip())[1]:
+            backend=generic_auto.GenericBackend(catalog.find(name.strip())[0])
+        if not backend: print(f"Unknown backend \"{name}\" (expected one of {', '.join(plugin_engine.BACKEND_MODULES)} or a catalog plugin)"); sys.exit(2)
+        backends.append(backend)
+
+    checksums=plugin_downloader.load_checksums(args.checksums) if args.checksums else None
+    if checksums is False: sys.exit(1)
+
+    try:
+        status=export_bundle(args.output, backends, args.wheelhouse, checksums, not args.no_drivers, catalog, args.python_version, args.platform)
+    finally:
+        plugin_downloader.shared_downloader().close()
+    sys.exit(0 if status else 1)
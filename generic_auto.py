@@ -0,0 +1,83 @@
+#! /usr/bin/python3
+import os
+import sys
+import argparse
+
+import plugin_engine
+import plugin_bundle
+import plugin_catalog
+
+
+# Any plugin of the catalog: no driver and no database user, the given options are passed to the
+# plugin and written to its cfg section as they are
+class GenericBackend(plugin_engine.Backend):
+    confirm_steps=False
+    defaults={"options": ()}
+
+    def __init__(self, plugin_name):
+        self.name=plugin_name
+        self.display_name=plugin_name
+        self.plugin_name=plugin_name
+        self.plugin_url=plugin_catalog.raw_url(plugin_name)
+        self.config_section=plugin_name
+
+    def user_name(self, args):
+        return None
+
+    def endpoint(self, args):
+        return None
+
+    def instance_name(self, args):
+        return getattr(args, "instance", None) or self.config_section
+
+    def create_user(self, args):
+        return True
+
+    def plugin_arguments(self, args):
+        return list(args.options)
+
+
+def parse_option(value):
+    name, separator, option=value.partition("=")
+    if not separator or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected name=value, got \"{value}\"")
+    return name.strip(), option
+
+
+# The catalog (or the bundle) gives the plugin's exact name, so "MySQL" and "mysql" install the same directory
+def load(plugin_name, agent_path=plugin_engine.AGENT_PATH, offline=False, bundle=None):
+    try:
+        if bundle:
+            names=[entry["plugin_name"] for entry in plugin_bundle.load_manifest(bundle)["backends"].values()]
+            source=f"the bundle {bundle}"
+        else:
+            catalog=plugin_catalog.load_catalog(os.path.join(agent_path, "temp", plugin_catalog.CATALOG_FILE), refresh=not offline)
+            names=catalog.names() if catalog else []
+            source=f"the plugin catalog of {plugin_catalog.REPOSITORY}"
+    except Exception as e:
+        print(str(e))
+        return None
+    for name in names:
+        if name.lower()==plugin_name.lower():
+            return GenericBackend(name)
+    print(f"    {plugin_name} is not in {source}")
+    return None
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Install any plugin of the Site24x7 plugins repository, passing the given options to it")
+    parser.add_argument('plugin', help='plugin directory name in the Site24x7 plugins repository, e.g. mysql')
+    parser.add_argument('--option', help='name=value passed to the plugin and written to its cfg, may be repeated', type=parse_option, action='append', default=[])
+    parser.add_argument('--instance', help='name of the instance section in the plugin configuration, other instances already configured are kept (default: the plugin name)', default=None)
+    parser.add_argument('--agent_path', help='Site24x7 agent installation directory', default=plugin_engine.AGENT_PATH)
+    plugin_engine.add_engine_arguments(parser)
+
+    args=parser.parse_args()
+    args.options=args.option
+
+    try:
+        backend=load(args.plugin, args.agent_path, args.offline, args.bundle)
+        status=bool(backend) and plugin_engine.initiate(backend, args, interactive=False, agent_path=args.agent_path)
+    finally:
+        plugin_engine.plugin_downloader.shared_downloader().close()
+    sys.exit(0 if status else 1)
@@ -1,125 +1,15 @@
-#!/usr/bin/bash
-import os
-import subprocess
-import json
+#! /usr/bin/python3
+import time
 import warnings
+import argparse
 import urllib.parse
-import urllib.request
+import concurrent.futures
 
-
-warnings.filterwarnings("ignore")
-
-def move_folder(source, destination):
-    try:
-        os.rename(source, destination)
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
-
-
-def move_plugin(plugin_name, plugins_temp_path, agent_plugin_path):
-    try:
-        if not check_directory(agent_plugin_path):
-            print(f"    {agent_plugin_path} Agent Plugins Directory not Present")
-            return False
-        if not move_folder(plugins_temp_path+plugin_name, agent_plugin_path+plugin_name): 
-            return False
-
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
-
-
-def plugin_config_setter(plugin_name, plugins_temp_path, arguments):
-    try:
-        full_path=plugins_temp_path+plugin_name+"/"
-        config_file_path=full_path+plugin_name+".cfg"
-
-        arguments='\n'.join(arguments.replace("--","").split())
-        with open(config_file_path, "w") as f:
-            f.write(f"[mongoDB]\n"+arguments)
-
-
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
-
-
-def plugin_validator(output):
-    try:
-        result=json.loads(output.decode())
-        if "status" in result:
-            if result['status']==0:
-                print("Plugin execution encountered a error")
-                if "msg" in result:
-                    print(result['msg'])
-            return False
-
-    except Exception as e:
-        print(str(e))
-        return False
-    
-    return True
-
-
-
-def download_file(url, path):
-    filename=url.split("/")[-1]
-    full_path=path+filename
-    urllib.request.urlretrieve(url, full_path)
-    response=urllib.request.urlopen(url)
-    if response.getcode() == 200 :
-        print(f"      {filename} Downloaded")
-    else:
-        print(f"      {filename} Download Failed with response code {str(response.status_code)}")
-        return False
-    return True
-
-
-def down_move(plugin_name, plugin_url, plugins_temp_path):
-    temp_plugin_path=os.path.join(plugins_temp_path,plugin_name+"/")
-    if not check_directory(temp_plugin_path):
-        if not make_directory(temp_plugin_path):return False
-
-    py_file_url=plugin_url+plugin_name+"/"+plugin_name+".py"
-    cfg_file_url=plugin_url+plugin_name+"/"+plugin_name+".cfg"
-    if not download_file(py_file_url, temp_plugin_path):return False
-    if not download_file(cfg_file_url, temp_plugin_path):return False
-    return True
-
-
-def execute_command(cmd, need_out=False):
-    try:
-        cmd=cmd.split()
-        result=subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode != 0:
-            print(f"    {cmd} execution failed with return code {result.returncode}")
-            print(f"    {str(result.stderr)}")
-            return False
-        if need_out:
-            return result.stdout
-        return True
-    except Exception as e:
-        print(    str(e))
-        return False
-
-def make_directory(path):
-
-    if not check_directory(path):
-        try:
-            os.mkdir(path)
-            print(f"    {path} directory created.")
-        
-        except Exception as e:
-             return False
-    return True
+import plugin_engine
+import plugin_metrics
 
 
-def check_directory(path):
-    return os.path.isdir(path)
+warnings.filterwarnings("ignore")
 
 
 def mongod_server(args):
@@ -157,160 +47,260 @@ def mongo_connect(args):
         print( str(e))
         return False
 
-def check_user(db, args):     
+MONITOR_ROLES=[
+    {
+        "role": "clusterMonitor",
+        "db": "admin"
+    }
+]
+
 
-    mongo_users = db.system.users.find()
+def check_user(db, args):
+    result=db.command("usersInfo", {"user": args.site24x7_user, "db": db.name})
+    plugin_metrics.count("db_round_trips")
+    if not result.get("users"):
+        return None
+
+    held=set((role["role"], role["db"]) for role in result["users"][0].get("roles", []))
+    return [role for role in MONITOR_ROLES if (role["role"], role["db"]) not in held]
+
+
+USER_EXISTS=51003
 
-    for mongo_user in mongo_users:
-        if mongo_user['user']==args.site24x7_user:
-            for role in mongo_user['roles']:
-                if role['role'] == "clusterMonitor":
-                    return True
-                else:
-                    print("User does not have clusterMonitor role")
-                    return False
-    return False
 
 def create_user(args):
+    connection=mongo_connect(args)
+    if not connection:
+        return False
     try:
-        connection=mongo_connect(args)
-        if not connection:
-            return False
+        from pymongo.errors import OperationFailure
+
         db=connection[args.dbname]
-        if check_user(db, args):
-            return True
-        roles = [
-            {
-                "role": "clusterMonitor",
-                "db": "admin" 
-            }
-        ]
-        db.command("createUser", args.site24x7_user, pwd=args.site24x7_pass, roles=roles)
-        connection.close()
+        missing_roles=check_user(db, args)
+        if missing_roles is None:
+            try:
+                db.command("createUser", args.site24x7_user, pwd=args.site24x7_pass, roles=MONITOR_ROLES)
+                plugin_metrics.count("db_round_trips")
+            except OperationFailure as e:
+                # Another batch worker created the user between the check and the create
+                if e.code!=USER_EXISTS:
+                    raise
+                missing_roles=check_user(db, args) or []
+        if missing_roles:
+            print(f"    User \"{args.site24x7_user}\" is missing the {', '.join(role['role'] for role in missing_roles)} role(s), granting them")
+            db.command("grantRolesToUser", args.site24x7_user, roles=missing_roles)
+            plugin_metrics.count("db_round_trips")
         return True
 
     except Exception as e:
-        connection.close()
         print(  str(e))
         return False
+    finally:
+        connection.close()
 
-def initiate(plugin_name, plugin_url, args=None):
 
-    print("------------------------------ Starting Plugin Automation ------------------------------")
-    print()
-    
-    #Installing python module dependencies
-    cmd="""pip3 install pymongo"""
-    print("    Installing pymongo python module")
-    if not execute_command(cmd):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Installed pymongo python module")
-    print()
-    
-    print(f"    Creating Site24x7 Plugin User \"{site24x7_user}\"")
-    if not create_user(args):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print(f"    Site24x7 Plugin User \"{site24x7_user}\" created / Exist")
-    print()  
-
-    agent_path="/opt/site24x7/monagent/" 
-    agent_temp_path=agent_path+"temp/"
-    agent_plugin_path=agent_path+"plugins/"
-
-    # checking the existance of Agent Temporary Directory
-    if not check_directory(agent_temp_path):
-        print("    Agent Directory does not Exist")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-    
-    # Creating the Agent Plugin Temporary Directory
-    print("    Creating Temporary Plugins Directory")
-    plugins_temp_path=os.path.join(agent_temp_path,"plugins/")
-    if not check_directory(plugins_temp_path):
-        if not make_directory(plugins_temp_path):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-    print("    Created Temporary Plugins Directory")
-    print()
+def server_hello(db):
+    from pymongo.errors import OperationFailure
+    try:
+        result=db.command("hello")
+    except OperationFailure:
+        # Servers before 4.4.2 only know the legacy name
+        result=db.command("isMaster")
+    plugin_metrics.count("db_round_trips")
+    return result
 
-    print("    Creating Temporary Plugins Modules Directory")
-    modules_temp_path=os.path.join(plugins_temp_path,"modules/")
-    if not check_directory(modules_temp_path):
-        if not make_directory(modules_temp_path):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-    print("    Created Temporary Plugins Modules Directory")
-    print()
 
+def split_address(address):
+    host, separator, port=address.rpartition(":")
+    if not separator:
+        return address, "27017"
+    return host.strip("[]"), port
 
-    # Downloading the files from GitHub
-    print("    Downloading Plugin Files")
-    if not down_move(plugin_name, plugin_url, plugins_temp_path):
-       print("")
-       print("------------------------------ Plugin Automation Failed ------------------------------")
-       return 
-    print("    Downloaded Plugin Files")
-    print()
 
-    # Setting Executable Permissions for the Plugin
-    print("    Creating executable plugin file")
-    cmd=f"chmod 744 {plugins_temp_path}/{plugin_name}/{plugin_name}.py"
-    if not execute_command(cmd):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Created executable plugin file")
-    print("")
-
-    # Validating the plugin output
-    print("    Validating the python plugin output")
-    if not args:
-        cmd=f"{plugins_temp_path}/{plugin_name}/{plugin_name}.py"
-    else:
-        arguments=f"--username={args.site24x7_user} --password={args.site24x7_pass} --host={args.host} --port={args.port} --dbname={args.dbname} --authdb={args.authdb} --tls={args.tls} --tlscertificatekeyfile={args.tlscertificatekeyfile} --tlscertificatekeyfilepassword={args.tlscertificatekeyfilepassword} --tlsallowinvalidcertificates={args.tlsallowinvalidcertificates} "
-        cmd=f"{plugins_temp_path}/{plugin_name}/{plugin_name}.py" + " "+arguments
-
-    result=execute_command(cmd, need_out=True)
-    if not plugin_validator(result):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-    print("    Plugin output validated sucessfully")
-    print("")
-
-    if args:
-        # Setting the plugin config file
-        print("    Setting plugin configuration")
-        if not plugin_config_setter(plugin_name, plugins_temp_path, arguments):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-        print("    Plugin configuration set sucessfully")
-        print()
-    
-    # Moving the plugin files into the Agent Directory
-    print("    Moving the plugin into the Site24x7 Agent directory")
-    if not move_plugin(plugin_name, plugins_temp_path, agent_plugin_path):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Moved the plugin into the Site24x7 Agent directory")
+def member_args(args, address):
+    member=argparse.Namespace(**vars(args))
+    member.host, member.port=split_address(address)
+    return member
+
+
+def replica_set(args, address):
+    connection=mongo_connect(member_args(args, address))
+    if not connection:
+        raise Exception(f"unable to connect to {address}")
+    try:
+        hello=server_hello(connection["admin"])
+    finally:
+        connection.close()
+    members=list(hello.get("hosts", []))+list(hello.get("passives", []))
+    return hello.get("primary") or address, members or [address]
+
+
+# Users are created on every primary that stores them: the mongos (cluster users live on the config
+# servers) and each shard (shard local users, needed to monitor shard members directly)
+def discover_topology(args, workers=8):
+    connection=mongo_connect(args)
+    if not connection:
+        return False
+    seed=f"{args.host}:{args.port}"
+    try:
+        admin=connection["admin"]
+        hello=server_hello(admin)
+        if hello.get("msg")=="isdbgrid":
+            shards=admin.command("listShards")["shards"]
+            plugin_metrics.count("db_round_trips")
+        elif hello.get("setName"):
+            primary=hello.get("primary") or seed
+            members=list(hello.get("hosts", []))+list(hello.get("passives", []))
+            return {"kind": f"replica set {hello['setName']}", "primaries": [primary], "members": members or [seed]}
+        else:
+            return {"kind": "standalone server", "primaries": [seed], "members": [seed]}
+    except Exception as e:
+        print(str(e))
+        return False
+    finally:
+        connection.close()
+
+    topology={"kind": f"sharded cluster of {len(shards)} shards", "primaries": [seed], "members": [seed]}
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # listShards reports each shard as "<replica set>/<host:port>,<host:port>"
+            futures=[plugin_metrics.submit(pool, replica_set, args, shard["host"].split("/")[-1].split(",")[0]) for shard in shards]
+            for future in futures:
+                primary, members=future.result()
+                topology["primaries"].append(primary)
+                topology["members"]+=members
+    except Exception as e:
+        print(f"    Unable to discover the shard members : {str(e)}")
+        return False
+    return topology
+
+
+def instance_prefix(args):
+    return getattr(args, "instance", None) or backend.config_section
+
+
+def initiate_cluster(args, workers=8, agent_path=plugin_engine.AGENT_PATH):
+    print(" ")
+    print("------------------------------ Starting Plugin Automation ------------------------------")
     print()
 
+    engine=plugin_engine.Engine(agent_path=agent_path, workers=max(1, workers), validation_workers=max(1, workers), **plugin_engine.engine_options(args))
+    seed=plugin_engine.Target(instance_prefix(args), backend, args)
+    members=[]
+    instances={}
+    results={}
+    try:
+        # The seed is checked before pip runs, the discovered members before any user is created
+        if not engine.skip_preflight and not engine.preflight_targets([seed], results):
+            engine.write_metrics()
+            return engine.fail(seed)
+        if not engine.ensure_driver(backend):
+            return engine.fail(seed)
+
+        print(f"    Discovering the MongoDB topology from {args.host}:{args.port}")
+        topology=discover_topology(args, workers)
+        if not topology:
+            return engine.fail(seed)
+        print(f"    Found a {topology['kind']} with {len(topology['members'])} members to monitor")
+        print()
 
-    print("------------------------------ Sucessfully Completed Plugin Automation ------------------------------")
+        for address in topology["members"]:
+            member=member_args(args, address)
+            member.instance=f"{instance_prefix(args)}_{member.host}_{member.port}"
+            member.user_provisioned=True
+            instances[address]=member.instance
+            members.append(plugin_engine.Target(member.instance, backend, member))
+        targets=members
+        if not engine.skip_preflight:
+            engine.tag_output=True
+            targets=engine.preflight_targets(members, results)
+            engine.skip_preflight=True
+            if not targets:
+                engine.write_metrics()
+                return engine.fail(seed, "No member of the cluster passed the preflight checks")
+
+        # A member that failed the preflight has no user created on it
+        primaries=[primary for primary in topology["primaries"] if instances.get(primary) not in results]
+        if primaries:
+            print(f"    Setting the MongoDB User \"{args.site24x7_user}\" on {', '.join(primaries)}")
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                created=list(pool.map(create_user, [member_args(args, primary) for primary in primaries]))
+            if not all(created):
+                return engine.fail(seed, f"User creation \"{args.site24x7_user}\" failed")
+            print(f"    \"{args.site24x7_user}\" User created / Exists")
+            print()
+
+        results.update(engine.install_all(targets))
+    finally:
+        engine.close()
+
+    plugin_engine.print_report(members, results, time.monotonic()-engine.started)
+    if not all(status for status, duration in results.values()):
+        return False
+    print("------------------------------ Successfully Completed Plugin Automation ------------------------------")
+    return True
 
 
-if __name__ == "__main__":
+class MongoDBBackend(plugin_engine.Backend):
+    name="mongodb"
+    display_name="MongoDB"
     plugin_name="mongoDB"
-    plugin_url="https://raw.githubusercontent.com/site24x7/plugins/master/"
+    plugin_url="https://raw.githubusercontent.com/site24x7/plugins/master/mongoDB"
+    driver="pymongo"
+    driver_module="pymongo"
+    driver_distributions=("pymongo",)
+    driver_min_version="3.11"
+    config_section="mongoDB"
+    confirm_steps=False
+    discovery=True
+    staging_dirs=("modules/",)
+    defaults={
+        "host": "localhost",
+        "port": "27017",
+        "admin_username": None,
+        "admin_password": None,
+        "site24x7_user": "site24x7_plugin",
+        "site24x7_pass": None,
+        "dbname": "admin",
+        "authdb": "admin",
+        "tls": False,
+        "tlscertificatekeyfile": None,
+        "tlscertificatekeyfilepassword": None,
+        "tlsallowinvalidcertificates": "True",
+    }
+    required=("admin_username", "admin_password", "site24x7_pass")
+
+    def user_name(self, args):
+        return args.site24x7_user
+
+    def create_user(self, args):
+        # Members found by topology discovery share the user created once on each primary
+        if getattr(args, "user_provisioned", False):
+            return True
+        return create_user(args)
+
+    def install_cluster(self, args, workers=8, agent_path=plugin_engine.AGENT_PATH):
+        return initiate_cluster(args, workers, agent_path)
+
+    def plugin_arguments(self, args):
+        return [
+            ("username", args.site24x7_user),
+            ("password", args.site24x7_pass),
+            ("host", args.host),
+            ("port", args.port),
+            ("dbname", args.dbname),
+            ("authdb", args.authdb),
+            ("tls", args.tls),
+            ("tlscertificatekeyfile", args.tlscertificatekeyfile),
+            ("tlscertificatekeyfilepassword", args.tlscertificatekeyfilepassword),
+            ("tlsallowinvalidcertificates", args.tlsallowinvalidcertificates),
+        ]
+
+
+backend=MongoDBBackend()
 
+
+if __name__ == "__main__":
     #user configs
     host = "localhost"
     port = 27017
@@ -351,7 +341,6 @@ if __name__ == "__main__":
 
 
 
-    import argparse
     parser=argparse.ArgumentParser()
     parser.add_argument('--host', help='hostname for mongoDB',default=host)
     parser.add_argument('--port', help='port number for mongoDB',default=port)
@@ -365,7 +354,14 @@ if __name__ == "__main__":
     parser.add_argument('--tlscertificatekeyfile' ,help="tlscertificatekeyfile file path",default= tlscertificatekeyfile)
     parser.add_argument('--tlscertificatekeyfilepassword' ,help="tlscertificatekeyfilepassword",default= tlscertificatekeyfilepassword)
     parser.add_argument('--tlsallowinvalidcertificates' ,help="tlsallowinvalidcertificates",default= tlsallowinvalidcertificates)
+    parser.add_argument('--instance', help='name of the instance section in the plugin configuration, other instances already configured are kept (default: mongoDB_<host>_<port>)', default=None)
+    parser.add_argument('--discover', help='discover the replica set or sharded cluster members from the given host and configure one plugin instance per member', action='store_true')
+    parser.add_argument('--workers', help='number of members installed concurrently with --discover', type=int, default=8)
+    plugin_engine.add_engine_arguments(parser)
 
     args=parser.parse_args()
 
-    initiate(plugin_name, plugin_url, args)
+    if args.discover:
+        initiate_cluster(args, args.workers)
+    else:
+        plugin_engine.initiate(backend, args)
@@ -0,0 +1,131 @@
+import os
+import json
+import subprocess
+import configparser
+
+
+# Kept free of the install machinery so status and validation calls start fast
+AGENT_PATH="/opt/site24x7/monagent/"
+VERSIONS_DIR="plugin_versions"
+VALIDATION_TIMEOUT=60
+INSTALL_METRICS_FILE="plugin_install_metrics.json"
+UPGRADE_METRICS_FILE="plugin_upgrade_metrics.json"
+
+BACKEND_MODULES={
+    "postgres": "postgres_auto",
+    "mongodb": "mongoDB_auto",
+    "oracle": "oracle_auto",
+}
+
+BACKEND_ALIASES={
+    "postgresql": "postgres",
+    "pg": "postgres",
+    "mongo": "mongodb",
+    "oracledb": "oracle",
+}
+
+
+def backend_key(name):
+    name=str(name or "").lower()
+    return BACKEND_ALIASES.get(name, name)
+
+
+def versions_path(agent_plugin_path, plugin_name):
+    return os.path.join(os.path.dirname(os.path.normpath(agent_plugin_path)), VERSIONS_DIR, plugin_name, "")
+
+
+def list_versions(agent_plugin_path, plugin_name):
+    versions=versions_path(agent_plugin_path, plugin_name)
+    if not os.path.isdir(versions):
+        return []
+    return sorted(name for name in os.listdir(versions) if not name.startswith(".") and os.path.isdir(versions+name))
+
+
+def current_version(agent_plugin_path, plugin_name):
+    link=agent_plugin_path+plugin_name
+    if not os.path.islink(link):
+        return None
+    return os.path.basename(os.path.normpath(os.readlink(link)))
+
+
+# cfg options a plugin reads from its environment as well, e.g. the Oracle client libraries find their files through ORACLE_HOME
+ENVIRONMENT_OPTIONS={"oracle_home": "ORACLE_HOME"}
+
+
+def plugin_environment(arguments):
+    # The cfg holds unset options as None
+    return dict((ENVIRONMENT_OPTIONS[name], str(value)) for name, value in arguments if name in ENVIRONMENT_OPTIONS and value not in (None, "", "None"))
+
+
+def render_arguments(arguments):
+    return [f"--{name}={value}" for name, value in arguments]
+
+
+def read_config(path):
+    config=configparser.ConfigParser(interpolation=None)
+    config.optionxform=str
+    if os.path.isfile(path):
+        config.read(path)
+    return config
+
+
+def plugin_validator(output):
+    try:
+        result=output if isinstance(output, dict) else json.loads(output.decode())
+        if "status" in result and result['status']==0:
+            print("Plugin execution encountered a error")
+            if "msg" in result:
+                print(result['msg'])
+            return False
+
+    except Exception as e:
+        print(str(e))
+        return False
+
+    return True
+
+
+def installed_plugins(agent_plugin_path):
+    if not os.path.isdir(agent_plugin_path):
+        return []
+    return sorted(name for name in os.listdir(agent_plugin_path) if not name.startswith(".") and os.path.isdir(agent_plugin_path+name))
+
+
+def plugin_status(agent_plugin_path, plugin_name):
+    config=read_config(agent_plugin_path+plugin_name+"/"+plugin_name+".cfg")
+    return {
+        "plugin": plugin_name,
+        "version": current_version(agent_plugin_path, plugin_name),
+        "versions": list_versions(agent_plugin_path, plugin_name),
+        "instances": config.sections(),
+    }
+
+
+def last_installs(agent_temp_path):
+    try:
+        with open(agent_temp_path+INSTALL_METRICS_FILE) as f:
+            return json.load(f).get("targets", [])
+    except (OSError, ValueError):
+        return []
+
+
+# Runs the installed plugin once per instance section, the way the agent does
+def validate_plugin(agent_plugin_path, plugin_name, timeout=VALIDATION_TIMEOUT):
+    plugin_file=agent_plugin_path+plugin_name+"/"+plugin_name+".py"
+    config=read_config(agent_plugin_path+plugin_name+"/"+plugin_name+".cfg")
+    results={}
+    for section in config.sections() or [None]:
+        arguments=list(config[section].items()) if section else []
+        try:
+            env=dict(os.environ, **plugin_environment(arguments))
+            result=subprocess.run([plugin_file]+render_arguments(arguments), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=timeout)
+            if result.returncode!=0:
+                print(f"    {plugin_name} [{section}] exited with return code {result.returncode}")
+                print(f"    {str(result.stderr)}")
+                results[section]=False
+            else:
+                results[section]=plugin_validator(result.stdout)
+        except Exception as e:
+            print(f"    {plugin_name} [{section}] {str(e)}")
+            results[section]=False
+    return results
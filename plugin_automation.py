@@ -0,0 +1,224 @@
+#! /usr/bin/python3
+import os
+import sys
+import json
+import argparse
+
+# Only the agent helpers are imported up front, the install machinery and the database
+# drivers load when the install subcommand runs so status and validate start fast
+import plugin_agent
+
+
+def bool_value(value):
+    return str(value).lower() in ("true", "1", "yes", "y")
+
+
+def status(agent_path, plugin_name=None, as_json=False):
+    agent_plugin_path=agent_path+"plugins/"
+    plugins=[plugin_name] if plugin_name else plugin_agent.installed_plugins(agent_plugin_path)
+    report={
+        "plugins": [plugin_agent.plugin_status(agent_plugin_path, name) for name in plugins],
+        "last_installs": plugin_agent.last_installs(agent_path+"temp/"),
+    }
+    if as_json:
+        print(json.dumps(report, indent=2))
+        return True
+
+    if not report["plugins"]:
+        print(f"    No plugins installed under {agent_plugin_path}")
+    for entry in report["plugins"]:
+        print(f"    {entry['plugin']}  version {entry['version'] or 'unversioned'}  ({len(entry['versions'])} kept)  instances {', '.join(entry['instances']) or '-'}")
+    if report["last_installs"]:
+        print()
+        print("    Last install run")
+        for target in report["last_installs"]:
+            failed=f" at {target['failed_step']}" if target.get("failed_step") else ""
+            print(f"    {target.get('target')}  {'SUCCESS' if target.get('status')=='success' else 'FAILED'+failed}  {target.get('duration') or 0:.2f}s")
+    return True
+
+
+def validate(agent_path, plugin_name=None, timeout=plugin_agent.VALIDATION_TIMEOUT):
+    agent_plugin_path=agent_path+"plugins/"
+    plugins=[plugin_name] if plugin_name else plugin_agent.installed_plugins(agent_plugin_path)
+    if not plugins:
+        print(f"    No plugins installed under {agent_plugin_path}")
+        return False
+
+    status=True
+    for name in plugins:
+        if not os.path.isfile(agent_plugin_path+name+"/"+name+".py"):
+            print(f"    {name} is not installed under {agent_plugin_path}")
+            status=False
+            continue
+        for section, result in plugin_agent.validate_plugin(agent_plugin_path, name, timeout).items():
+            print(f"    {name} [{section or 'default'}]  {'OK' if result else 'FAILED'}")
+            status=status and result
+    return status
+
+
+def catalog(agent_path, plugin_name=None, refresh=False, force=False):
+    import plugin_catalog
+
+    index=plugin_catalog.Catalog(agent_path+"temp/"+plugin_catalog.CATALOG_FILE)
+    try:
+        if refresh or force or not index.data:
+            changed=index.refresh(force)
+            print(f"    Plugin catalog of {index.repository}@{index.ref} refreshed, {len(changed)} plugin directories re-indexed")
+    except Exception as e:
+        print(f"    Unable to refresh the plugin catalog : {str(e)}")
+        if not index.data:
+            return False
+    finally:
+        plugin_catalog.plugin_downloader.shared_downloader().close()
+
+    if not plugin_name:
+        print(f"    {len(index.names())} plugins : {', '.join(index.names())}")
+        return True
+    name, entry=index.find(plugin_name)
+    if not entry:
+        print(f"    {plugin_name} is not in the plugin catalog")
+        return False
+    print(f"    {name}  tree {entry['tree']}  {index.raw_url(name)}")
+    for path, size, sha in entry["files"]:
+        print(f"      {path}  {size} bytes  {sha}")
+    return True
+
+
+def install_generic(plugin_name, options, agent_path):
+    import plugin_engine
+    import generic_auto
+
+    parser=argparse.ArgumentParser(prog=f"plugin-automation install {plugin_name}", description=f"Install the {plugin_name} plugin of the Site24x7 plugins repository, passing the given options to it")
+    parser.add_argument('--option', help='name=value passed to the plugin and written to its cfg, may be repeated', type=generic_auto.parse_option, action='append', default=[])
+    parser.add_argument('--instance', help='name of the instance section written to the plugin cfg (default: the plugin name)', default=None)
+    agent_argument(parser, agent_path)
+    plugin_engine.add_engine_arguments(parser)
+    args=parser.parse_args(options)
+    args.options=args.option
+    agent_path=os.path.join(args.agent_path, "")
+
+    try:
+        backend=generic_auto.load(plugin_name, agent_path, args.offline, args.bundle)
+        return bool(backend) and plugin_engine.initiate(backend, args, interactive=False, agent_path=agent_path)
+    finally:
+        plugin_engine.plugin_downloader.shared_downloader().close()
+
+
+def install(backend_name, options, agent_path):
+    if plugin_agent.backend_key(backend_name) not in plugin_agent.BACKEND_MODULES:
+        return install_generic(backend_name, options, agent_path)
+
+    import plugin_engine
+
+    backend=plugin_engine.load_backend(backend_name)
+    parser=argparse.ArgumentParser(prog=f"plugin-automation install {backend.name}", description=f"Install the Site24x7 {backend.plugin_name} plugin without prompting")
+    for key, default in backend.defaults.items():
+        if isinstance(default, bool):
+            parser.add_argument(f'--{key}', type=bool_value, default=None, help=f'(default {default})')
+        else:
+            parser.add_argument(f'--{key}', default=None, help=f'(default {default})' if default is not None else None)
+    parser.add_argument('--instance', help='name of the instance section written to the plugin cfg (default: named after the database endpoint)', default=None)
+    if backend.discovery:
+        parser.add_argument('--discover', help='discover the replica set members or shards from the given host and install them all', action='store_true')
+        parser.add_argument('--workers', help='number of cluster members installed concurrently', type=int, default=8)
+    agent_argument(parser, agent_path)
+    plugin_engine.add_engine_arguments(parser)
+    parsed=parser.parse_args(options)
+    agent_path=os.path.join(parsed.agent_path, "")
+
+    values=dict((key, value) for key, value in vars(parsed).items() if key in backend.defaults and value is not None)
+    args, missing=backend.build_args(values)
+    if missing:
+        parser.error(f"missing {', '.join('--'+key for key in missing)}")
+    for key, value in vars(parsed).items():
+        if key not in backend.defaults and key!="agent_path":
+            setattr(args, key, value)
+
+    try:
+        # Only backends with discovery register --discover and provide install_cluster()
+        if backend.discovery and parsed.discover:
+            return backend.install_cluster(args, parsed.workers, agent_path)
+        return plugin_engine.initiate(backend, args, interactive=False, agent_path=agent_path)
+    finally:
+        plugin_engine.plugin_downloader.shared_downloader().close()
+
+
+def agent_argument(parser, default):
+    parser.add_argument('--agent_path', help='Site24x7 agent installation directory', default=default)
+
+
+def upgrade(args, agent_path):
+    import plugin_engine
+
+    try:
+        return plugin_engine.upgrade(args.plugins, args, args.check, agent_path)
+    finally:
+        plugin_engine.plugin_downloader.shared_downloader().close()
+
+
+# The subcommand only, the upgrade options need plugin_engine and are registered when the upgrade subcommand runs
+def subcommand(argv):
+    parser=argparse.ArgumentParser(add_help=False)
+    agent_argument(parser, None)
+    parser.add_argument('command', nargs='?')
+    args, unknown=parser.parse_known_args(argv)
+    return args.command
+
+
+def main(argv=None):
+    argv=sys.argv[1:] if argv is None else argv
+    parser=argparse.ArgumentParser(prog="plugin-automation", description="Install, validate and inspect the Site24x7 database plugins")
+    agent_argument(parser, plugin_agent.AGENT_PATH)
+    subparsers=parser.add_subparsers(dest="command", metavar="{install,upgrade,validate,status,catalog}")
+    subparsers.required=True
+
+    install_parser=subparsers.add_parser("install", help="install a plugin, see install <plugin> --help", add_help=False)
+    install_parser.add_argument('backend', metavar="{"+",".join(plugin_agent.BACKEND_MODULES)+",<catalog plugin>}", help='database backend, or any plugin of the catalog with its options given as --option name=value')
+    install_parser.add_argument('options', nargs=argparse.REMAINDER)
+
+    upgrade_parser=subparsers.add_parser("upgrade", help="download only the plugin files that changed upstream, keep the instance cfg and swap the new version in")
+    upgrade_parser.add_argument('plugins', nargs='*', help='plugins to upgrade, every installed plugin in the catalog by default')
+    upgrade_parser.add_argument('--check', help='list the changed files without upgrading', action='store_true')
+    agent_argument(upgrade_parser, argparse.SUPPRESS)
+    if subcommand(argv)=="upgrade":
+        import plugin_engine
+        plugin_engine.add_upgrade_arguments(upgrade_parser)
+
+    validate_parser=subparsers.add_parser("validate", help="run the installed plugins once for every configured instance")
+    validate_parser.add_argument('plugin', nargs='?', help='plugin to validate, all installed plugins by default')
+    agent_argument(validate_parser, argparse.SUPPRESS)
+    validate_parser.add_argument('--timeout', help='seconds a plugin run may take', type=int, default=plugin_agent.VALIDATION_TIMEOUT)
+
+    status_parser=subparsers.add_parser("status", help="show the installed plugins, their versions and instances and the last install run")
+    status_parser.add_argument('plugin', nargs='?', help='plugin to show, all installed plugins by default')
+    agent_argument(status_parser, argparse.SUPPRESS)
+    status_parser.add_argument('--json', help='print the status as JSON', action='store_true')
+
+    catalog_parser=subparsers.add_parser("catalog", help="list the plugins of the Site24x7 plugins repository or the files of one plugin")
+    catalog_parser.add_argument('plugin', nargs='?', help='plugin whose files are listed')
+    catalog_parser.add_argument('--refresh', help='revalidate the index against the repository before listing', action='store_true')
+    catalog_parser.add_argument('--force', help='rebuild the whole index instead of refreshing the changed plugin directories', action='store_true')
+    agent_argument(catalog_parser, argparse.SUPPRESS)
+
+    args=parser.parse_args(argv)
+    agent_path=os.path.join(args.agent_path, "")
+
+    if args.command=="status":
+        result=status(agent_path, args.plugin, args.json)
+    elif args.command=="upgrade":
+        result=upgrade(args, agent_path)
+    elif args.command=="catalog":
+        result=catalog(agent_path, args.plugin, args.refresh, args.force)
+    elif args.command=="validate":
+        result=validate(agent_path, args.plugin, args.timeout)
+    else:
+        result=install(args.backend, args.options, agent_path)
+    return 0 if result else 1
+
+
+def main_exit():
+    sys.exit(main())
+
+
+if __name__ == "__main__":
+    main_exit()
@@ -0,0 +1,176 @@
+import os
+import io
+import sys
+import json
+import time
+import tarfile
+import platform
+import sysconfig
+import tempfile
+
+import plugin_downloader
+
+
+BUNDLE_FORMAT=1
+MANIFEST_NAME="bundle.json"
+
+
+class BundleError(Exception):
+    pass
+
+
+def plugin_member(plugin_name, filename):
+    return f"plugins/{plugin_name}/{filename}"
+
+
+def wheel_member(filename):
+    return f"wheels/{filename}"
+
+
+# The manifest goes first and the wheels last, so a streaming reader knows every checksum
+# up front and can stop once it has the plugin files without decompressing the wheels
+def write_bundle(output, manifest, root):
+    directory=os.path.dirname(os.path.abspath(output))
+    fd, tmp_path=tempfile.mkstemp(dir=directory, prefix="."+os.path.basename(output)+".", suffix=".tmp")
+    os.close(fd)
+    try:
+        with tarfile.open(tmp_path, "w:gz") as tar:
+            data=json.dumps(manifest, indent=2).encode()
+            info=tarfile.TarInfo(MANIFEST_NAME)
+            info.size=len(data)
+            info.mtime=int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            for entry in manifest["backends"].values():
+                for filename in sorted(entry["files"]):
+                    member=plugin_member(entry["plugin_name"], filename)
+                    tar.add(os.path.join(root, member), member, recursive=False)
+            for filename in sorted(manifest["wheels"]):
+                tar.add(os.path.join(root, wheel_member(filename)), wheel_member(filename), recursive=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def read_manifest(tar):
+    member=tar.next()
+    if member is None or member.name!=MANIFEST_NAME:
+        raise BundleError(f"{MANIFEST_NAME} is not the first member of the bundle")
+    manifest=json.load(tar.extractfile(member))
+    if manifest.get("format")!=BUNDLE_FORMAT:
+        raise BundleError(f"unsupported bundle format {manifest.get('format')}, expected {BUNDLE_FORMAT}")
+    return manifest
+
+
+def load_manifest(path):
+    with tarfile.open(path, "r|*") as tar:
+        return read_manifest(tar)
+
+
+def find_plugin(manifest, plugin_name):
+    for entry in manifest["backends"].values():
+        if entry["plugin_name"]==plugin_name:
+            return entry
+    raise BundleError(f"the bundle has no {plugin_name} plugin, it contains {', '.join(manifest['backends']) or 'no plugins'}")
+
+
+# Members stream from the archive straight to their final paths, verified against the manifest checksums
+def extract(tar, wanted):
+    for member in tar:
+        if member.name not in wanted:
+            continue
+        full_path, sha256=wanted.pop(member.name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        plugin_downloader.write_atomic(plugin_downloader.read_chunks(tar.extractfile(member)), full_path, sha256)
+        if not wanted:
+            return
+    raise BundleError(f"the bundle is missing {', '.join(sorted(wanted))}")
+
+
+def extract_plugin(path, plugin_name, destination):
+    with tarfile.open(path, "r|*") as tar:
+        entry=find_plugin(read_manifest(tar), plugin_name)
+        extract(tar, dict((plugin_member(plugin_name, filename), (os.path.join(destination, filename), sha256)) for filename, sha256 in entry["files"].items()))
+    return sorted(entry["files"])
+
+
+# The catalog hashes recorded at export, written next to the plugin so a later upgrade can diff against them
+def plugin_upstream(path, plugin_name):
+    return find_plugin(load_manifest(path), plugin_name).get("upstream")
+
+
+def host_python_version():
+    return f"{sys.version_info.major}.{sys.version_info.minor}"
+
+
+# The tag pip gives wheels built on this host, e.g. linux_x86_64
+def host_platform():
+    return sysconfig.get_platform().replace("-", "_").replace(".", "_")
+
+
+def platform_family(tag):
+    prefix=tag.split("_")[0]
+    for family in ("linux", "macosx", "win"):
+        if family in prefix:
+            return family
+    return prefix
+
+
+# manylinux2014_x86_64 and musllinux_1_1_x86_64 wheels install on a linux_x86_64 host, the glibc
+# or musl version itself is left for pip to check
+def platform_matches(tag):
+    if tag=="any":
+        return True
+    if platform_family(tag)!=platform_family(host_platform()):
+        return False
+    machine=platform.machine().lower()
+    return tag.lower().endswith("_"+machine) or tag.endswith("_universal2") or tag==host_platform()
+
+
+def python_matches(version):
+    parts=version.split(".") if "." in version else [version[:1], version[1:]]
+    parts=[part for part in parts if part]
+    return parts==host_python_version().split(".")[:len(parts)]
+
+
+# Wheels collected for another interpreter or platform only fail once pip install runs on the
+# target, so the targets the bundle was exported for are checked before anything is extracted
+def wheel_problems(manifest):
+    if not manifest["wheels"]:
+        return []
+    problems=[]
+    python_version=manifest.get("python_version")
+    if python_version and not python_matches(python_version):
+        problems.append(f"its driver wheels were collected for Python {python_version}, this host runs Python {host_python_version()}")
+    platforms=manifest.get("platforms")
+    if platforms and not any(platform_matches(tag) for tag in platforms):
+        problems.append(f"its driver wheels were collected for {', '.join(platforms)}, this host is {host_platform()}")
+    return problems
+
+
+def extract_wheels(path, destination):
+    with tarfile.open(path, "r|*") as tar:
+        manifest=read_manifest(tar)
+        problems=wheel_problems(manifest)
+        if problems:
+            raise BundleError(", ".join(problems))
+        if manifest["wheels"]:
+            extract(tar, dict((wheel_member(filename), (os.path.join(destination, filename), sha256)) for filename, sha256 in manifest["wheels"].items()))
+    return sorted(manifest["wheels"])
+
+
+def check_bundle(path, plugin_name):
+    try:
+        find_plugin(load_manifest(path), plugin_name)
+    except Exception as e:
+        return [f"bundle {path} cannot be used : {str(e)}"]
+    return []
+
+
+def check_wheels(path):
+    try:
+        problems=wheel_problems(load_manifest(path))
+    except Exception as e:
+        return [f"bundle {path} cannot be used : {str(e)}"]
+    return [f"bundle {path} cannot provide the driver, {problem}" for problem in problems]
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+
+DEFAULT_MAX_BYTES=64*1024*1024
+DEFAULT_MAX_AGE=30*24*60*60
+
+
+class PluginCache:
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, offline=False):
+        self.cache_dir=cache_dir
+        self.max_bytes=max_bytes
+        self.max_age=max_age
+        self.offline=offline
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key=hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.cache_dir, key+".data"), os.path.join(self.cache_dir, key+".json")
+
+    def _write_meta(self, meta_path, meta):
+        fd, tmp_path=tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def lookup(self, url):
+        data_path, meta_path=self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta=json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("url")!=url or not os.path.isfile(data_path):
+            return None
+        return meta
+
+    def conditional_headers(self, meta):
+        headers={}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"]=meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"]=meta["last_modified"]
+        return headers
+
+    def open_data(self, url):
+        data_path, meta_path=self._paths(url)
+        f=open(data_path, "rb")
+        meta=self.lookup(url)
+        if meta:
+            meta["used"]=time.time()
+            self._write_meta(meta_path, meta)
+        return f
+
+    def store(self, url, source, headers, sha256=None):
+        data_path, meta_path=self._paths(url)
+        fd, tmp_path=tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, data_path)
+        now=time.time()
+        self._write_meta(meta_path, {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "size": os.path.getsize(data_path),
+            "sha256": sha256,
+            "stored": now,
+            "used": now,
+        })
+        self.evict()
+
+    def entries(self):
+        entries=[]
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            meta_path=os.path.join(self.cache_dir, name)
+            try:
+                with open(meta_path) as f:
+                    meta=json.load(f)
+            except (OSError, ValueError):
+                continue
+            entries.append((meta_path, meta))
+        return entries
+
+    def remove(self, meta_path):
+        for path in (meta_path, meta_path[:-len(".json")]+".data"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        try:
+            now=time.time()
+            entries=[]
+            for meta_path, meta in self.entries():
+                if now-meta.get("used", 0) > self.max_age:
+                    self.remove(meta_path)
+                else:
+                    entries.append((meta_path, meta))
+
+            total=sum(meta.get("size", 0) for meta_path, meta in entries)
+            for meta_path, meta in sorted(entries, key=lambda entry: entry[1].get("used", 0)):
+                if total <= self.max_bytes:
+                    break
+                self.remove(meta_path)
+                total-=meta.get("size", 0)
+        except Exception as e:
+            print(f"      Plugin cache eviction failed : {str(e)}")
+
+
+def open_cache(cache_dir, offline=False):
+    try:
+        return PluginCache(cache_dir, offline=offline)
+    except Exception as e:
+        print(f"    Plugin cache {cache_dir} unavailable : {str(e)}")
+        return None
@@ -0,0 +1,213 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import urllib.parse
+
+import plugin_downloader
+
+
+REPOSITORY="site24x7/plugins"
+REF="master"
+API_URL="https://api.github.com/repos/"
+RAW_URL="https://raw.githubusercontent.com/"
+CATALOG_FILE="plugin_catalog.json.gz"
+CATALOG_FORMAT=1
+MAX_AGE=6*60*60
+# Past this many changed plugin directories one recursive tree listing is cheaper than a request per directory
+MAX_CHANGED_TREES=20
+SKIPPED_SUFFIXES=(".md", ".png", ".jpg", ".jpeg", ".gif", ".svg")
+
+
+class CatalogError(Exception):
+    pass
+
+
+def raw_url(plugin_name, repository=REPOSITORY, ref=REF):
+    return RAW_URL+repository+"/"+ref+"/"+urllib.parse.quote(plugin_name)
+
+
+# The SHA-1 git gives a blob, comparable with the tree listing without downloading anything
+def blob_sha(path):
+    digest=hashlib.sha1()
+    digest.update(b"blob %d\0" % os.path.getsize(path))
+    with open(path, "rb") as f:
+        for chunk in plugin_downloader.read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def plugin_entry(plugin_name, tree_sha, entries):
+    files=[]
+    for entry in entries:
+        if entry.get("type")!="blob" or entry["path"].lower().endswith(SKIPPED_SUFFIXES):
+            continue
+        files.append([entry["path"], entry.get("size", 0), entry["sha"]])
+    # Only directories with a <name>.py entry point are plugins the agent can run
+    if not any(path==plugin_name+".py" for path, size, sha in files):
+        return None
+    return {"tree": tree_sha, "files": sorted(files)}
+
+
+def split_tree(entries, directories):
+    grouped=dict((name, []) for name in directories)
+    for entry in entries:
+        name, separator, path=entry["path"].partition("/")
+        if separator and name in grouped:
+            grouped[name].append(dict(entry, path=path))
+    return grouped
+
+
+class Catalog:
+
+    def __init__(self, path, repository=REPOSITORY, ref=REF, downloader=None):
+        self.path=path
+        self.repository=repository
+        self.ref=ref
+        self.downloader=downloader or plugin_downloader.shared_downloader()
+        self.data=None
+        try:
+            with gzip.open(path, "rt") as f:
+                data=json.load(f)
+            if data.get("format")==CATALOG_FORMAT and data.get("repository")==repository and data.get("ref")==ref:
+                self.data=data
+        except (OSError, ValueError, EOFError):
+            self.data=None
+
+    def save(self):
+        text=json.dumps(self.data, separators=(",", ":"), sort_keys=True).encode()
+        plugin_downloader.write_atomic([gzip.compress(text, mtime=0)], self.path)
+
+    def stale(self, max_age=MAX_AGE):
+        return not self.data or time.time()-self.data.get("checked", 0) > max_age
+
+    def api(self, path, headers=None):
+        request_headers={"Accept": "application/vnd.github+json"}
+        if os.environ.get("GITHUB_TOKEN"):
+            request_headers["Authorization"]="Bearer "+os.environ["GITHUB_TOKEN"]
+        request_headers.update(headers or {})
+        status, response_headers, body=self.downloader.request(API_URL+self.repository+path, request_headers)
+        if status==304:
+            return None, response_headers
+        if status!=200:
+            raise CatalogError(f"{API_URL+self.repository+path} returned response code {status}")
+        return json.loads(body.decode()), response_headers
+
+    def tree(self, sha):
+        listing, headers=self.api(f"/git/trees/{sha}?recursive=1")
+        if listing.get("truncated"):
+            raise CatalogError(f"the tree listing of {sha} was truncated")
+        return listing["tree"]
+
+    def refresh(self, force=False):
+        known=self.data if self.data and not force else {}
+        headers={}
+        if known and known.get("etag"):
+            headers["If-None-Match"]=self.data["etag"]
+        root, response_headers=self.api(f"/git/trees/{urllib.parse.quote(self.ref)}", headers)
+
+        if root is None or (known and root["sha"]==known.get("tree")):
+            self.data["checked"]=time.time()
+            self.data["etag"]=response_headers.get("ETag") or self.data.get("etag")
+            self.save()
+            return []
+
+        # Each plugin directory is indexed under its tree SHA, so only the directories whose SHA moved are listed again
+        directories=dict((entry["path"], entry["sha"]) for entry in root["tree"] if entry["type"]=="tree")
+        changed=[name for name, sha in directories.items() if known.get("directories", {}).get(name)!=sha]
+        if len(changed) > MAX_CHANGED_TREES:
+            listings=split_tree(self.tree(root["sha"]), changed)
+        else:
+            listings=dict((name, self.tree(directories[name])) for name in changed)
+
+        plugins=dict((name, entry) for name, entry in known.get("plugins", {}).items() if directories.get(name)==entry["tree"])
+        for name in changed:
+            entry=plugin_entry(name, directories[name], listings[name])
+            if entry:
+                plugins[name]=entry
+
+        self.data={
+            "format": CATALOG_FORMAT,
+            "repository": self.repository,
+            "ref": self.ref,
+            "tree": root["sha"],
+            "etag": response_headers.get("ETag"),
+            "checked": time.time(),
+            "directories": directories,
+            "plugins": plugins,
+        }
+        self.save()
+        return changed
+
+    def names(self):
+        return sorted(self.data["plugins"]) if self.data else []
+
+    def find(self, plugin_name):
+        if not self.data:
+            return None, None
+        plugins=self.data["plugins"]
+        if plugin_name in plugins:
+            return plugin_name, plugins[plugin_name]
+        for name in plugins:
+            if name.lower()==plugin_name.lower():
+                return name, plugins[name]
+        return None, None
+
+    def raw_url(self, plugin_name):
+        return raw_url(plugin_name, self.repository, self.ref)
+
+    def files(self, plugin_name):
+        name, entry=self.find(plugin_name)
+        if not entry:
+            return []
+        return [(path, self.raw_url(name)+"/"+urllib.parse.quote(path), sha) for path, size, sha in entry["files"]]
+
+
+def upstream_file(plugin_dir, plugin_name):
+    return os.path.join(plugin_dir, plugin_name+".upstream.json")
+
+
+# The blob SHAs the installed files were downloaded as, the plugin file itself no longer hashes to its
+# upstream blob once its shebang has been rewritten
+def read_upstream(plugin_dir, plugin_name):
+    try:
+        with open(upstream_file(plugin_dir, plugin_name)) as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def upstream_record(catalog, plugin_name):
+    name, entry=catalog.find(plugin_name)
+    return {
+        "repository": catalog.repository,
+        "ref": catalog.ref,
+        "tree": entry["tree"],
+        "recorded": time.time(),
+        "files": dict((path, sha) for path, size, sha in entry["files"]),
+    }
+
+
+def save_upstream(plugin_dir, plugin_name, record):
+    try:
+        plugin_downloader.write_atomic([(json.dumps(record, indent=2)+"\n").encode()], upstream_file(plugin_dir, plugin_name))
+    except Exception as e:
+        print(f"    Unable to record the upstream file hashes of {plugin_name} : {str(e)}")
+        return False
+    return True
+
+
+def write_upstream(plugin_dir, plugin_name, catalog):
+    return save_upstream(plugin_dir, plugin_name, upstream_record(catalog, plugin_name))
+
+
+def load_catalog(path, downloader=None, refresh=True, max_age=MAX_AGE):
+    catalog=Catalog(path, downloader=downloader)
+    if refresh and catalog.stale(max_age):
+        try:
+            changed=catalog.refresh()
+            print(f"    Plugin catalog refreshed, {len(changed)} plugin directories re-indexed")
+        except Exception as e:
+            print(f"    Unable to refresh the plugin catalog : {str(e)}")
+    return catalog if catalog.data else None
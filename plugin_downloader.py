@@ -0,0 +1,317 @@
+import os
+import zlib
+import hashlib
+import tempfile
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+import concurrent.futures
+
+import plugin_metrics
+
+
+CHUNK_SIZE=64*1024
+MAX_REDIRECTS=5
+DEFAULT_WORKERS=4
+DEFAULT_TIMEOUT=30
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ChecksumError(DownloadError):
+    pass
+
+
+def write_atomic(chunks, full_path, expected=None):
+    filename=os.path.basename(full_path)
+    fd, tmp_path=tempfile.mkstemp(dir=os.path.dirname(full_path) or ".", prefix="."+filename+".", suffix=".part")
+    digest=hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        sha256=digest.hexdigest()
+        if expected and sha256!=expected.lower():
+            raise ChecksumError(f"{filename} checksum mismatch, expected sha256 {expected.lower()} but received {sha256}")
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return sha256
+
+
+def read_chunks(f):
+    while True:
+        chunk=f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+def decoded_chunks(response):
+    decoder=None
+    if (response.getheader("Content-Encoding") or "").lower()=="gzip":
+        decoder=zlib.decompressobj(16+zlib.MAX_WBITS)
+    for chunk in read_chunks(response):
+        plugin_metrics.count("bytes_downloaded", len(chunk))
+        yield decoder.decompress(chunk) if decoder else chunk
+    if decoder:
+        yield decoder.flush()
+
+
+def parse_checksums(text):
+    checksums={}
+    for line in text.splitlines():
+        fields=line.strip().split(None, 1)
+        if len(fields)!=2 or line.lstrip().startswith("#"):
+            continue
+        sha256, name=fields[0].lower(), fields[1].lstrip("*").strip()
+        checksums[name]=sha256
+        checksums.setdefault(name.split("/")[-1], sha256)
+    return checksums
+
+
+def expected_checksum(checksums, url):
+    if not checksums:
+        return None
+    return checksums.get(url) or checksums.get(url.split("/")[-1])
+
+
+class Downloader:
+
+    def __init__(self, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        self.workers=workers
+        self.timeout=timeout
+        self.lock=threading.Lock()
+        self.idle={}
+        self.pool=None
+
+    def _executor(self):
+        with self.lock:
+            if not self.pool:
+                self.pool=concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def _new_connection(self, scheme, host, port):
+        proxy=urllib.request.getproxies().get(scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            proxy=urllib.parse.urlsplit(proxy if "://" in proxy else "http://"+proxy)
+            connection_class=http.client.HTTPSConnection if scheme=="https" else http.client.HTTPConnection
+            connection=connection_class(proxy.hostname, proxy.port or 80, timeout=self.timeout)
+            connection.set_tunnel(host, port)
+            return connection
+        if scheme=="https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _acquire(self, origin):
+        with self.lock:
+            connections=self.idle.get(origin)
+            if connections:
+                return connections.pop(), True
+        return self._new_connection(*origin), False
+
+    def _release(self, origin, connection):
+        with self.lock:
+            connections=self.idle.setdefault(origin, [])
+            if len(connections) < self.workers:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle={}
+            pool, self.pool=self.pool, None
+        if pool:
+            pool.shutdown(wait=True)
+
+    def _request(self, url, headers):
+        parts=urllib.parse.urlsplit(url)
+        scheme=parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise DownloadError(f"unsupported URL scheme {parts.scheme}")
+        origin=(scheme, parts.hostname, parts.port or (443 if scheme=="https" else 80))
+        path=parts.path or "/"
+        if parts.query:
+            path+="?"+parts.query
+
+        request_headers={"Accept-Encoding": "gzip", "User-Agent": "site24x7-plugin-automation"}
+        request_headers.update(headers)
+
+        connection, reused=self._acquire(origin)
+        try:
+            connection.request("GET", path, headers=request_headers)
+            response=connection.getresponse()
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError):
+            connection.close()
+            if not reused:
+                raise
+            # An idle keep-alive connection was closed by the server, retry on a fresh one
+            connection=self._new_connection(*origin)
+            connection.request("GET", path, headers=request_headers)
+            response=connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+        return origin, connection, response
+
+    def _finish(self, origin, connection, response):
+        response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(origin, connection)
+
+    def get(self, url, full_path, headers=None, expected=None):
+        headers=headers or {}
+        for redirect in range(MAX_REDIRECTS+1):
+            origin, connection, response=self._request(url, headers)
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                location=urllib.parse.urljoin(url, response.getheader("Location"))
+                self._finish(origin, connection, response)
+                url=location
+                continue
+            if response.status!=200:
+                self._finish(origin, connection, response)
+                return response.status, response.headers, None
+
+            try:
+                sha256=write_atomic(decoded_chunks(response), full_path, expected)
+            except ChecksumError:
+                self._finish(origin, connection, response)
+                raise
+            except Exception:
+                connection.close()
+                raise
+            self._finish(origin, connection, response)
+            return response.status, response.headers, sha256
+        raise DownloadError(f"too many redirects for {url}")
+
+    def _from_cache(self, url, full_path, cache, meta, expected):
+        plugin_metrics.count("cache_hits")
+        with cache.open_data(url) as f:
+            write_atomic(read_chunks(f), full_path, expected or meta.get("sha256"))
+
+    def fetch(self, url, full_path, cache=None, checksums=None):
+        filename=url.split("/")[-1]
+        expected=expected_checksum(checksums, url)
+        meta=cache.lookup(url) if cache else None
+
+        try:
+            if cache and cache.offline:
+                if not meta:
+                    print(f"      {filename} is not in the plugin cache and offline mode is enabled")
+                    return False
+                self._from_cache(url, full_path, cache, meta, expected)
+                return "cached"
+
+            try:
+                status, headers, sha256=self.get(url, full_path, cache.conditional_headers(meta) if cache else {}, expected)
+            except ChecksumError:
+                raise
+            except Exception as e:
+                if not meta:
+                    raise
+                print(f"      {filename} Download Failed ({str(e)}), using the cached copy")
+                self._from_cache(url, full_path, cache, meta, expected)
+                return "cached"
+
+            if status==304 and meta:
+                self._from_cache(url, full_path, cache, meta, expected)
+                return "revalidated"
+            if status!=200:
+                print(f"      {filename} Download Failed with response code {status}")
+                return False
+
+        except ChecksumError as e:
+            print(f"      {str(e)}")
+            return False
+        except Exception as e:
+            print(f"      {filename} Download Failed : {str(e)}")
+            return False
+
+        if cache:
+            cache.store(url, full_path, headers, sha256)
+        return "downloaded"
+
+    def fetch_all(self, downloads, cache=None, checksums=None):
+        pool=self._executor()
+        futures=[(url, plugin_metrics.submit(pool, self.fetch, url, full_path, cache, checksums)) for url, full_path in downloads]
+        return [(url, future.result()) for url, future in futures]
+
+    # Small API responses are kept in memory, the status and headers are returned so callers can revalidate
+    def request(self, url, headers=None):
+        headers=headers or {}
+        for redirect in range(MAX_REDIRECTS+1):
+            origin, connection, response=self._request(url, headers)
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                location=urllib.parse.urljoin(url, response.getheader("Location"))
+                self._finish(origin, connection, response)
+                url=location
+                continue
+            try:
+                body=b"".join(decoded_chunks(response)) if response.status==200 else b""
+            except Exception:
+                connection.close()
+                raise
+            self._finish(origin, connection, response)
+            return response.status, response.headers, body
+        raise DownloadError(f"too many redirects for {url}")
+
+    def read(self, url):
+        status, headers, body=self.request(url)
+        if status!=200:
+            raise DownloadError(f"{url} returned response code {status}")
+        return body
+
+
+_shared=None
+_shared_lock=threading.Lock()
+
+
+def shared_downloader():
+    global _shared
+    with _shared_lock:
+        if not _shared:
+            _shared=Downloader()
+        return _shared
+
+
+def load_checksums(source):
+    try:
+        if source.startswith("http://") or source.startswith("https://"):
+            text=shared_downloader().read(source).decode()
+        else:
+            with open(source) as f:
+                text=f.read()
+    except Exception as e:
+        print(f"    Unable to load plugin checksums from {source} : {str(e)}")
+        return False
+    return parse_checksums(text)
+
+
+def download_files(downloads, cache=None, downloader=None, checksums=None):
+    downloader=downloader or shared_downloader()
+    success=True
+    for url, status in downloader.fetch_all(downloads, cache, checksums):
+        filename=url.split("/")[-1]
+        if not status:
+            success=False
+        elif status=="downloaded":
+            print(f"      {filename} Downloaded")
+        else:
+            print(f"      {filename} Served from the plugin cache ({status})")
+    return success
@@ -0,0 +1,1327 @@
+import os
+import re
+import stat
+import errno
+import fcntl
+import shlex
+import shutil
+import tempfile
+import time
+import argparse
+import importlib
+import importlib.util
+import importlib.metadata
+import threading
+import subprocess
+import collections
+import configparser
+import concurrent.futures
+
+import plugin_cache
+import plugin_bundle
+import plugin_catalog
+import plugin_state
+import plugin_metrics
+import plugin_pipeline
+import plugin_preflight
+import plugin_downloader
+import plugin_validation
+from plugin_agent import AGENT_PATH, INSTALL_METRICS_FILE, UPGRADE_METRICS_FILE, BACKEND_MODULES, backend_key, versions_path, list_versions, current_version, plugin_environment, render_arguments, read_config, plugin_validator, installed_plugins, validate_plugin
+
+
+PYTHON_INTERPRETER="/usr/bin/python3"
+# The cfg options that identify the database a plugin instance monitors
+ENDPOINT_OPTIONS=("host", "hostname", "port", "sid")
+PLUGIN_MODE=0o744
+DEFAULT_KEEP_VERSIONS=3
+
+Target = collections.namedtuple('Target', 'name backend args')
+
+ENGINE_OPTIONS={
+    "offline": False,
+    "checksums": None,
+    "in_process_validation": False,
+    "benchmark_runs": 0,
+    "poll_interval": plugin_validation.DEFAULT_POLL_INTERVAL,
+    "budget_fraction": plugin_validation.DEFAULT_BUDGET_FRACTION,
+    "max_rss_mb": None,
+    "reject_over_budget": False,
+    "wheelhouse": None,
+    "metrics_file": None,
+    "prometheus_file": None,
+    "restart": False,
+    "keep_versions": DEFAULT_KEEP_VERSIONS,
+    "interpreter": PYTHON_INTERPRETER,
+    "bundle": None,
+    "skip_preflight": False,
+    "preflight_timeout": plugin_preflight.DEFAULT_TIMEOUT,
+    "no_catalog": False,
+}
+
+# Steps a rerun may skip, and those whose result lives in the staged plugin files
+RESUMABLE_STEPS=("download", "shebang", "user", "chmod", "validate", "benchmark", "config")
+FILE_STEPS=("download", "shebang", "chmod", "validate", "benchmark", "config")
+
+
+# Only the options an upgrade honours, it provisions no user, writes no new shebang and never resumes
+def add_upgrade_arguments(parser):
+    parser.add_argument('--offline', help='take the changed plugin files from the local plugin cache only', action='store_true', default=None)
+    parser.add_argument('--checksums', help='sha256sum file (local path or URL) the changed plugin files are verified against', default=None)
+    parser.add_argument('--keep_versions', help=f'number of earlier plugin versions kept for rollback (default: {DEFAULT_KEEP_VERSIONS})', type=int, default=None)
+    parser.add_argument('--metrics_file', help=f'JSON file the per-step upgrade timings are written to (default: {UPGRADE_METRICS_FILE} in the agent temp directory)', default=None)
+    parser.add_argument('--prometheus_file', help='Prometheus textfile collector file the upgrade metrics are written to', default=None)
+
+
+def add_engine_arguments(parser):
+    parser.add_argument('--offline', help='install the plugin files from the local plugin cache only', action='store_true', default=None)
+    parser.add_argument('--checksums', help='sha256sum file (local path or URL) the plugin files are verified against', default=None)
+    parser.add_argument('--in_process_validation', help='validate the plugin inside this process instead of running it as a subprocess', action='store_true', default=None)
+    parser.add_argument('--benchmark_runs', help='run the plugin this many times after validation and record its latency, CPU time and peak RSS', type=int, default=None)
+    parser.add_argument('--poll_interval', help='Site24x7 agent poll interval in seconds the plugin budget is derived from', type=int, default=None)
+    parser.add_argument('--budget_fraction', help='fraction of the poll interval a plugin run may take (p95 wall and CPU time)', type=float, default=None)
+    parser.add_argument('--max_rss_mb', help='peak RSS in MB a plugin run may use', type=float, default=None)
+    parser.add_argument('--reject_over_budget', help='fail the install instead of warning when the plugin exceeds its budget', action='store_true', default=None)
+    parser.add_argument('--wheelhouse', help='install missing database drivers from this local wheel directory without contacting a package index', default=None)
+    parser.add_argument('--metrics_file', help='JSON file the per-step install timings are written to (default: plugin_install_metrics.json in the agent temp directory)', default=None)
+    parser.add_argument('--prometheus_file', help='Prometheus textfile collector file the install metrics are written to', default=None)
+    parser.add_argument('--interpreter', help=f'python interpreter written into the plugin shebang, e.g. the agent\'s bundled python (default: {PYTHON_INTERPRETER})', default=None)
+    parser.add_argument('--keep_versions', help=f'number of earlier plugin versions kept for rollback (default: {DEFAULT_KEEP_VERSIONS})', type=int, default=None)
+    parser.add_argument('--bundle', help='install the plugin files and drivers from this offline bundle (see bundle_auto.py) instead of the network', default=None)
+    parser.add_argument('--skip_preflight', help='start installing without first checking the agent directory, disk space, database, plugin origin and driver', action='store_true', default=None)
+    parser.add_argument('--preflight_timeout', help=f'seconds each preflight check may take (default: {plugin_preflight.DEFAULT_TIMEOUT})', type=float, default=None)
+    parser.add_argument('--no_catalog', help='download only <plugin>.py and <plugin>.cfg instead of every file the plugin catalog lists', action='store_true', default=None)
+    parser.add_argument('--restart', help='ignore the checkpoint of an earlier failed install and run every step again', action='store_true', default=None)
+
+
+def engine_options(args, settings=None):
+    options={}
+    for key, default in ENGINE_OPTIONS.items():
+        value=getattr(args, key, None)
+        if value is None and settings:
+            value=settings.get(key)
+        options[key]=default if value is None else value
+    return options
+
+
+def load_backend(name):
+    name=backend_key(name)
+    if name not in BACKEND_MODULES:
+        return None
+    return importlib.import_module(BACKEND_MODULES[name]).backend
+
+
+def copy_range(source_fd, destination_fd, size):
+    copied=0
+    use_copy_file_range=hasattr(os, "copy_file_range")
+    while copied < size:
+        sent=0
+        if use_copy_file_range:
+            try:
+                sent=os.copy_file_range(source_fd, destination_fd, size-copied, copied, copied)
+            except OSError as e:
+                # Kernels before 5.3 refuse cross-filesystem copy_file_range, sendfile works there
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+                use_copy_file_range=False
+                continue
+        else:
+            os.lseek(destination_fd, copied, os.SEEK_SET)
+            sent=os.sendfile(destination_fd, source_fd, copied, size-copied)
+        if sent==0:
+            break
+        copied+=sent
+    return copied
+
+
+def fsync_directory(path):
+    fd=os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_file(source, destination):
+    source_stat=os.stat(source)
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        copy_range(src.fileno(), dst.fileno(), source_stat.st_size)
+        os.fsync(dst.fileno())
+    os.chmod(destination, stat.S_IMODE(source_stat.st_mode))
+    os.utime(destination, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+
+
+def copy_tree(source, destination):
+    for root, directories, files in os.walk(source):
+        target_root=os.path.join(destination, os.path.relpath(root, source))
+        os.makedirs(target_root, exist_ok=True)
+        for name in directories+files:
+            source_path=os.path.join(root, name)
+            if os.path.islink(source_path):
+                os.symlink(os.readlink(source_path), os.path.join(target_root, name))
+            elif name in files:
+                copy_file(source_path, os.path.join(target_root, name))
+        os.chmod(target_root, stat.S_IMODE(os.stat(root).st_mode))
+        fsync_directory(target_root)
+
+
+# The copy is staged next to the destination and renamed into place, so the agent never sees a partial plugin
+def move_across_devices(source, destination):
+    parent=os.path.dirname(os.path.normpath(destination))
+    staging=tempfile.mkdtemp(dir=parent, prefix="."+os.path.basename(os.path.normpath(destination))+".", suffix=".tmp")
+    try:
+        copy_tree(source, staging)
+        os.rename(staging, destination)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    fsync_directory(parent)
+    shutil.rmtree(source)
+
+
+def move_folder(source, destination):
+    try:
+        try:
+            os.rename(source, destination)
+        except OSError as e:
+            if e.errno!=errno.EXDEV:
+                raise
+            move_across_devices(source, destination)
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+# UTC with microseconds, so the version names sort in install order
+def new_version(timestamp=None, suffix=None):
+    timestamp=time.time() if timestamp is None else timestamp
+    return time.strftime("%Y%m%d-%H%M%S", time.gmtime(timestamp))+f"{timestamp%1:.6f}"[1:]+"-"+(suffix or os.urandom(2).hex())
+
+
+# plugins/<name> is a symlink into plugin_versions/<name>/<version>, replacing it with rename() is atomic
+def activate_version(agent_plugin_path, plugin_name, version):
+    link=agent_plugin_path+plugin_name
+    target=os.path.relpath(versions_path(agent_plugin_path, plugin_name)+version, agent_plugin_path)
+    tmp_link=agent_plugin_path+"."+plugin_name+"."+os.urandom(4).hex()+".link"
+    os.symlink(target, tmp_link)
+    try:
+        os.replace(tmp_link, link)
+    except BaseException:
+        os.remove(tmp_link)
+        raise
+    fsync_directory(agent_plugin_path)
+
+
+def adopt_unversioned(agent_plugin_path, plugin_name):
+    link=agent_plugin_path+plugin_name
+    if os.path.islink(link) or not check_directory(link):
+        return None
+    version=new_version(os.stat(link).st_mtime, "unversioned")
+    if not move_folder(link, versions_path(agent_plugin_path, plugin_name)+version):
+        return False
+    return version
+
+
+# The version active before the swap always survives, rollback_auto.py returns to it
+def prune_versions(agent_plugin_path, plugin_name, keep=DEFAULT_KEEP_VERSIONS, replaced=None):
+    current=current_version(agent_plugin_path, plugin_name)
+    previous=[version for version in list_versions(agent_plugin_path, plugin_name) if version!=current]
+    for version in previous[:max(0, len(previous)-keep)]:
+        if version==replaced:
+            continue
+        shutil.rmtree(versions_path(agent_plugin_path, plugin_name)+version, ignore_errors=True)
+
+
+def move_plugin(plugin_name, plugins_temp_path, agent_plugin_path, keep_versions=DEFAULT_KEEP_VERSIONS):
+    try:
+        if not check_directory(agent_plugin_path):
+            print(f"    {agent_plugin_path} Agent Plugins Directory not Present")
+            return False
+        versions=versions_path(agent_plugin_path, plugin_name)
+        os.makedirs(versions, exist_ok=True)
+
+        # Installs of other instances of the same plugin, in this process or another, wait here so no section is lost
+        with open(versions+".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            config_file=plugin_name+"/"+plugin_name+".cfg"
+            if not merge_plugin_config(plugins_temp_path+config_file, agent_plugin_path+config_file):
+                return False
+
+            version=new_version()
+            if not move_folder(plugins_temp_path+plugin_name, versions+version):
+                return False
+
+            # A plugin installed before versioning is kept as a version, moving it out leaves a gap of one rename
+            adopted=adopt_unversioned(agent_plugin_path, plugin_name)
+            if adopted is False:
+                return False
+            replaced=adopted or current_version(agent_plugin_path, plugin_name)
+            activate_version(agent_plugin_path, plugin_name, version)
+            prune_versions(agent_plugin_path, plugin_name, keep_versions, replaced)
+
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+# Only the plugin code goes back, the active cfg is carried into the version being activated so the
+# instances added since that version stay monitored and the next install merges from them
+def rollback_plugin(agent_plugin_path, plugin_name, version=None):
+    try:
+        versions=versions_path(agent_plugin_path, plugin_name)
+        if not os.path.isdir(versions):
+            print(f"    No versions of the {plugin_name} plugin installed under {versions}")
+            return False
+        with open(versions+".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            installed=list_versions(agent_plugin_path, plugin_name)
+            current=current_version(agent_plugin_path, plugin_name)
+            if version is None:
+                older=[candidate for candidate in installed if current is None or candidate < current]
+                if not older:
+                    print(f"    No earlier version of the {plugin_name} plugin to roll back to")
+                    return False
+                version=older[-1]
+            elif version not in installed:
+                print(f"    Version {version} of the {plugin_name} plugin is not installed")
+                return False
+
+            config=read_config(agent_plugin_path+plugin_name+"/"+plugin_name+".cfg")
+            if config.sections():
+                write_config(config, versions+version+"/"+plugin_name+".cfg")
+            activate_version(agent_plugin_path, plugin_name, version)
+        print(f"    {plugin_name} plugin rolled back from {current} to {version}")
+
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+def write_config(config, path):
+    with open(path+".tmp", "w") as f:
+        config.write(f, space_around_delimiters=False)
+    os.replace(path+".tmp", path)
+
+
+# The database a section monitors, e.g. (("host", "db1"), ("port", "1521"), ("sid", "ORCL")), None when the section names no endpoint
+def section_endpoint(section):
+    endpoint=[]
+    for name in ENDPOINT_OPTIONS:
+        value=section.get(name)
+        if value:
+            endpoint.append(("host" if name=="hostname" else name, value.strip().lower()))
+    if not any(name=="host" for name, value in endpoint):
+        return None
+    return tuple(endpoint)
+
+
+# The staged cfg holds the instances being installed, every other instance of the installed plugin is carried over.
+# An installed section monitoring the same endpoint as a staged one is replaced under its installed name, so a legacy
+# [ORCL] section or one named by an earlier install does not leave the database monitored twice
+def merge_plugin_config(staged_config_file, installed_config_file):
+    try:
+        installed=read_config(installed_config_file)
+        if not installed.sections():
+            return True
+        staged=read_config(staged_config_file)
+        # Each staged section takes the name of the installed section it replaces, by name first and else by endpoint
+        names={}
+        for section in staged.sections():
+            endpoint=section_endpoint(staged[section])
+            matches=[name for name in installed.sections() if name==section] or [name for name in installed.sections() if endpoint and section_endpoint(installed[name])==endpoint]
+            names[matches[0] if matches else section]=section
+        endpoints=set(section_endpoint(staged[section]) for section in staged.sections())-{None}
+
+        merged=configparser.ConfigParser(interpolation=None)
+        merged.optionxform=str
+        for section in installed.sections():
+            if section in names:
+                merged[section]=dict(staged[names.pop(section)])
+            elif section_endpoint(installed[section]) not in endpoints:
+                merged[section]=dict(installed[section])
+        for name, section in names.items():
+            merged[name]=dict(staged[section])
+        write_config(merged, staged_config_file)
+
+    except Exception as e:
+        print(f"    Unable to merge the installed plugin configuration {installed_config_file} : {str(e)}")
+        return False
+    return True
+
+
+def plugin_config_setter(plugin_name, plugins_temp_path, arguments, section):
+    try:
+        full_path=plugins_temp_path+plugin_name+"/"
+        config_file_path=full_path+plugin_name+".cfg"
+
+        lines=[f"{name}={value}" for name, value in arguments]
+        with open(config_file_path, "w") as f:
+            f.write(f"[{section}]\n"+"\n".join(lines)+"\n")
+
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+def catalog_plugin(backend):
+    return backend.plugin_url==plugin_catalog.raw_url(backend.plugin_name)
+
+
+# Plugins served from the catalog repository install every file it lists, other origins keep the fixed file names
+def resolve_plugin_files(backend, catalog=None):
+    if catalog and catalog_plugin(backend) and catalog.find(backend.plugin_name)[1]:
+        return [(filename, url) for filename, url, sha in catalog.files(backend.plugin_name)]
+    return [(filename, backend.file_url(filename)) for filename in backend.plugin_files()]
+
+
+def down_move(backend, plugins_temp_path, cache=None, checksums=None, downloader=None, bundle=None, files=None):
+    temp_plugin_path=os.path.join(plugins_temp_path,backend.plugin_name+"/")
+    if not check_directory(temp_plugin_path):
+        if not make_directory(temp_plugin_path):return False
+
+    if bundle:
+        try:
+            for filename in plugin_bundle.extract_plugin(bundle, backend.plugin_name, temp_plugin_path):
+                print(f"      {filename} Extracted from {os.path.basename(bundle)}")
+        except Exception as e:
+            print(f"      Unable to extract the {backend.plugin_name} plugin from {bundle} : {str(e)}")
+            return False
+        return True
+
+    downloads=[]
+    for filename, url in files or [(filename, backend.file_url(filename)) for filename in backend.plugin_files()]:
+        if "/" in filename:
+            try:
+                os.makedirs(os.path.dirname(temp_plugin_path+filename), exist_ok=True)
+            except Exception as e:
+                print(str(e))
+                return False
+        downloads.append((url, temp_plugin_path+filename))
+    return plugin_downloader.download_files(downloads, cache, downloader, checksums)
+
+
+def plugin_body(plugin_file):
+    with open(plugin_file, "rb") as f:
+        first_line=f.readline()
+        return (b"" if first_line.startswith(b"#!") else first_line)+f.read()
+
+
+def plugin_interpreter(plugin_file):
+    try:
+        with open(plugin_file, "rb") as f:
+            first_line=f.readline()
+    except OSError:
+        return None
+    if not first_line.startswith(b"#!"):
+        return None
+    return first_line[2:].decode(errors="replace").strip() or None
+
+
+# Only the first line is touched: padded in place when the new shebang fits, otherwise the file is rewritten once
+def set_shebang(plugin_file, interpreter=PYTHON_INTERPRETER):
+    try:
+        if plugin_interpreter(plugin_file)==interpreter:
+            return True
+        # No blank after #!, so the usual upstream #!/usr/bin/python3 line is patched in place
+        shebang=f"#!{interpreter}".encode()
+        with open(plugin_file, "r+b") as f:
+            first_line=f.readline()
+            if not first_line.startswith(b"#!"):
+                first_line=b""
+                f.seek(0)
+            if first_line.endswith(b"\n") and len(shebang) < len(first_line):
+                # The kernel strips trailing blanks from the interpreter line
+                f.seek(0)
+                f.write(shebang.ljust(len(first_line)-1)+b"\n")
+                return True
+
+            directory=os.path.dirname(plugin_file) or "."
+            fd, tmp_path=tempfile.mkstemp(dir=directory, prefix="."+os.path.basename(plugin_file)+".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    out.write(shebang+b"\n")
+                    shutil.copyfileobj(f, out)
+                os.chmod(tmp_path, stat.S_IMODE(os.fstat(f.fileno()).st_mode))
+                os.replace(tmp_path, plugin_file)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+def make_executable(plugin_file, mode=PLUGIN_MODE):
+    try:
+        os.chmod(plugin_file, mode)
+    except Exception as e:
+        print(str(e))
+        return False
+    return True
+
+
+def execute_command(cmd, need_out=False, env=None, timeout=None):
+    try:
+        if not isinstance(cmd, list):
+            cmd=shlex.split(cmd)
+
+        plugin_metrics.count("subprocesses")
+        result=subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, timeout=timeout)
+        if result.returncode != 0:
+            print(f"    {cmd} execution failed with return code {result.returncode}")
+            print(f"    {str(result.stderr)}")
+            return False
+        if need_out:
+            return result.stdout
+        return True
+    except Exception as e:
+        print(    str(e))
+        return False
+
+
+def make_directory(path):
+    if not check_directory(path):
+        try:
+            os.mkdir(path)
+            print(f"    {path} directory created.")
+
+        except Exception as e:
+            print(f"    Unable to create {path} Directory  : {str(e)}")
+            return False
+    return True
+
+
+def check_directory(path):
+    return os.path.isdir(path)
+
+
+def version_tuple(version):
+    parts=[]
+    for piece in str(version).split("."):
+        match=re.match(r"\d+", piece)
+        if not match:
+            break
+        parts.append(int(match.group()))
+    return tuple(parts)
+
+
+def installed_driver(backend):
+    try:
+        if importlib.util.find_spec(backend.driver_module) is None:
+            return None
+    except (ImportError, ValueError):
+        return None
+
+    for distribution in backend.driver_distributions or (backend.driver,):
+        try:
+            version=importlib.metadata.version(distribution)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+        if not backend.driver_min_version or version_tuple(version) >= version_tuple(backend.driver_min_version):
+            return version
+        print(f"    {distribution} {version} is older than the required {backend.driver_min_version}")
+        return None
+
+    if backend.driver_min_version:
+        return None
+    return "unknown version"
+
+
+def driver_requirement(backend):
+    requirement=backend.driver
+    if backend.driver_min_version:
+        requirement+=">="+backend.driver_min_version
+    return requirement
+
+
+def driver_install_command(backend, wheelhouse=None):
+    cmd=["pip3", "install"]
+    if wheelhouse:
+        cmd+=["--no-index", "--find-links", wheelhouse]
+    return cmd+[driver_requirement(backend)]
+
+
+def user_confirm(interactive=True):
+    if not interactive:
+        return True
+    choice=input("    Do you want to continue? [Y/n]")
+    return choice=="Y" or choice=="y"
+
+
+class Backend:
+    name=None
+    display_name=None
+    plugin_name=None
+    plugin_url=None
+    driver=None
+    driver_module=None
+    driver_distributions=()
+    driver_min_version=None
+    config_section=None
+    confirm_steps=True
+    # Backends that discover cluster members set this and provide install_cluster(args, workers, agent_path)
+    discovery=False
+    staging_dirs=()
+    defaults={}
+    required=()
+    key_aliases={}
+
+    def plugin_files(self):
+        return [self.plugin_name+".py", self.plugin_name+".cfg"]
+
+    def file_url(self, filename):
+        return self.plugin_url+"/"+filename
+
+    def user_name(self, args):
+        return args.username
+
+    def endpoint(self, args):
+        return args.host, args.port
+
+    def instance_name(self, args):
+        # Named after the endpoint, so installing the plugin for another server keeps the sections already there
+        if getattr(args, "instance", None):
+            return args.instance
+        host, port=self.endpoint(args)
+        return f"{self.config_section}_{host}_{port}"
+
+    def create_user(self, args):
+        raise NotImplementedError
+
+    def plugin_arguments(self, args):
+        raise NotImplementedError
+
+    # Built from the cfg options, as validate_plugin builds it for the installed plugin
+    def environment(self, args):
+        return plugin_environment(self.plugin_arguments(args))
+
+    def close(self):
+        pass
+
+    def build_args(self, options):
+        values=dict(self.defaults)
+        for key, value in options.items():
+            values[self.key_aliases.get(key, key)]=value
+        missing=[key for key in self.required if not values.get(key)]
+        return argparse.Namespace(**values), missing
+
+
+class Engine:
+
+    def __init__(self, agent_path=AGENT_PATH, workers=8, validation_workers=4, offline=False, checksums=None, downloader=None,
+                 in_process_validation=False, validation_timeout=plugin_validation.DEFAULT_TIMEOUT, benchmark_runs=0,
+                 poll_interval=plugin_validation.DEFAULT_POLL_INTERVAL, budget_fraction=plugin_validation.DEFAULT_BUDGET_FRACTION,
+                 max_rss_mb=None, reject_over_budget=False, wheelhouse=None, metrics_file=None, prometheus_file=None, restart=False,
+                 keep_versions=DEFAULT_KEEP_VERSIONS, interpreter=PYTHON_INTERPRETER,
+                 skip_preflight=False, preflight_timeout=plugin_preflight.DEFAULT_TIMEOUT, bundle=None, no_catalog=False):
+        self.agent_path=os.path.join(agent_path,"")
+        self.agent_temp_path=self.agent_path+"temp/"
+        self.agent_plugin_path=self.agent_path+"plugins/"
+        self.plugins_temp_path=os.path.join(self.agent_temp_path,"plugins/")
+        self.workers=workers
+        self.offline=offline
+        self.checksums_source=checksums
+        self.checksums=None
+        self.cache=None
+        self.downloader=downloader or plugin_downloader.shared_downloader()
+        self.validation_pool=concurrent.futures.ThreadPoolExecutor(max_workers=validation_workers)
+        self.in_process_validation=in_process_validation
+        self.validation_timeout=validation_timeout
+        self.benchmark_runs=benchmark_runs
+        self.poll_interval=poll_interval
+        self.budget_fraction=budget_fraction
+        self.max_rss_mb=max_rss_mb
+        self.reject_over_budget=reject_over_budget
+        self.wheelhouse=wheelhouse
+        self.metrics_file=metrics_file
+        self.prometheus_file=prometheus_file
+        self.restart=restart
+        self.keep_versions=keep_versions
+        self.interpreter=interpreter
+        self.skip_preflight=skip_preflight
+        self.bundle=bundle
+        self.bundle_wheels=None
+        self.bundle_lock=threading.Lock()
+        self.preflight_timeout=preflight_timeout
+        self.no_catalog=no_catalog
+        self.catalog=None
+        self.catalog_lock=threading.Lock()
+        self.state=None
+        self.installs=[]
+        self.prepare_seconds=None
+        self.started=time.monotonic()
+        self.lock=threading.Lock()
+        self.drivers={}
+        self.backends=set()
+        self.driver_locks=collections.defaultdict(threading.Lock)
+        self.tag_output=False
+        self.group_moves=False
+        self.staged=collections.defaultdict(list)
+
+    def log(self, target, message):
+        if self.tag_output:
+            print(f"    [{target.name}] {message}")
+        else:
+            print(f"    {message}")
+
+    def fail(self, target, message=None):
+        if message:
+            self.log(target, message)
+        print("")
+        print(f"------------------------------ Plugin Automation Failed{' for '+target.name if self.tag_output else ''} ------------------------------")
+        return False
+
+    def prepare(self):
+        start=time.monotonic()
+        try:
+            return self._prepare()
+        finally:
+            self.prepare_seconds=time.monotonic()-start
+
+    def _prepare(self):
+        if not check_directory(self.agent_temp_path):
+            print("    Agent Directory does not Exist")
+            return False
+
+        self.cache=plugin_cache.open_cache(self.agent_temp_path+"plugin_cache/", offline=self.offline)
+        if self.offline and not self.cache:
+            print("    Offline mode requires the plugin cache")
+            return False
+        if self.bundle:
+            try:
+                manifest=plugin_bundle.load_manifest(self.bundle)
+            except Exception as e:
+                print(f"    Unable to read the bundle {self.bundle} : {str(e)}")
+                return False
+            print(f"    Installing from bundle {os.path.basename(self.bundle)} version {manifest.get('version')} ({', '.join(manifest['backends'])})")
+        elif self.checksums_source:
+            self.checksums=plugin_downloader.load_checksums(self.checksums_source)
+            if self.checksums is False:
+                return False
+
+        self.state=plugin_state.InstallState(self.agent_temp_path+"plugin_install_state.json")
+
+        print("    Creating Temporary Plugins Directory")
+        if not make_directory(self.plugins_temp_path):
+            return False
+        print("    Created Temporary Plugins Directory")
+        print()
+        return True
+
+    def check_driver(self, backend):
+        if not backend.driver or installed_driver(backend):
+            return []
+        if self.bundle:
+            problems=plugin_bundle.check_wheels(self.bundle)
+            if problems:
+                return [f"{backend.driver} is not installed and the "+problem for problem in problems]
+        if self.wheelhouse and not self.bundle and not check_directory(self.wheelhouse):
+            return [f"{backend.driver} is not installed and the wheelhouse {self.wheelhouse} does not exist"]
+        if not shutil.which("pip3"):
+            return [f"{backend.driver} is not installed and pip3 was not found"]
+        return []
+
+    def preflight(self, targets):
+        start=time.monotonic()
+        checks={
+            "agent": (plugin_preflight.check_agent, self.agent_path),
+            "disk": (plugin_preflight.check_disk, self.agent_path, plugin_preflight.MIN_FREE_MB),
+        }
+        for target in targets:
+            backend=target.backend
+            checks[("driver", backend.name)]=(self.check_driver, backend)
+            if self.bundle:
+                checks[("bundle", backend.name)]=(plugin_bundle.check_bundle, self.bundle, backend.plugin_name)
+            elif not self.offline:
+                checks[("origin", backend.name)]=(plugin_preflight.check_origin, backend.file_url(backend.plugin_files()[0]), self.preflight_timeout)
+            if backend.endpoint(target.args):
+                checks[("endpoint", target.name)]=(plugin_preflight.check_tcp, *backend.endpoint(target.args), self.preflight_timeout)
+
+        results=plugin_preflight.run_checks(checks, self.preflight_timeout)
+        verdict={}
+        for target in targets:
+            verdict[target.name]=results["agent"]+results["disk"]+results[("driver", target.backend.name)]+\
+                results.get(("origin", target.backend.name), [])+results.get(("bundle", target.backend.name), [])+results.get(("endpoint", target.name), [])
+
+        failed=[target for target in targets if verdict[target.name]]
+        if not failed:
+            print(f"    Preflight checks passed for {len(targets)} target{'s' if len(targets)!=1 else ''} in {time.monotonic()-start:.2f}s")
+        for target in failed:
+            for problem in verdict[target.name]:
+                self.log(target, f"Preflight check failed : {problem}")
+        print()
+        return verdict
+
+    def load_catalog(self, max_age=plugin_catalog.MAX_AGE):
+        with self.catalog_lock:
+            if self.catalog is None:
+                self.catalog=plugin_catalog.load_catalog(self.agent_temp_path+plugin_catalog.CATALOG_FILE, self.downloader, not self.offline, max_age) or False
+            return self.catalog
+
+    def backend_catalog(self, backend):
+        if self.no_catalog or not catalog_plugin(backend):
+            return None
+        catalog=self.load_catalog()
+        return catalog if catalog and catalog.find(backend.plugin_name)[1] else None
+
+    def plugin_files(self, backend):
+        return resolve_plugin_files(backend, self.backend_catalog(backend))
+
+    def drop(self, target, step):
+        metrics=plugin_metrics.InstallMetrics(target.name, target.backend.name)
+        metrics.failed_step=step
+        metrics.finish(False)
+        with self.lock:
+            self.installs.append(metrics)
+
+    def bundle_wheelhouse(self):
+        with self.bundle_lock:
+            if self.bundle_wheels is None:
+                wheelhouse=self.agent_temp_path+"bundle_wheels/"
+                try:
+                    os.makedirs(wheelhouse, exist_ok=True)
+                    plugin_bundle.extract_wheels(self.bundle, wheelhouse)
+                    self.bundle_wheels=wheelhouse
+                except Exception as e:
+                    print(f"    Unable to extract the driver wheels from {self.bundle} : {str(e)}")
+                    self.bundle_wheels=False
+            return self.bundle_wheels
+
+    def ensure_driver(self, backend):
+        with self.driver_locks[backend.name]:
+            self.backends.add(backend)
+            if backend.name in self.drivers:
+                return self.drivers[backend.name]
+            if not backend.driver:
+                self.drivers[backend.name]=True
+                return True
+
+            version=installed_driver(backend)
+            if version:
+                print(f"    {backend.driver} python module already installed ({version}), skipping pip")
+                print()
+                self.drivers[backend.name]=True
+                return True
+
+            wheelhouse=self.bundle_wheelhouse() if self.bundle else self.wheelhouse
+            if wheelhouse is False:
+                self.drivers[backend.name]=False
+                return False
+            print(f"    Installing {backend.driver} python module{' from '+wheelhouse if wheelhouse else ''}")
+            installed=bool(execute_command(driver_install_command(backend, wheelhouse)))
+            if installed:
+                importlib.invalidate_caches()
+                print(f"    Installed {backend.driver} python module")
+                print()
+            self.drivers[backend.name]=installed
+            return installed
+
+    def validate(self, target, plugin_file, arguments):
+        backend=target.backend
+        argv=render_arguments(arguments)
+        if self.in_process_validation:
+            try:
+                result=plugin_metrics.submit(self.validation_pool, plugin_validation.collect_in_process, plugin_file, argv, self.validation_timeout).result()
+            except plugin_validation.UnsupportedPlugin as e:
+                self.log(target, f"In-process validation unavailable ({str(e)}), running the plugin as a subprocess")
+            else:
+                return bool(result) and plugin_validator(result)
+
+        env=dict(os.environ, **backend.environment(target.args))
+        result=plugin_metrics.submit(self.validation_pool, execute_command, [plugin_file]+argv, True, env, self.validation_timeout).result()
+        return plugin_validator(result)
+
+    def benchmark(self, target, plugin_file, arguments):
+        backend=target.backend
+        env=dict(os.environ, **backend.environment(target.args))
+        cmd=[plugin_file]+render_arguments(arguments)
+        try:
+            stats=plugin_metrics.submit(self.validation_pool, plugin_validation.benchmark_plugin, cmd, self.benchmark_runs, env, self.validation_timeout).result()
+        except Exception as e:
+            self.log(target, f"Plugin benchmark failed : {str(e)}")
+            return False
+        if not stats:
+            return False
+
+        budget, violations=plugin_validation.check_budget(stats, self.poll_interval, self.budget_fraction, self.max_rss_mb)
+        self.log(target, f"Plugin benchmark over {stats['runs']} runs : wall p50 {stats['wall_p50']:.2f}s p95 {stats['wall_p95']:.2f}s p99 {stats['wall_p99']:.2f}s, "
+                         f"CPU p95 {stats['cpu_p95']:.2f}s, peak RSS {stats['max_rss_mb']:.1f} MB (budget {budget:.2f}s)")
+
+        previous=plugin_validation.load_benchmark(self.agent_plugin_path+backend.plugin_name+"/"+backend.plugin_name+".benchmark.json")
+        if previous and previous.get("stats"):
+            self.log(target, f"Previously installed plugin : wall p95 {previous['stats']['wall_p95']:.2f}s, peak RSS {previous['stats']['max_rss_mb']:.1f} MB")
+
+        plugin_validation.save_benchmark(os.path.dirname(plugin_file)+"/"+backend.plugin_name+".benchmark.json", {
+            "target": target.name,
+            "recorded": time.time(),
+            "poll_interval": self.poll_interval,
+            "budget_fraction": self.budget_fraction,
+            "budget": budget,
+            "max_rss_mb": self.max_rss_mb,
+            "violations": violations,
+            "stats": stats,
+        })
+
+        for violation in violations:
+            self.log(target, f"Plugin over budget : {violation}")
+        if violations and self.reject_over_budget:
+            return False
+        return True
+
+    def install(self, target, interactive=False, temp_subdir=""):
+        metrics=plugin_metrics.InstallMetrics(target.name, target.backend.name)
+        token=plugin_metrics.activate(metrics)
+        status=False
+        try:
+            status=self._install(target, metrics, interactive, temp_subdir)
+        finally:
+            metrics.finish(status)
+            plugin_metrics.deactivate(token)
+            with self.lock:
+                self.installs.append(metrics)
+        return status
+
+    def confirm(self, target, interactive=False):
+        backend=target.backend
+        if not (interactive and backend.confirm_steps):
+            return True
+
+        # The steps overlap once the install starts, so every prompt is asked up front
+        if backend.driver and backend.name not in self.drivers and not installed_driver(backend):
+            self.log(target, f"{backend.driver} python module is not installed, it will be installed with pip3")
+            if not user_confirm(True):
+                return self.fail(target, f"{backend.driver} not installed")
+        self.log(target, f"{backend.display_name} Plugin Files will be downloaded from {backend.plugin_url}")
+        if not user_confirm(True):
+            return self.fail(target, f"{backend.display_name} Files not Downloaded")
+        user=backend.user_name(target.args)
+        if user:
+            self.log(target, f"The {backend.display_name} User \"{user}\" will be set for Plugin Execution")
+            if not user_confirm(True):
+                return self.fail(target, f"User creation \"{user}\" failed")
+        print()
+        return True
+
+    def _install(self, target, metrics, interactive=False, temp_subdir=""):
+        backend=target.backend
+        args=target.args
+        if not self.confirm(target, interactive):
+            return False
+
+        plugins_temp_path=self.plugins_temp_path
+        if temp_subdir:
+            plugins_temp_path=os.path.join(plugins_temp_path,temp_subdir,"")
+        plugin_dir=plugins_temp_path+backend.plugin_name+"/"
+        plugin_file=plugin_dir+backend.plugin_name+".py"
+        arguments=backend.plugin_arguments(args)
+
+        def driver():
+            return self.ensure_driver(backend)
+
+        def staging():
+            if temp_subdir and not make_directory(plugins_temp_path):
+                return False
+            for directory in backend.staging_dirs:
+                if not make_directory(os.path.join(plugins_temp_path,directory)):
+                    return False
+            return True
+
+        def download():
+            self.log(target, f"Downloading {backend.display_name} Plugin Files")
+            files=None if self.bundle else self.plugin_files(backend)
+            if not down_move(backend, plugins_temp_path, self.cache, self.checksums, self.downloader, self.bundle, files):
+                return False
+            if self.bundle:
+                upstream=plugin_bundle.plugin_upstream(self.bundle, backend.plugin_name)
+                if upstream and not plugin_catalog.save_upstream(plugin_dir, backend.plugin_name, upstream):
+                    return False
+            else:
+                catalog=self.backend_catalog(backend)
+                if catalog and not plugin_catalog.write_upstream(plugin_dir, backend.plugin_name, catalog):
+                    return False
+            self.log(target, f"Downloaded {backend.display_name} Plugin Files")
+            return True
+
+        def shebang():
+            self.log(target, f"Setting the python3 path in the {backend.plugin_name}.py file")
+            if not os.access(self.interpreter, os.X_OK):
+                self.log(target, f"{self.interpreter} is not an executable python interpreter")
+                return False
+            return set_shebang(plugin_file, self.interpreter)
+
+        def user():
+            user_name=backend.user_name(args)
+            if not user_name:
+                return backend.create_user(args)
+            self.log(target, f"Setting the {backend.display_name} User \"{user_name}\" for Plugin Execution")
+            if not backend.create_user(args):
+                return False
+            self.log(target, f"\"{user_name}\" User created / Exists")
+            return True
+
+        def chmod():
+            self.log(target, "Creating executable plugin file")
+            if not make_executable(plugin_file):
+                return False
+            self.log(target, "Created executable plugin file")
+            return True
+
+        def validate():
+            self.log(target, "Validating the python plugin output")
+            if not self.validate(target, plugin_file, arguments):
+                return False
+            self.log(target, "Plugin output validated successfully")
+            return True
+
+        def benchmark():
+            self.log(target, "Benchmarking the plugin execution")
+            return self.benchmark(target, plugin_file, arguments)
+
+        def config():
+            self.log(target, f"Setting plugin configuration for the \"{backend.instance_name(args)}\" instance")
+            if not plugin_config_setter(backend.plugin_name, plugins_temp_path, arguments, backend.instance_name(args)):
+                return False
+            self.log(target, "Plugin configuration set sucessfully")
+            return True
+
+        def move():
+            if self.group_moves:
+                # Every target of the run lands in one version, swapped in once all of them are validated
+                with self.lock:
+                    self.staged[backend.plugin_name].append((target, plugins_temp_path))
+                self.log(target, "Plugin staged, it moves into the Site24x7 Agent directory once every target of the run is done")
+                return True
+            self.log(target, "Moving the plugin into the Site24x7 Agent directory")
+            if not move_plugin(backend.plugin_name, plugins_temp_path, self.agent_plugin_path, self.keep_versions):
+                return False
+            self.log(target, "Moved the plugin into the Site24x7 Agent directory")
+            return True
+
+        # Only the plugin file chain and the user (which needs the driver) are real dependencies,
+        # the driver install, the download and the user creation overlap
+        steps=[
+            plugin_pipeline.Step("driver", driver, ()),
+            plugin_pipeline.Step("staging", staging, ()),
+            plugin_pipeline.Step("download", download, ("staging",)),
+            plugin_pipeline.Step("shebang", shebang, ("download",)),
+            plugin_pipeline.Step("user", user, ("driver",)),
+            plugin_pipeline.Step("chmod", chmod, ("shebang",)),
+            plugin_pipeline.Step("validate", validate, ("chmod", "user")),
+        ]
+        if self.benchmark_runs:
+            steps.append(plugin_pipeline.Step("benchmark", benchmark, ("validate",)))
+        steps+=[
+            plugin_pipeline.Step("config", config, (steps[-1].name,)),
+            plugin_pipeline.Step("move", move, ("config",)),
+        ]
+
+        completed=self.resume(target, plugin_dir)
+
+        def checkpoint(name):
+            if self.state and name in RESUMABLE_STEPS:
+                self.state.complete(target.name, name, plugin_state.files_fingerprint(plugin_dir))
+
+        if not plugin_pipeline.run(steps, metrics, completed, checkpoint):
+            return self.fail(target)
+        if self.state and not self.group_moves:
+            self.state.clear(target.name)
+        print()
+        return True
+
+    def resume(self, target, plugin_dir):
+        if not self.state:
+            return set()
+        backend=target.backend
+        if self.restart:
+            self.state.clear(target.name)
+        # Every option that changes the staged files belongs here, otherwise a rerun resumes past them
+        inputs=plugin_state.inputs_hash(backend.name, backend.plugin_url, backend.plugin_files(), vars(target.args), self.checksums_source, self.bundle,
+                                        self.benchmark_runs, self.interpreter, self.no_catalog)
+        completed=self.state.resume(target.name, inputs, plugin_state.files_fingerprint(plugin_dir), FILE_STEPS)&set(RESUMABLE_STEPS)
+        if completed:
+            self.log(target, f"Resuming the earlier install, skipping the completed steps : {', '.join(step for step in RESUMABLE_STEPS if step in completed)}")
+            plugin_metrics.count("steps_resumed", len(completed))
+        return completed
+
+    def _run(self, target, results):
+        start=time.monotonic()
+        try:
+            status=self.install(target, temp_subdir=target.name)
+        except Exception as e:
+            self.log(target, str(e))
+            status=False
+        with self.lock:
+            results[target.name]=(bool(status), time.monotonic()-start)
+
+    # Broken targets are dropped here instead of holding a worker for the whole pipeline
+    def preflight_targets(self, targets, results):
+        verdict=self.preflight(targets)
+        for target in targets:
+            if verdict[target.name]:
+                self.drop(target, "preflight")
+                results[target.name]=(False, 0.0)
+        return [target for target in targets if not verdict[target.name]]
+
+    def install_all(self, targets):
+        results={}
+        self.tag_output=True
+        if not self.skip_preflight:
+            targets=self.preflight_targets(targets, results)
+            if not targets:
+                self.write_metrics()
+                return results
+
+        if not self.prepare():
+            return dict(results, **{target.name: (False, 0.0) for target in targets})
+
+        self.group_moves=True
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for target in targets:
+                pool.submit(self._run, target, results)
+        self.move_staged(results)
+        self.write_metrics()
+        return results
+
+    # One cfg merge and one version swap per plugin, so the agent sees a single change and the version
+    # from before the run stays available to rollback however many targets the run had
+    def move_staged(self, results):
+        for plugin_name, staged in sorted(self.staged.items()):
+            staged=sorted(staged, key=lambda entry: entry[0].name)
+            names=[target.name for target, plugins_temp_path in staged]
+            base_path=staged[0][1]
+            config_file=plugin_name+"/"+plugin_name+".cfg"
+            print(f"    Moving the {plugin_name} plugin with the instances {', '.join(names)} into the Site24x7 Agent directory")
+            status=True
+            start=time.monotonic()
+            for target, plugins_temp_path in staged[1:]:
+                status=status and merge_plugin_config(base_path+config_file, plugins_temp_path+config_file)
+            status=status and move_plugin(plugin_name, base_path, self.agent_plugin_path, self.keep_versions)
+            for target, plugins_temp_path in staged[1:]:
+                shutil.rmtree(plugins_temp_path+plugin_name, ignore_errors=True)
+
+            duration=time.monotonic()-start
+            with self.lock:
+                for metrics in self.installs:
+                    if metrics.target in names:
+                        metrics.steps.append({"step": "swap", "seconds": duration})
+                        if not status:
+                            metrics.failed_step="swap"
+                            metrics.status=False
+                for name in names:
+                    results[name]=(status and results[name][0], results[name][1]+duration)
+            if status:
+                print(f"    Moved the {plugin_name} plugin into the Site24x7 Agent directory")
+                for name in names:
+                    if self.state:
+                        self.state.clear(name)
+            else:
+                print(f"------------------------------ Plugin Automation Failed for {', '.join(names)} ------------------------------")
+        self.staged.clear()
+
+    def upgrade(self, plugin_name, check=False):
+        metrics=plugin_metrics.InstallMetrics(plugin_name, "upgrade")
+        token=plugin_metrics.activate(metrics)
+        status=False
+        try:
+            status=self._upgrade(Target(plugin_name, None, None), metrics, check)
+        finally:
+            metrics.finish(status)
+            plugin_metrics.deactivate(token)
+            with self.lock:
+                self.installs.append(metrics)
+        return status
+
+    def _upgrade(self, target, metrics, check=False):
+        plugin_name=target.name
+        installed=self.agent_plugin_path+plugin_name+"/"
+        plugin_file=plugin_name+".py"
+        config_file=plugin_name+".cfg"
+
+        with metrics.step("compare"):
+            if not check_directory(installed):
+                return self.fail(target, f"{plugin_name} is not installed under {self.agent_plugin_path}")
+            catalog=self.load_catalog(0)
+            if not catalog or not catalog.find(plugin_name)[1]:
+                return self.fail(target, f"{plugin_name} is not in the plugin catalog")
+
+            # The instance cfg belongs to this host and is never replaced
+            upstream=dict((path, (url, sha)) for path, url, sha in catalog.files(plugin_name) if path!=config_file)
+            recorded=plugin_catalog.read_upstream(installed, plugin_name)
+            changed=[]
+            for path, (url, sha) in sorted(upstream.items()):
+                current=None
+                if os.path.isfile(installed+path):
+                    current=recorded.get(path)
+                    if current is None and path!=plugin_file:
+                        current=plugin_catalog.blob_sha(installed+path)
+                if current!=sha:
+                    changed.append(path)
+            removed=sorted(path for path in recorded if path not in upstream and path!=config_file and os.path.isfile(installed+path))
+
+        if not changed and not removed:
+            self.log(target, f"{plugin_name} is up to date with {catalog.repository}@{catalog.ref}")
+            return True
+        self.log(target, f"{plugin_name} upstream changes : {', '.join(changed+[path+' (removed)' for path in removed])}")
+        if check:
+            return True
+
+        stage_root=os.path.join(self.plugins_temp_path, "upgrade", "")
+        stage=stage_root+plugin_name+"/"
+        with metrics.step("staging"):
+            shutil.rmtree(stage, ignore_errors=True)
+            os.makedirs(stage_root, exist_ok=True)
+            copy_tree(os.path.realpath(installed), stage)
+
+        with metrics.step("download"):
+            self.log(target, f"Downloading {len(changed)} changed file{'s' if len(changed)!=1 else ''}")
+            modes={}
+            downloads=[]
+            for path in changed:
+                if os.path.isfile(stage+path):
+                    modes[path]=stat.S_IMODE(os.stat(stage+path).st_mode)
+                os.makedirs(os.path.dirname(stage+path), exist_ok=True)
+                downloads.append((upstream[path][0], stage+path))
+            if not plugin_downloader.download_files(downloads, self.cache, self.downloader, self.checksums):
+                return self.fail(target)
+            for path, mode in modes.items():
+                os.chmod(stage+path, mode)
+            for path in removed:
+                os.remove(stage+path)
+
+        revalidate=any(path.endswith(".py") and path!=plugin_file for path in changed)
+        if plugin_file in changed:
+            with metrics.step("shebang"):
+                # Without recorded hashes the plugin file is compared past its first line, the shebang we wrote
+                body_changed=plugin_body(stage+plugin_file)!=plugin_body(installed+plugin_file)
+                if not body_changed and changed==[plugin_file] and not removed:
+                    shutil.rmtree(stage, ignore_errors=True)
+                    self.log(target, f"{plugin_name} is up to date with {catalog.repository}@{catalog.ref}, its upstream hashes are now recorded")
+                    return plugin_catalog.write_upstream(installed, plugin_name, catalog)
+                revalidate=revalidate or body_changed
+                if not set_shebang(stage+plugin_file, plugin_interpreter(installed+plugin_file) or self.interpreter):
+                    return self.fail(target)
+                if not make_executable(stage+plugin_file):
+                    return self.fail(target)
+
+        if revalidate:
+            with metrics.step("validate"):
+                self.log(target, "Validating the upgraded plugin for every configured instance")
+                results=validate_plugin(stage_root, plugin_name, self.validation_timeout)
+                if not all(results.values()):
+                    return self.fail(target, "The upgraded plugin failed validation, the installed version is kept")
+                self.log(target, "Plugin output validated successfully")
+
+        with metrics.step("move"):
+            if not plugin_catalog.write_upstream(stage, plugin_name, catalog):
+                return self.fail(target)
+            if not move_plugin(plugin_name, stage_root, self.agent_plugin_path, self.keep_versions):
+                return self.fail(target)
+        self.log(target, f"{plugin_name} upgraded to {catalog.repository}@{catalog.ref} ({current_version(self.agent_plugin_path, plugin_name)})")
+        return True
+
+    def _run_upgrade(self, plugin_name, check, results):
+        start=time.monotonic()
+        try:
+            status=self.upgrade(plugin_name, check)
+        except Exception as e:
+            print(f"    [{plugin_name}] {str(e)}")
+            status=False
+        with self.lock:
+            results[plugin_name]=(bool(status), time.monotonic()-start)
+
+    def upgrade_all(self, plugin_names, check=False):
+        results={}
+        self.tag_output=len(plugin_names) > 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for plugin_name in plugin_names:
+                pool.submit(self._run_upgrade, plugin_name, check, results)
+        # Kept apart from the install metrics, status reports those as the last install run
+        self.write_metrics(UPGRADE_METRICS_FILE)
+        return results
+
+    def write_metrics(self, default_file=INSTALL_METRICS_FILE):
+        duration=time.monotonic()-self.started
+        metrics_file=self.metrics_file
+        if not metrics_file and check_directory(self.agent_temp_path):
+            metrics_file=self.agent_temp_path+default_file
+        if metrics_file:
+            plugin_metrics.write_json(metrics_file, self.installs, self.prepare_seconds, duration)
+        if self.prometheus_file:
+            plugin_metrics.write_prometheus(self.prometheus_file, self.installs)
+
+    def close(self):
+        self.validation_pool.shutdown(wait=True)
+        for backend in self.backends:
+            backend.close()
+
+
+def print_report(targets, results, elapsed):
+    print()
+    print("------------------------------ Batch Plugin Automation Report ------------------------------")
+    width=max([len(target.name) for target in targets]+[6])
+    for target in targets:
+        status, duration=results[target.name]
+        print(f"    {target.name.ljust(width)}  {target.backend.name.ljust(8)}  {'SUCCESS' if status else 'FAILED '}  {duration:8.2f}s")
+    succeeded=sum(1 for status, duration in results.values() if status)
+    print()
+    print(f"    {succeeded}/{len(targets)} targets installed successfully in {elapsed:.2f}s")
+
+
+def initiate(backend, args, interactive=True, agent_path=AGENT_PATH):
+    print(" ")
+    print("------------------------------ Starting Plugin Automation ------------------------------")
+    print()
+
+    engine=Engine(agent_path=agent_path, workers=1, validation_workers=1, **engine_options(args))
+    target=Target(backend.plugin_name, backend, args)
+    try:
+        if not engine.skip_preflight and engine.preflight([target])[target.name]:
+            engine.drop(target, "preflight")
+            engine.write_metrics()
+            return engine.fail(target)
+        if not engine.prepare():
+            return engine.fail(target)
+        status=engine.install(target, interactive=interactive)
+        engine.write_metrics()
+        if not status:
+            return False
+    finally:
+        engine.close()
+
+    print("------------------------------ Successfully Completed Plugin Automation ------------------------------")
+    return True
+
+
+def upgrade(plugin_names, args, check=False, agent_path=AGENT_PATH):
+    print(" ")
+    print("------------------------------ Starting Plugin Upgrade ------------------------------")
+    print()
+
+    engine=Engine(agent_path=agent_path, **engine_options(args))
+    try:
+        if not engine.prepare():
+            print("------------------------------ Plugin Upgrade Failed ------------------------------")
+            return False
+        if not plugin_names:
+            catalog=engine.load_catalog(0)
+            installed=installed_plugins(engine.agent_plugin_path)
+            plugin_names=[name for name in installed if catalog and catalog.find(name)[1]]
+            skipped=[name for name in installed if name not in plugin_names]
+            if skipped:
+                print(f"    Not in the plugin catalog, skipped : {', '.join(skipped)}")
+        results=engine.upgrade_all(plugin_names, check)
+    finally:
+        engine.close()
+
+    failed=[name for name, (status, duration) in results.items() if not status]
+    print()
+    if failed:
+        print(f"------------------------------ Plugin Upgrade Failed for {', '.join(sorted(failed))} ------------------------------")
+        return False
+    print("------------------------------ Successfully Completed Plugin Upgrade ------------------------------")
+    return True
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import tempfile
+import contextlib
+import contextvars
+
+
+COUNTERS=("bytes_downloaded", "cache_hits", "subprocesses", "db_round_trips", "steps_resumed")
+
+current_metrics=contextvars.ContextVar("current_metrics", default=None)
+
+
+class InstallMetrics:
+
+    def __init__(self, target, backend):
+        self.target=target
+        self.backend=backend
+        self.started=time.time()
+        self.duration=None
+        self.status=None
+        self.failed_step=None
+        self.steps=[]
+        self.counters=dict.fromkeys(COUNTERS, 0)
+
+    @contextlib.contextmanager
+    def step(self, name):
+        start=time.monotonic()
+        self.failed_step=name
+        try:
+            yield
+        finally:
+            self.steps.append({"step": name, "seconds": time.monotonic()-start})
+
+    def count(self, counter, amount=1):
+        self.counters[counter]=self.counters.get(counter, 0)+amount
+
+    def finish(self, status):
+        self.status=bool(status)
+        self.duration=time.time()-self.started
+        if self.status:
+            self.failed_step=None
+
+    def as_dict(self):
+        return {
+            "target": self.target,
+            "backend": self.backend,
+            "status": "success" if self.status else "failed",
+            "failed_step": self.failed_step,
+            "started": self.started,
+            "duration": self.duration,
+            "steps": self.steps,
+            "counters": self.counters,
+        }
+
+
+def activate(metrics):
+    return current_metrics.set(metrics)
+
+
+def deactivate(token):
+    current_metrics.reset(token)
+
+
+def count(counter, amount=1):
+    metrics=current_metrics.get()
+    if metrics:
+        metrics.count(counter, amount)
+
+
+def submit(pool, fn, *args):
+    # Pool threads do not inherit context variables, so counters would be lost without this
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def write_atomic(path, text):
+    directory=os.path.dirname(os.path.abspath(path))
+    fd, tmp_path=tempfile.mkstemp(dir=directory, prefix="."+os.path.basename(path)+".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def summary(installs, prepare_seconds=None, duration=None):
+    return {
+        "generated": time.time(),
+        "duration": duration,
+        "prepare_seconds": prepare_seconds,
+        "targets": [metrics.as_dict() for metrics in installs],
+    }
+
+
+def write_json(path, installs, prepare_seconds=None, duration=None):
+    try:
+        write_atomic(path, json.dumps(summary(installs, prepare_seconds, duration), indent=2)+"\n")
+    except Exception as e:
+        print(f"    Unable to write the install metrics to {path} : {str(e)}")
+        return False
+    return True
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(installs):
+    families=[
+        ("site24x7_plugin_install_success", "Whether the last plugin install for the target succeeded"),
+        ("site24x7_plugin_install_duration_seconds", "Wall time of the last plugin install for the target"),
+        ("site24x7_plugin_install_step_seconds", "Wall time of each step of the last plugin install"),
+        ("site24x7_plugin_install_timestamp_seconds", "Unix time the last plugin install for the target started"),
+    ]+[(f"site24x7_plugin_install_{counter}", f"{counter.replace('_', ' ').capitalize()} during the last plugin install") for counter in COUNTERS]
+
+    samples=dict((name, []) for name, description in families)
+    for metrics in installs:
+        labels=f'target="{label_value(metrics.target)}",backend="{label_value(metrics.backend)}"'
+        samples["site24x7_plugin_install_success"].append((labels, 1 if metrics.status else 0))
+        samples["site24x7_plugin_install_duration_seconds"].append((labels, metrics.duration or 0))
+        samples["site24x7_plugin_install_timestamp_seconds"].append((labels, metrics.started))
+        for step in metrics.steps:
+            samples["site24x7_plugin_install_step_seconds"].append((labels+f',step="{label_value(step["step"])}"', step["seconds"]))
+        for counter in COUNTERS:
+            samples[f"site24x7_plugin_install_{counter}"].append((labels, metrics.counters.get(counter, 0)))
+
+    lines=[]
+    for name, description in families:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples[name]:
+            lines.append(f"{name}{{{labels}}} {value}")
+    return "\n".join(lines)+"\n"
+
+
+def write_prometheus(path, installs):
+    try:
+        write_atomic(path, prometheus_text(installs))
+    except Exception as e:
+        print(f"    Unable to write the Prometheus metrics to {path} : {str(e)}")
+        return False
+    return True
@@ -0,0 +1,63 @@
+import asyncio
+import collections
+
+
+Step = collections.namedtuple('Step', 'name run after')
+
+
+async def run_step(step, metrics):
+    with metrics.step(step.name):
+        # Every step is blocking (subprocesses, database drivers, sockets), so it runs in the loop's executor
+        return await asyncio.to_thread(step.run)
+
+
+def check_graph(steps):
+    names=set(step.name for step in steps)
+    for step in steps:
+        unknown=[name for name in step.after if name not in names]
+        if unknown:
+            raise ValueError(f"step {step.name} depends on unknown steps {', '.join(unknown)}")
+
+
+async def run_graph(steps, metrics, completed=(), on_complete=None):
+    check_graph(steps)
+    pending=collections.OrderedDict((step.name, step) for step in steps if step.name not in completed)
+    running={}
+    done=set(step.name for step in steps if step.name in completed)
+    failed=None
+
+    while pending or running:
+        if not failed:
+            for name, step in list(pending.items()):
+                if all(dependency in done for dependency in step.after):
+                    running[asyncio.ensure_future(run_step(step, metrics))]=name
+                    del pending[name]
+        if not running:
+            break
+
+        finished, unfinished=await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in finished:
+            name=running.pop(task)
+            if task.exception():
+                print(f"    {name} step failed : {str(task.exception())}")
+                status=False
+            else:
+                status=task.result()
+            if status:
+                done.add(name)
+                if on_complete:
+                    on_complete(name)
+            elif not failed:
+                # Steps already running are left to finish, nothing new is started after a failure
+                failed=name
+
+    if pending and not failed:
+        failed=next(iter(pending))
+        print(f"    Steps {', '.join(pending)} can never run, their dependencies form a cycle")
+    if failed:
+        metrics.failed_step=failed
+    return not failed
+
+
+def run(steps, metrics, completed=(), on_complete=None):
+    return asyncio.run(run_graph(steps, metrics, completed, on_complete))
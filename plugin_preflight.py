@@ -0,0 +1,66 @@
+import os
+import time
+import socket
+import shutil
+import urllib.request
+import concurrent.futures
+
+
+DEFAULT_TIMEOUT=1.0
+MIN_FREE_MB=50
+
+
+def check_agent(agent_path):
+    problems=[]
+    for directory in ("temp/", "plugins/"):
+        path=agent_path+directory
+        if not os.path.isdir(path):
+            problems.append(f"{path} does not exist")
+        elif not os.access(path, os.W_OK | os.X_OK):
+            problems.append(f"{path} is not writable")
+    return problems
+
+
+def check_disk(path, min_free_mb=MIN_FREE_MB):
+    if not os.path.isdir(path):
+        return []
+    free_mb=shutil.disk_usage(path).free/1024/1024
+    if free_mb < min_free_mb:
+        return [f"only {free_mb:.0f} MB free under {path}, at least {min_free_mb} MB needed"]
+    return []
+
+
+def check_tcp(host, port, timeout=DEFAULT_TIMEOUT):
+    try:
+        socket.create_connection((host, int(port)), timeout=timeout).close()
+    except Exception as e:
+        return [f"{host}:{port} is not reachable ({str(e)})"]
+    return []
+
+
+# urllib honours the proxy settings the downloader uses, a direct socket would not
+def check_origin(url, timeout=DEFAULT_TIMEOUT):
+    try:
+        request=urllib.request.Request(url, method="HEAD", headers={"User-Agent": "site24x7-plugin-automation"})
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+    except Exception as e:
+        return [f"{url} is not reachable ({str(e)})"]
+    return []
+
+
+def run_checks(checks, timeout=DEFAULT_TIMEOUT, workers=16):
+    pool=concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(checks))))
+    futures=dict((key, pool.submit(check[0], *check[1:])) for key, check in checks.items())
+    deadline=time.monotonic()+timeout+0.5
+    results={}
+    for key, future in futures.items():
+        try:
+            results[key]=future.result(max(0, deadline-time.monotonic()))
+        except concurrent.futures.TimeoutError:
+            results[key]=[f"no answer within {timeout}s"]
+        except Exception as e:
+            results[key]=[str(e)]
+    # A check stuck in DNS must not hold up the install, its thread is left behind
+    pool.shutdown(wait=False, cancel_futures=True)
+    return results
@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+import plugin_metrics
+
+
+def inputs_hash(*inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# stat() only, so checking the staged files before a resume costs no reads
+def files_fingerprint(path):
+    entries=[]
+    for root, directories, files in os.walk(path):
+        directories.sort()
+        for filename in sorted(files):
+            full_path=os.path.join(root, filename)
+            try:
+                stat=os.stat(full_path)
+            except OSError:
+                continue
+            entries.append([os.path.relpath(full_path, path), stat.st_size, stat.st_mtime_ns, stat.st_mode])
+    return inputs_hash(entries)
+
+
+class InstallState:
+
+    def __init__(self, path):
+        self.path=path
+        self.lock=threading.Lock()
+        self.targets={}
+        try:
+            with open(path) as f:
+                self.targets=json.load(f).get("targets", {})
+        except (OSError, ValueError, AttributeError):
+            self.targets={}
+
+    def _save(self):
+        try:
+            plugin_metrics.write_atomic(self.path, json.dumps({"targets": self.targets}, indent=2)+"\n")
+        except Exception as e:
+            print(f"    Unable to write the install state to {self.path} : {str(e)}")
+
+    def resume(self, target, inputs, fingerprint, file_steps):
+        with self.lock:
+            entry=self.targets.get(target)
+            if not entry or entry.get("inputs")!=inputs:
+                self.targets[target]={"inputs": inputs, "completed": [], "files": None, "updated": time.time()}
+                self._save()
+                return set()
+            completed=set(entry.get("completed", []))
+            if entry.get("files")!=fingerprint:
+                # The staged plugin files changed since they were recorded, everything that produced them runs again
+                completed-=set(file_steps)
+                entry["completed"]=sorted(completed)
+                self._save()
+            return completed
+
+    def complete(self, target, step, fingerprint):
+        with self.lock:
+            entry=self.targets.setdefault(target, {"inputs": None, "completed": []})
+            if step not in entry["completed"]:
+                entry["completed"].append(step)
+            entry["files"]=fingerprint
+            entry["updated"]=time.time()
+            self._save()
+
+    def clear(self, target):
+        with self.lock:
+            if self.targets.pop(target, None) is not None:
+                self._save()
@@ -0,0 +1,213 @@
+import os
+import json
+import math
+import time
+import types
+import argparse
+import builtins
+import threading
+import subprocess
+
+import plugin_metrics
+
+
+DEFAULT_TIMEOUT=60
+
+
+# A BaseException like SystemExit, so a plugin calling parse_args() inside a broad "except Exception" does not swallow it
+class ArgumentsCaptured(BaseException):
+
+    def __init__(self, namespace):
+        super().__init__("plugin arguments captured")
+        self.namespace=namespace
+
+
+class UnsupportedPlugin(Exception):
+    pass
+
+
+def capturing_argparse(argv):
+    module=types.ModuleType("argparse")
+    module.__dict__.update(argparse.__dict__)
+
+    class ArgumentParser(argparse.ArgumentParser):
+        def parse_args(self, args=None, namespace=None):
+            raise ArgumentsCaptured(super().parse_args(argv, namespace))
+
+        def parse_known_args(self, args=None, namespace=None):
+            namespace, extras=super().parse_known_args(argv, namespace)
+            raise ArgumentsCaptured(namespace)
+
+    module.ArgumentParser=ArgumentParser
+    return module
+
+
+def plugin_builtins(argv):
+    module=capturing_argparse(argv)
+    real_import=builtins.__import__
+
+    def plugin_import(name, globals=None, locals=None, fromlist=(), level=0):
+        imported=real_import(name, globals, locals, fromlist, level)
+        if name=="argparse" and level==0:
+            return module
+        return imported
+
+    return dict(builtins.__dict__, __import__=plugin_import)
+
+
+# Runs the plugin as __main__ in a private namespace up to its parse_args() call, so the
+# collector classes are defined and the arguments carry the plugin's own defaults and types
+def load_plugin(plugin_file, argv):
+    with open(plugin_file) as f:
+        code=compile(f.read(), plugin_file, "exec")
+    namespace={"__name__": "__main__", "__file__": plugin_file, "__builtins__": plugin_builtins(argv)}
+    try:
+        exec(code, namespace)
+    except ArgumentsCaptured as captured:
+        return namespace, captured.namespace
+    except SystemExit as e:
+        raise UnsupportedPlugin(f"plugin exited with {e.code} before parsing its arguments")
+    raise UnsupportedPlugin("plugin does not parse its arguments with argparse")
+
+
+def find_collector(namespace):
+    for name, value in namespace.items():
+        if isinstance(value, type) and value.__module__==namespace["__name__"] and callable(getattr(value, "metricCollector", None)):
+            return value
+    raise UnsupportedPlugin("plugin has no class with a metricCollector() method")
+
+
+def collect(plugin_file, argv):
+    namespace, args=load_plugin(plugin_file, argv)
+    collector=find_collector(namespace)
+    return collector(args).metricCollector()
+
+
+def collect_in_process(plugin_file, argv, timeout=DEFAULT_TIMEOUT):
+    outcome={}
+
+    def run():
+        try:
+            outcome["result"]=collect(plugin_file, argv)
+        except BaseException as e:
+            outcome["error"]=e
+
+    worker=threading.Thread(target=run, name="plugin-validation", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        print(f"    In-process plugin validation timed out after {timeout}s")
+        return False
+    if "error" in outcome:
+        if isinstance(outcome["error"], UnsupportedPlugin):
+            raise outcome["error"]
+        print(f"    In-process plugin validation failed : {str(outcome['error'])}")
+        return False
+    if not isinstance(outcome.get("result"), dict):
+        print("    In-process plugin validation returned no metrics")
+        return False
+    return outcome["result"]
+
+
+DEFAULT_POLL_INTERVAL=300
+DEFAULT_BUDGET_FRACTION=0.2
+
+
+def run_measured(cmd, env=None, timeout=None):
+    plugin_metrics.count("subprocesses")
+    start=time.monotonic()
+    process=subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    output={}
+
+    def drain(name, stream):
+        output[name]=stream.read()
+        stream.close()
+
+    readers=[threading.Thread(target=drain, args=(name, stream), daemon=True) for name, stream in (("stdout", process.stdout), ("stderr", process.stderr))]
+    for reader in readers:
+        reader.start()
+    killer=threading.Timer(timeout, process.kill) if timeout else None
+    if killer:
+        killer.start()
+    try:
+        # wait4 reaps the child ourselves so its own resource usage is reported, not the whole process tree's
+        pid, status, usage=os.wait4(process.pid, 0)
+    finally:
+        if killer:
+            killer.cancel()
+    process.returncode=os.waitstatus_to_exitcode(status)
+    wall=time.monotonic()-start
+    for reader in readers:
+        reader.join()
+
+    return {
+        "returncode": process.returncode,
+        "wall": wall,
+        "cpu": usage.ru_utime+usage.ru_stime,
+        "max_rss_kb": usage.ru_maxrss,
+        "stdout": output.get("stdout", b""),
+        "stderr": output.get("stderr", b""),
+    }
+
+
+def percentile(values, fraction):
+    ordered=sorted(values)
+    index=max(0, math.ceil(fraction*len(ordered))-1)
+    return ordered[index]
+
+
+def summarize(samples):
+    walls=[sample["wall"] for sample in samples]
+    cpus=[sample["cpu"] for sample in samples]
+    return {
+        "runs": len(samples),
+        "wall_p50": percentile(walls, 0.50),
+        "wall_p95": percentile(walls, 0.95),
+        "wall_p99": percentile(walls, 0.99),
+        "cpu_p50": percentile(cpus, 0.50),
+        "cpu_p95": percentile(cpus, 0.95),
+        "cpu_p99": percentile(cpus, 0.99),
+        "max_rss_mb": max(sample["max_rss_kb"] for sample in samples)/1024,
+    }
+
+
+def check_budget(stats, poll_interval=DEFAULT_POLL_INTERVAL, budget_fraction=DEFAULT_BUDGET_FRACTION, max_rss_mb=None):
+    budget=poll_interval*budget_fraction
+    violations=[]
+    if stats["wall_p95"] > budget:
+        violations.append(f"wall time p95 {stats['wall_p95']:.2f}s exceeds {budget:.2f}s ({budget_fraction:.0%} of the {poll_interval}s poll interval)")
+    if stats["cpu_p95"] > budget:
+        violations.append(f"CPU time p95 {stats['cpu_p95']:.2f}s exceeds {budget:.2f}s ({budget_fraction:.0%} of the {poll_interval}s poll interval)")
+    if max_rss_mb and stats["max_rss_mb"] > max_rss_mb:
+        violations.append(f"peak RSS {stats['max_rss_mb']:.1f} MB exceeds {max_rss_mb} MB")
+    return budget, violations
+
+
+def benchmark_plugin(cmd, runs, env=None, timeout=None):
+    samples=[]
+    for run in range(runs):
+        sample=run_measured(cmd, env, timeout)
+        if sample["returncode"]!=0:
+            print(f"    Benchmark run {run+1} failed with return code {sample['returncode']}")
+            print(f"    {str(sample['stderr'])}")
+            return False
+        samples.append(sample)
+    return summarize(samples)
+
+
+def load_benchmark(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_benchmark(path, record):
+    try:
+        with open(path, "w") as f:
+            json.dump(record, f, indent=2)
+    except Exception as e:
+        print(f"    Unable to store the plugin benchmark in {path} : {str(e)}")
+        return False
+    return True
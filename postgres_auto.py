@@ -1,92 +1,91 @@
 #! /usr/bin/python3
-import os
-import subprocess
-import json
 import warnings
-import urllib.parse
-import urllib.request
 import collections
 
+import plugin_engine
+import plugin_metrics
+
 warnings.filterwarnings("ignore")
 
-def move_folder(source, destination):
-    try:
-        os.rename(source, destination)
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
 
-def move_plugin(plugin_name, plugins_temp_path, agent_plugin_path):
-    try:
-        if not check_directory(agent_plugin_path):
-            print(f"    {agent_plugin_path} Agent Plugins Directory not Present")
-            return False
-        if not move_folder(plugins_temp_path+plugin_name, agent_plugin_path+plugin_name): 
-            return False
+NewUser = collections.namedtuple('NewUser', 'username password')
 
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
 
-def plugin_config_setter(plugin_name, plugins_temp_path, arguments):
-    try:
-        full_path=plugins_temp_path+plugin_name+"/"
-        config_file_path=full_path+plugin_name+".cfg"
+def requested_users(args):
+    users=[NewUser(args.username, args.password)]
+    for user in getattr(args, "users", None) or []:
+        if isinstance(user, dict):
+            user=NewUser(user["username"], user["password"])
+        user=NewUser(*user)
+        if user.username not in [existing.username for existing in users]:
+            users.append(user)
+    return users
 
-        arguments='\n'.join(arguments.replace("--","").split())
-        with open(config_file_path, "w") as f:
-            f.write(f"[ORCL]\n"+arguments)
 
+def requested_databases(args):
+    databases=getattr(args, "databases", None) or []
+    if isinstance(databases, str):
+        databases=[database.strip() for database in databases.split(",") if database.strip()]
+    return databases
 
-    except Exception as e:
-        print(str(e))
-        return False
-    return True
 
+DUPLICATE_OBJECT="42710"
+UNIQUE_VIOLATION="23505"
+CREATE_ATTEMPTS=3
+# Held for the transaction, so installs connecting to the same database check, create and grant one at a time
+ROLES_LOCK=0x5324787
 
 
-def plugin_validator(output):
-    try:
-        result=json.loads(output.decode())
-        if "status" in result:
-            if result['status']==0:
-                print("Plugin execution encountered a error")
-                if "msg" in result:
-                    print(result['msg'])
-            return False
+def create_roles(cur, users, databases):
+    from psycopg2 import sql
 
-    except Exception as e:
-        print(str(e))
-        return False
-    
-    return True
+    usernames=[user.username for user in users]
+    cur.execute("select pg_advisory_xact_lock(%s); select rolname from pg_roles where rolname = any(%s)", (ROLES_LOCK, usernames))
+    plugin_metrics.count("db_round_trips")
+    existing=set(row[0] for row in cur.fetchall())
+    for username in sorted(existing):
+        print(f"    \"{username}\" User Already Exists")
 
+    # One round trip for every missing role, then one for the grants
+    statements=[
+        sql.SQL("create user {username} with password {password}")
+        .format(username=sql.Identifier(user.username), password=sql.Literal(user.password))
+        for user in users if user.username not in existing
+    ]
+    if statements:
+        cur.execute(sql.SQL("; ").join(statements))
+        plugin_metrics.count("db_round_trips")
 
+    grantees=sql.SQL(", ").join(sql.Identifier(username) for username in usernames)
+    grants=[sql.SQL("grant pg_monitor to {grantees}").format(grantees=grantees)]
+    for database in databases:
+        grants.append(sql.SQL("grant connect on database {database} to {grantees}").format(database=sql.Identifier(database), grantees=grantees))
+    cur.execute(sql.SQL("; ").join(grants))
+    plugin_metrics.count("db_round_trips")
 
 
-def setuser(args):
+def setusers(args, users, databases=()):
     try:
         import psycopg2
-        from psycopg2 import connect, extensions, sql
-
-
-        NewUser = collections.namedtuple('NewUser', 'username password')
-
-        users = [
-            NewUser(args.username, args.password)
-        ]
 
         with psycopg2.connect(dbname=args.db, user=args.superuser, password=args.superpass, host=args.host, port=args.port) as conn:
-            cur: psycopg2.extensions.cursor = conn.cursor()
-            for user in users:
-                cur.execute(
-                    sql.SQL("create user {username} with password %s")
-                    .format(username=sql.Identifier(user.username)), 
-                    (user.password, )
-                )
-            conn.commit()
+            plugin_metrics.count("db_round_trips")
+            for attempt in range(CREATE_ATTEMPTS):
+                try:
+                    with conn.cursor() as cur:
+                        create_roles(cur, users, databases)
+                    conn.commit()
+                    plugin_metrics.count("db_round_trips")
+                    break
+                except psycopg2.Error as e:
+                    # Installs through another database of the cluster are not serialized by the lock and race
+                    # between the check and the create or grant, reported as 42710 or as 23505 on the catalog
+                    # index, after a rollback the check sees the role and membership the other session created
+                    if e.pgcode not in (DUPLICATE_OBJECT, UNIQUE_VIOLATION) or attempt==CREATE_ATTEMPTS-1:
+                        raise
+                    conn.rollback()
+                    plugin_metrics.count("db_round_trips")
+        conn.close()
 
         return True
 
@@ -95,188 +94,51 @@ def setuser(args):
         return False
 
 
-def download_file(url, path):
-    filename=url.split("/")[-1]
-    full_path=path+filename
-    urllib.request.urlretrieve(url, full_path)
-    response=urllib.request.urlopen(url)
-    if response.getcode() == 200 :
-        print(f"      {filename} Downloaded")
-    else:
-        print(f"      {filename} Download Failed with response code {str(response.status_code)}")
-        return False
-    return True
-
-def down_move(plugin_name, plugin_url, plugins_temp_path):
-    temp_plugin_path=os.path.join(plugins_temp_path,plugin_name+"/")
-    if not check_directory(temp_plugin_path):
-        if not make_directory(temp_plugin_path):return False
-
-    py_file_url=plugin_url+"/"+plugin_name+".py"
-    cfg_file_url=plugin_url+"/"+plugin_name+".cfg"
-    if not download_file(py_file_url, temp_plugin_path):return False
-    if not download_file(cfg_file_url, temp_plugin_path):return False
-    return True
-
+def setuser(args):
+    return setusers(args, requested_users(args), requested_databases(args))
 
-def execute_command(cmd, need_out=False):
-    try:
-        if not isinstance(cmd, list):
-            cmd=cmd.split()
-        
-        result=subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode != 0:
-            print(f"    {cmd} execution failed with return code {result.returncode}")
-            print(f"    {str(result.stderr)}")
-            return False
-        if need_out:
-            return result.stdout
-        return True
-    except Exception as e:
-        print(    str(e))
-        return False
 
+class PostgresBackend(plugin_engine.Backend):
+    name="postgres"
+    display_name="Postgres"
+    plugin_name="postgres"
+    plugin_url="https://raw.githubusercontent.com/site24x7/plugins/master/postgres"
+    driver="psycopg2-binary"
+    driver_module="psycopg2"
+    driver_distributions=("psycopg2-binary", "psycopg2")
+    driver_min_version="2.7"
+    config_section="postgres"
+    defaults={
+        "superuser": None,
+        "superpass": None,
+        "username": "site24x7_plugin",
+        "password": None,
+        "host": "localhost",
+        "port": "5432",
+        "db": "postgres",
+        "databases": None,
+        "plugin_version": 1,
+        "heartbeat": True,
+    }
+    required=("superuser", "superpass", "password")
+
+    def create_user(self, args):
+        return setuser(args)
+
+    def plugin_arguments(self, args):
+        return [
+            ("host", args.host),
+            ("port", int(args.port)),
+            ("username", args.username),
+            ("password", args.password),
+            ("db", args.db),
+        ]
 
-def make_directory(path):
-    if not check_directory(path):
-        try:
-            os.mkdir(path)
-            print(f"    {path} directory created.")
-        
-        except Exception as e:
-            print(f"    Unable to create {path} Directory  : {str(e)}")
-            return False
-    return True
-
-
-def check_directory(path):
-    return os.path.isdir(path)
-
-def initiate(plugin_name, plugin_url, args):
-    print(" ")
-    print("------------------------------ Starting Plugin Automation ------------------------------")
-    print()
-
-    #Installing psycopg2 python module
-    print("    Installing psycopg2 python module")
-    psycopg2_choice=input("    Do you want to continue? [Y/n]")
-    if psycopg2_choice=="Y" or psycopg2_choice=="y":
-        cmd="""pip3 install psycopg2-binary"""
-        if not execute_command(cmd):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-        print("    Installed psycopg2-binary python module")
-        print()
-    else:
-        print("    psycopg2-binary not installed")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-
-    agent_path="/opt/site24x7/monagent/"
-    agent_temp_path=agent_path+"temp/"
-    agent_plugin_path=agent_path+"plugins/"
-
-    if not check_directory(agent_temp_path):
-        print("    Agent Directory does not Exist")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-    print("    Creating Temporary Plugins Directory")
-    plugins_temp_path=os.path.join(agent_temp_path,"plugins/")
-    if not check_directory(plugins_temp_path):
-        if not make_directory(plugins_temp_path):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-    print("    Created Temporary Plugins Directory")
-    print()
-
-    print("    Downloading Postgres Plugin Files")
-    postgres_file_choice=input("    Do you want to continue? [Y/n]")
-    if postgres_file_choice=="Y" or postgres_file_choice=="y":
-
-        if not down_move(plugin_name, plugin_url, plugins_temp_path):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-        print("    Downloaded Postgres Plugin Files")
-        print()
-
-    else:
-        print("   Postgres Files not Downloaded")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-
-    print("    Setting the python3 path in the postgres.py file")
-    print()
-
-    py_update_cmd = [ "sed", "-i", "1s|^.*|#! /usr/bin/python3|", f"{plugins_temp_path}{plugin_name}/{plugin_name}.py" ]
-    if not execute_command(py_update_cmd):
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-
-    print(f"    Setting the Postgres User \"{args.username}\" for Plugin Execution")
-    user_choice=input("    Do you want to continue? [Y/n]")
-    if user_choice =="Y" or user_choice=="y":
-
-        if not setuser(args):
-            print("")
-            print("------------------------------ Plugin Automation Failed ------------------------------")
-            return 
-        print(f"    \"{args.username}\" User created Successfully")
-        print("")
-    
-    else:
-        print(" User creation \"{args.username}\" failed")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-
-
-    print("    Creating executable plugin file")
-    cmd=f"chmod 744 {plugins_temp_path}/{plugin_name}/{plugin_name}.py"
-    if not execute_command(cmd):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Created executable plugin file")
-    print("")
-
-    print("    Validating the python plugin output")
-    port=int(args.port)
-    arguments=f"--host={args.host} --port={port} --username={args.username} --password={args.password} --db={args.db}"
-    cmd=f"{plugins_temp_path}{plugin_name}/{plugin_name}.py"+ " "+arguments
-    result=execute_command(cmd, need_out=True)
-    if not plugin_validator(result):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return
-    print("    Plugin output validated successfully")
-    print("")
-
-    print("    Setting plugin configuration")
-    if not plugin_config_setter(plugin_name, plugins_temp_path, arguments):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Plugin configuration set sucessfully")
-    print()
-
-    print("    Moving the plugin into the Site24x7 Agent directory")
-    if not move_plugin(plugin_name, plugins_temp_path, agent_plugin_path):
-        print("")
-        print("------------------------------ Plugin Automation Failed ------------------------------")
-        return 
-    print("    Moved the plugin into the Site24x7 Agent directory")
-    print()
-
-
-    print("------------------------------ Successfully Completed Plugin Automation ------------------------------")
 
+backend=PostgresBackend()
 
 
 if __name__ == "__main__":
-    plugin_name="postgres"
-    plugin_url="https://raw.githubusercontent.com/site24x7/plugins/master/postgres"
-
     #user configs
     superuser="suraj_sys"
     superpass="suraj_sys"
@@ -314,9 +176,12 @@ if __name__ == "__main__":
     parser.add_argument('--host', help='hostname for postgres',default=host)
     parser.add_argument('--port', help='port number for postgres',default=port)
     parser.add_argument('--db', help='DB for postgres',default=db)
+    parser.add_argument('--databases', help='comma separated databases the plugin user is granted CONNECT on', default=None)
     parser.add_argument('--plugin_version', help='plugin template version', type=int,  nargs='?', default=1)
     parser.add_argument('--heartbeat', help='alert if monitor does not send data', type=bool, nargs='?', default=True)
+    parser.add_argument('--instance', help='name of the instance section in the plugin configuration, other instances already configured are kept (default: postgres_<host>_<port>)', default=None)
+    plugin_engine.add_engine_arguments(parser)
 
     args=parser.parse_args()
 
-    initiate(plugin_name, plugin_url, args)
+    plugin_engine.initiate(backend, args)
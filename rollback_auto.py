@@ -0,0 +1,30 @@
+#! /usr/bin/python3
+import os
+import sys
+import argparse
+
+import plugin_engine
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="List the installed versions of a Site24x7 plugin or switch the agent back to an earlier one")
+    parser.add_argument('plugin', help='plugin name (postgres, mongoDB, oracle) or backend name')
+    parser.add_argument('--version', help='version to activate (default: the version installed before the active one)', default=None)
+    parser.add_argument('--list', help='list the installed versions instead of rolling back', action='store_true')
+    parser.add_argument('--agent_path', help='Site24x7 agent directory', default=plugin_engine.AGENT_PATH)
+
+    args=parser.parse_args()
+
+    backend=plugin_engine.load_backend(args.plugin)
+    plugin_name=backend.plugin_name if backend else args.plugin
+    agent_plugin_path=os.path.join(args.agent_path, "plugins", "")
+
+    if args.list:
+        versions=plugin_engine.list_versions(agent_plugin_path, plugin_name)
+        if not versions: print(f"No versions of the {plugin_name} plugin installed"); sys.exit(1)
+        current=plugin_engine.current_version(agent_plugin_path, plugin_name)
+        for version in versions:
+            print(f"  {'*' if version==current else ' '} {version}")
+        sys.exit(0)
+
+    sys.exit(0 if plugin_engine.rollback_plugin(agent_plugin_path, plugin_name, args.version) else 1)
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import threading
+import http.server
+
+
+# Serves in-memory files over keep-alive HTTP/1.1 with ETags, so the downloader's conditional GETs,
+# redirects and connection reuse run against a real socket
+class FileServer:
+
+    def __init__(self, files=None, compress=False):
+        self.files=dict(files or {})
+        self.redirects={}
+        self.compress=compress
+        self.requests=[]
+        self.clients=set()
+        self.lock=threading.Lock()
+
+    def etag(self, path):
+        return '"'+hashlib.sha1(self.files[path]).hexdigest()+'"'
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def __enter__(self):
+        stub=self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version="HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests.append((self.path, dict(self.headers)))
+                    stub.clients.add(self.client_address)
+                if self.path in stub.redirects:
+                    return self.reply(302, headers=[("Location", stub.redirects[self.path])])
+                if self.path not in stub.files:
+                    return self.reply(404)
+                etag=stub.etag(self.path)
+                if self.headers.get("If-None-Match")==etag:
+                    return self.reply(304, headers=[("ETag", etag)])
+                body=stub.files[self.path]
+                headers=[("ETag", etag)]
+                if stub.compress and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                    body=gzip.compress(body)
+                    headers.append(("Content-Encoding", "gzip"))
+                self.reply(200, body, headers)
+
+        self.server=http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads=True
+        self.thread=threading.Thread(target=self.server.serve_forever, args=(0.05, ), daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+    def paths(self):
+        with self.lock:
+            return [path for path, headers in self.requests]
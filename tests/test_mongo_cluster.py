@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_engine
+import mongoDB_auto
+
+
+TOPOLOGY={"kind": "replica set rs0", "primaries": ["db1:27017"], "members": ["db1:27017", "db2:27017", "db3:27017"]}
+
+
+class InitiateClusterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="mongo-cluster-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.calls=[]
+        self.args, missing=mongoDB_auto.backend.build_args({"host": "db1", "admin_username": "a", "admin_password": "b", "site24x7_pass": "p"})
+        self.args.instance=None
+
+    def run_cluster(self, unreachable=()):
+        def preflight(engine, targets):
+            self.calls.append(("preflight", [target.name for target in targets]))
+            return dict((target.name, ["unreachable"] if target.args.host in unreachable else []) for target in targets)
+
+        def ensure_driver(engine, backend):
+            self.calls.append(("driver",))
+            return True
+
+        def discover_topology(args, workers):
+            self.calls.append(("discover",))
+            return TOPOLOGY
+
+        def create_user(args):
+            self.calls.append(("user", args.host))
+            return True
+
+        def install_all(engine, targets):
+            self.calls.append(("install", [target.name for target in targets], engine.skip_preflight))
+            return dict((target.name, (True, 0.0)) for target in targets)
+
+        with mock.patch.object(plugin_engine.Engine, "preflight", autospec=True, side_effect=preflight), \
+                mock.patch.object(plugin_engine.Engine, "ensure_driver", autospec=True, side_effect=ensure_driver), \
+                mock.patch.object(plugin_engine.Engine, "install_all", autospec=True, side_effect=install_all), \
+                mock.patch.object(mongoDB_auto, "discover_topology", side_effect=discover_topology), \
+                mock.patch.object(mongoDB_auto, "create_user", side_effect=create_user), \
+                mock.patch("builtins.print"):
+            return mongoDB_auto.initiate_cluster(self.args, 2, self.root)
+
+    def test_members_are_checked_before_any_user_is_created(self):
+        self.assertTrue(self.run_cluster())
+        self.assertEqual(self.calls, [
+            ("preflight", ["mongoDB"]),
+            ("driver",),
+            ("discover",),
+            ("preflight", ["mongoDB_db1_27017", "mongoDB_db2_27017", "mongoDB_db3_27017"]),
+            ("user", "db1"),
+            ("install", ["mongoDB_db1_27017", "mongoDB_db2_27017", "mongoDB_db3_27017"], True),
+        ])
+
+    def test_unreachable_seed_stops_before_the_driver(self):
+        self.assertFalse(self.run_cluster(unreachable=("db1",)))
+        self.assertEqual(self.calls, [("preflight", ["mongoDB"])])
+
+    def test_failed_members_are_dropped(self):
+        self.args.host="db2"
+        self.assertFalse(self.run_cluster(unreachable=("db1",)))
+        self.assertNotIn(("user", "db1"), self.calls)
+        self.assertEqual(self.calls[-1], ("install", ["mongoDB_db2_27017", "mongoDB_db3_27017"], True))
+
+    def test_skip_preflight(self):
+        self.args.skip_preflight=True
+        self.assertTrue(self.run_cluster())
+        self.assertEqual([call[0] for call in self.calls], ["driver", "discover", "user", "install"])
+
+
+if __name__ == "__main__":
+    unittest.main()
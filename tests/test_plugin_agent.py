@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import unittest
+
+import plugin_agent
+import plugin_engine
+
+
+# Reports status 0, a failed run for the agent, unless ORACLE_HOME matches its --oracle_home argument
+PLUGIN=f"""#!{sys.executable}
+import os
+import sys
+import json
+arguments=dict(argument[2:].split("=", 1) for argument in sys.argv[1:])
+print(json.dumps({{"status": int(os.environ.get("ORACLE_HOME")==arguments.get("oracle_home"))}}))
+"""
+
+
+class ValidatePluginTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-agent-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.agent_plugin_path=os.path.join(self.root, "plugins", "")
+        os.makedirs(self.agent_plugin_path+"oracle")
+        plugin_file=self.agent_plugin_path+"oracle/oracle.py"
+        with open(plugin_file, "w") as f:
+            f.write(PLUGIN)
+        os.chmod(plugin_file, 0o755)
+
+    def write_config(self, text):
+        with open(self.agent_plugin_path+"oracle/oracle.cfg", "w") as f:
+            f.write(text)
+
+    def test_environment_is_built_from_the_section(self):
+        self.write_config("[ORCL_db1_1521_A]\nhostname=db1\noracle_home=/u01/app/oracle\n[ORCL_db2_1521_B]\nhostname=db2\noracle_home=/u02/app/oracle\n")
+        self.assertEqual(plugin_agent.validate_plugin(self.agent_plugin_path, "oracle", 30), {"ORCL_db1_1521_A": True, "ORCL_db2_1521_B": True})
+
+    def test_unset_options_leave_the_environment_alone(self):
+        self.assertEqual(plugin_agent.plugin_environment([("oracle_home", "None"), ("host", "db1")]), {})
+        self.assertEqual(plugin_agent.plugin_environment([("oracle_home", "/u01")]), {"ORACLE_HOME": "/u01"})
+
+    def test_engine_uses_the_same_environment(self):
+        backend=plugin_engine.load_backend("oracle")
+        args, missing=backend.build_args({"sysusername": "sys", "syspassword": "s", "password": "p", "sid": "A", "oracle_home": "/u01"})
+        self.assertEqual(backend.environment(args), plugin_agent.plugin_environment(backend.plugin_arguments(args)))
+        self.assertEqual(backend.environment(args), {"ORACLE_HOME": "/u01"})
+        postgres=plugin_engine.load_backend("postgres")
+        self.assertEqual(postgres.environment(argparse.Namespace(host="db1", port="5432", username="u", password="p", db="postgres")), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import io
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_bundle
+import plugin_downloader
+
+
+FILES={"postgres.py": b"print('{}')\n", "postgres.cfg": b"[postgres]\nhost=localhost\n"}
+WHEEL=b"wheel bytes"
+WHEEL_NAME="psycopg2_binary-2.9.9-cp311-cp311-manylinux_2_17_x86_64.whl"
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BundleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-bundle-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.staging=os.path.join(self.root, "staging")
+        for filename, data in FILES.items():
+            self.write(plugin_bundle.plugin_member("postgres", filename), data)
+        self.write(plugin_bundle.wheel_member(WHEEL_NAME), WHEEL)
+        self.path=os.path.join(self.root, "plugins.tar.gz")
+        for patcher in (mock.patch.object(plugin_bundle, "host_python_version", return_value="3.11"),
+                        mock.patch.object(plugin_bundle, "host_platform", return_value="linux_x86_64"),
+                        mock.patch("platform.machine", return_value="x86_64")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, member, data):
+        path=os.path.join(self.staging, member)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def manifest(self, **options):
+        manifest={
+            "format": plugin_bundle.BUNDLE_FORMAT,
+            "version": "1",
+            "backends": {"postgres": {"plugin_name": "postgres", "files": dict((filename, sha256(data)) for filename, data in FILES.items())}},
+            "wheels": {WHEEL_NAME: sha256(WHEEL)},
+        }
+        manifest.update(options)
+        return manifest
+
+    def test_round_trip(self):
+        plugin_bundle.write_bundle(self.path, self.manifest(), self.staging)
+        with tarfile.open(self.path) as tar:
+            self.assertEqual(tar.getnames()[0], plugin_bundle.MANIFEST_NAME)
+        self.assertEqual(plugin_bundle.load_manifest(self.path)["version"], "1")
+
+        destination=os.path.join(self.root, "postgres")
+        self.assertEqual(plugin_bundle.extract_plugin(self.path, "postgres", destination), sorted(FILES))
+        for filename, data in FILES.items():
+            with open(os.path.join(destination, filename), "rb") as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(plugin_bundle.check_bundle(self.path, "postgres"), [])
+        self.assertEqual(len(plugin_bundle.check_bundle(self.path, "mysql")), 1)
+
+    def test_checksum_mismatch_fails(self):
+        manifest=self.manifest()
+        manifest["backends"]["postgres"]["files"]["postgres.py"]="0"*64
+        plugin_bundle.write_bundle(self.path, manifest, self.staging)
+        destination=os.path.join(self.root, "postgres")
+        with self.assertRaises(plugin_downloader.ChecksumError):
+            plugin_bundle.extract_plugin(self.path, "postgres", destination)
+        self.assertFalse(os.path.exists(os.path.join(destination, "postgres.py")))
+
+    def test_manifest_must_come_first(self):
+        with tarfile.open(self.path, "w:gz") as tar:
+            info=tarfile.TarInfo("other.txt")
+            tar.addfile(info, io.BytesIO(b""))
+        with self.assertRaises(plugin_bundle.BundleError):
+            plugin_bundle.load_manifest(self.path)
+
+    def test_platform_matching(self):
+        for tag in ("any", "linux_x86_64", "manylinux2014_x86_64", "manylinux_2_17_x86_64", "musllinux_1_1_x86_64"):
+            self.assertTrue(plugin_bundle.platform_matches(tag), tag)
+        for tag in ("manylinux2014_aarch64", "win_amd64", "macosx_11_0_x86_64"):
+            self.assertFalse(plugin_bundle.platform_matches(tag), tag)
+
+    def test_python_matching(self):
+        for version in ("3", "3.11", "311"):
+            self.assertTrue(plugin_bundle.python_matches(version), version)
+        for version in ("3.10", "310", "2"):
+            self.assertFalse(plugin_bundle.python_matches(version), version)
+
+    def test_wheel_problems(self):
+        self.assertEqual(plugin_bundle.wheel_problems(self.manifest(python_version="3.11", platforms=["manylinux2014_x86_64"])), [])
+        self.assertEqual(len(plugin_bundle.wheel_problems(self.manifest(python_version="3.9", platforms=["win_amd64"]))), 2)
+        # Bundles exported before the targets were recorded, and bundles without wheels, are not checked
+        self.assertEqual(plugin_bundle.wheel_problems(self.manifest()), [])
+        self.assertEqual(plugin_bundle.wheel_problems(self.manifest(wheels={}, python_version="3.9")), [])
+
+    def test_extract_wheels(self):
+        plugin_bundle.write_bundle(self.path, self.manifest(python_version="3.11", platforms=["manylinux2014_x86_64"]), self.staging)
+        wheelhouse=os.path.join(self.root, "wheels")
+        self.assertEqual(plugin_bundle.check_wheels(self.path), [])
+        self.assertEqual(plugin_bundle.extract_wheels(self.path, wheelhouse), [WHEEL_NAME])
+        self.assertEqual(os.listdir(wheelhouse), [WHEEL_NAME])
+
+    def test_mismatched_wheels_are_not_extracted(self):
+        plugin_bundle.write_bundle(self.path, self.manifest(python_version="3.9", platforms=["manylinux2014_aarch64"]), self.staging)
+        wheelhouse=os.path.join(self.root, "wheels")
+        problems=plugin_bundle.check_wheels(self.path)
+        self.assertEqual(len(problems), 2)
+        self.assertIn("Python 3.9", problems[0])
+        with self.assertRaises(plugin_bundle.BundleError):
+            plugin_bundle.extract_wheels(self.path, wheelhouse)
+        self.assertFalse(os.path.exists(wheelhouse))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_cache
+import plugin_downloader
+from http_stub import FileServer
+
+
+class PluginCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-cache-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.cache=plugin_cache.PluginCache(os.path.join(self.root, "cache"))
+        self.downloader=plugin_downloader.Downloader()
+        self.addCleanup(self.downloader.close)
+        for patcher in (mock.patch.dict(os.environ, {"no_proxy": "127.0.0.1", "NO_PROXY": "127.0.0.1"}), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fetch(self, url, cache=None):
+        destination=os.path.join(self.root, "postgres.py")
+        status=self.downloader.fetch(url, destination, cache or self.cache)
+        with open(destination, "rb") as f:
+            return status, f.read()
+
+    def test_revalidates_with_a_conditional_get(self):
+        with FileServer({"/postgres/postgres.py": b"v1\n"}) as server:
+            url=server.url("/postgres/postgres.py")
+            self.assertEqual(self.fetch(url), ("downloaded", b"v1\n"))
+            self.assertEqual(self.fetch(url), ("revalidated", b"v1\n"))
+            self.assertEqual(server.requests[1][1].get("If-None-Match"), server.etag("/postgres/postgres.py"))
+
+            server.files["/postgres/postgres.py"]=b"v2\n"
+            self.assertEqual(self.fetch(url), ("downloaded", b"v2\n"))
+            self.assertEqual(self.cache.lookup(url)["etag"], server.etag("/postgres/postgres.py"))
+
+    def test_offline_serves_only_cached_files(self):
+        with FileServer({"/postgres/postgres.py": b"v1\n"}) as server:
+            url=server.url("/postgres/postgres.py")
+            self.fetch(url)
+            requests=len(server.requests)
+            offline=plugin_cache.PluginCache(self.cache.cache_dir, offline=True)
+            self.assertEqual(self.fetch(url, offline), ("cached", b"v1\n"))
+            self.assertFalse(self.downloader.fetch(server.url("/mysql/mysql.py"), os.path.join(self.root, "mysql.py"), offline))
+            self.assertEqual(len(server.requests), requests)
+
+    def test_unreachable_origin_falls_back_to_the_cache(self):
+        with FileServer({"/postgres/postgres.py": b"v1\n"}) as server:
+            url=server.url("/postgres/postgres.py")
+            self.fetch(url)
+        self.downloader.close()
+        self.assertEqual(self.fetch(url), ("cached", b"v1\n"))
+
+    def test_corrupted_cache_entry_is_rejected(self):
+        with FileServer({"/postgres/postgres.py": b"v1\n"}) as server:
+            url=server.url("/postgres/postgres.py")
+            self.fetch(url)
+            data_path, meta_path=self.cache._paths(url)
+            with open(data_path, "wb") as f:
+                f.write(b"tampered\n")
+            self.assertFalse(self.downloader.fetch(url, os.path.join(self.root, "postgres.py"), self.cache))
+            with open(os.path.join(self.root, "postgres.py"), "rb") as f:
+                self.assertEqual(f.read(), b"v1\n")
+
+    def test_eviction_drops_the_least_recently_used(self):
+        cache=plugin_cache.PluginCache(os.path.join(self.root, "small"), max_bytes=10)
+        source=os.path.join(self.root, "source")
+        for index, url in enumerate(("http://a/1", "http://a/2", "http://a/3")):
+            with open(source, "wb") as f:
+                f.write(b"x"*4)
+            cache.store(url, source, {})
+            data_path, meta_path=cache._paths(url)
+            with open(meta_path) as f:
+                meta=json.load(f)
+            meta["used"]=time.time()-100+index
+            cache._write_meta(meta_path, meta)
+        cache.evict()
+        self.assertEqual([url for url in ("http://a/1", "http://a/2", "http://a/3") if cache.lookup(url)], ["http://a/2", "http://a/3"])
+
+    def test_expired_entries_are_evicted(self):
+        cache=plugin_cache.PluginCache(os.path.join(self.root, "aged"), max_age=60)
+        source=os.path.join(self.root, "source")
+        with open(source, "wb") as f:
+            f.write(b"x")
+        cache.store("http://a/1", source, {})
+        data_path, meta_path=cache._paths("http://a/1")
+        cache._write_meta(meta_path, dict(cache.lookup("http://a/1"), used=time.time()-120))
+        cache.evict()
+        self.assertIsNone(cache.lookup("http://a/1"))
+        self.assertFalse(os.path.exists(data_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_catalog
+
+
+def git_sha(data):
+    return hashlib.sha1(b"blob %d\0" % len(data)+data).hexdigest()
+
+
+# Answers the trees API the way GitHub does, from a dict of plugin directories
+class FakeGitHub:
+
+    def __init__(self, directories):
+        self.directories=directories
+        self.requests=[]
+        self.truncated=False
+
+    def tree_sha(self, name):
+        return hashlib.sha1(json.dumps(sorted((path, git_sha(data)) for path, data in self.directories[name].items())).encode()).hexdigest()
+
+    def root_sha(self):
+        return hashlib.sha1("".join(self.tree_sha(name) for name in sorted(self.directories)).encode()).hexdigest()
+
+    def entries(self, name, prefix=""):
+        return [{"path": prefix+path, "type": "blob", "size": len(data), "sha": git_sha(data)} for path, data in sorted(self.directories[name].items())]
+
+    def request(self, url, headers=None):
+        path=url[len(plugin_catalog.API_URL+plugin_catalog.REPOSITORY):]
+        self.requests.append(path)
+        etag='"'+self.root_sha()+'"'
+        if path==f"/git/trees/{plugin_catalog.REF}":
+            if (headers or {}).get("If-None-Match")==etag:
+                return 304, {"ETag": etag}, b""
+            listing={"sha": self.root_sha(), "tree": [{"path": "README.md", "type": "blob", "sha": git_sha(b"readme")}]+
+                     [{"path": name, "type": "tree", "sha": self.tree_sha(name)} for name in sorted(self.directories)]}
+        elif path==f"/git/trees/{self.root_sha()}?recursive=1":
+            tree=[]
+            for name in sorted(self.directories):
+                tree.append({"path": name, "type": "tree", "sha": self.tree_sha(name)})
+                tree.extend(self.entries(name, name+"/"))
+            listing={"sha": self.root_sha(), "tree": tree, "truncated": self.truncated}
+        else:
+            names=[name for name in self.directories if path==f"/git/trees/{self.tree_sha(name)}?recursive=1"]
+            if not names:
+                return 404, {}, b""
+            listing={"sha": self.tree_sha(names[0]), "tree": self.entries(names[0]), "truncated": self.truncated}
+        return 200, {"ETag": etag}, json.dumps(listing).encode()
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-catalog-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path=os.path.join(self.root, plugin_catalog.CATALOG_FILE)
+        self.github=FakeGitHub({
+            "postgres": {"postgres.py": b"print('{}')\n", "postgres.cfg": b"[postgres]\n", "README.md": b"docs\n", "modules/helper.py": b"VALUE=1\n"},
+            "mysql": {"mysql.py": b"print('{}')\n", "mysql.cfg": b"[mysql]\n"},
+            "docs": {"index.md": b"docs\n", "setup.py": b"\n"},
+        })
+        patcher=mock.patch.dict(os.environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop("GITHUB_TOKEN", None)
+
+    def catalog(self):
+        return plugin_catalog.Catalog(self.path, downloader=self.github)
+
+    def test_first_refresh_indexes_only_plugins(self):
+        catalog=self.catalog()
+        self.assertTrue(catalog.stale())
+        self.assertEqual(sorted(catalog.refresh()), ["docs", "mysql", "postgres"])
+        self.assertEqual(catalog.names(), ["mysql", "postgres"])
+        self.assertEqual([path for path, url, sha in catalog.files("postgres")], ["modules/helper.py", "postgres.cfg", "postgres.py"])
+        self.assertFalse(catalog.stale())
+        self.assertEqual(self.catalog().names(), ["mysql", "postgres"])
+
+    def test_unchanged_repository_is_a_conditional_get(self):
+        self.catalog().refresh()
+        requests=len(self.github.requests)
+        self.assertEqual(self.catalog().refresh(), [])
+        self.assertEqual(self.github.requests[requests:], [f"/git/trees/{plugin_catalog.REF}"])
+        self.assertEqual(self.catalog().names(), ["mysql", "postgres"])
+
+    def test_only_changed_directories_are_listed_again(self):
+        self.catalog().refresh()
+        self.github.directories["mysql"]["mysql.py"]=b"print('{\"version\": 2}')\n"
+        requests=len(self.github.requests)
+        catalog=self.catalog()
+        self.assertEqual(catalog.refresh(), ["mysql"])
+        self.assertEqual(self.github.requests[requests:], [f"/git/trees/{plugin_catalog.REF}", f"/git/trees/{self.github.tree_sha('mysql')}?recursive=1"])
+        self.assertEqual(dict((path, sha) for path, url, sha in catalog.files("mysql"))["mysql.py"], git_sha(b"print('{\"version\": 2}')\n"))
+        self.assertEqual(catalog.names(), ["mysql", "postgres"])
+
+    def test_many_changed_directories_use_one_listing(self):
+        for index in range(plugin_catalog.MAX_CHANGED_TREES+1):
+            self.github.directories[f"plugin{index}"]={f"plugin{index}.py": b"print('{}')\n"}
+        catalog=self.catalog()
+        catalog.refresh()
+        self.assertEqual(self.github.requests, [f"/git/trees/{plugin_catalog.REF}", f"/git/trees/{self.github.root_sha()}?recursive=1"])
+        self.assertEqual(len(catalog.names()), plugin_catalog.MAX_CHANGED_TREES+3)
+        self.assertEqual([path for path, url, sha in catalog.files("postgres")], ["modules/helper.py", "postgres.cfg", "postgres.py"])
+
+    def test_truncated_listing_fails(self):
+        self.github.truncated=True
+        with self.assertRaises(plugin_catalog.CatalogError):
+            self.catalog().refresh()
+        with mock.patch("builtins.print"):
+            self.assertIsNone(plugin_catalog.load_catalog(self.path, self.github))
+
+    def test_find_and_files(self):
+        catalog=self.catalog()
+        catalog.refresh()
+        self.assertEqual(catalog.find("Postgres")[0], "postgres")
+        self.assertEqual(catalog.find("oracle"), (None, None))
+        self.assertEqual(catalog.files("oracle"), [])
+        self.assertIn(plugin_catalog.RAW_URL+"site24x7/plugins/master/postgres/modules/helper.py", [url for path, url, sha in catalog.files("POSTGRES")])
+
+    def test_blob_sha_matches_git(self):
+        path=os.path.join(self.root, "hello")
+        with open(path, "wb") as f:
+            f.write(b"hello\n")
+        self.assertEqual(plugin_catalog.blob_sha(path), "ce013625030ba8dba906f756967f9e9ca394464a")
+
+    def test_upstream_record(self):
+        catalog=self.catalog()
+        catalog.refresh()
+        plugin_dir=os.path.join(self.root, "postgres")
+        os.makedirs(plugin_dir)
+        self.assertEqual(plugin_catalog.read_upstream(plugin_dir, "postgres"), {})
+        self.assertTrue(plugin_catalog.write_upstream(plugin_dir, "postgres", catalog))
+        self.assertEqual(plugin_catalog.read_upstream(plugin_dir, "postgres")["postgres.py"], git_sha(b"print('{}')\n"))
+        record=plugin_catalog.upstream_record(catalog, "postgres")
+        self.assertEqual((record["repository"], record["ref"], record["tree"]), ("site24x7/plugins", "master", self.github.tree_sha("postgres")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import hashlib
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_downloader
+from http_stub import FileServer
+
+
+DATA=b"print('{}')\n"
+SHA256=hashlib.sha256(DATA).hexdigest()
+
+
+class WriteAtomicTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-checksums-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path=os.path.join(self.root, "postgres.py")
+
+    def test_digest_is_computed_while_writing(self):
+        self.assertEqual(plugin_downloader.write_atomic([DATA[:5], DATA[5:]], self.path, SHA256.upper()), SHA256)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_mismatch_keeps_the_existing_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"installed\n")
+        with self.assertRaises(plugin_downloader.ChecksumError):
+            plugin_downloader.write_atomic([b"tampered\n"], self.path, SHA256)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"installed\n")
+        self.assertEqual(os.listdir(self.root), ["postgres.py"])
+
+    def test_interrupted_write_leaves_no_part_file(self):
+        def chunks():
+            yield DATA
+            raise OSError("connection reset")
+
+        with self.assertRaises(OSError):
+            plugin_downloader.write_atomic(chunks(), self.path)
+        self.assertEqual(os.listdir(self.root), [])
+
+
+class ChecksumsFileTest(unittest.TestCase):
+
+    def test_sha256sum_formats(self):
+        checksums=plugin_downloader.parse_checksums(f"# plugins\n{SHA256.upper()}  postgres/postgres.py\n{'a'*64} *mongoDB.cfg\n\nnot a line\n")
+        self.assertEqual(checksums["postgres/postgres.py"], SHA256)
+        self.assertEqual(checksums["postgres.py"], SHA256)
+        self.assertEqual(checksums["mongoDB.cfg"], "a"*64)
+        self.assertNotIn("#", checksums)
+
+    def test_lookup_by_url_then_file_name(self):
+        checksums={"https://example.com/postgres/postgres.py": "1"*64, "postgres.py": "2"*64, "postgres.cfg": "3"*64}
+        self.assertEqual(plugin_downloader.expected_checksum(checksums, "https://example.com/postgres/postgres.py"), "1"*64)
+        self.assertEqual(plugin_downloader.expected_checksum(checksums, "https://mirror/postgres/postgres.cfg"), "3"*64)
+        self.assertIsNone(plugin_downloader.expected_checksum(checksums, "https://mirror/postgres/other.py"))
+        self.assertIsNone(plugin_downloader.expected_checksum(None, "https://mirror/postgres/postgres.py"))
+
+    def test_load_from_a_file(self):
+        root=tempfile.mkdtemp(prefix="plugin-checksums-")
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        path=os.path.join(root, "SHA256SUMS")
+        with open(path, "w") as f:
+            f.write(f"{SHA256}  postgres.py\n")
+        self.assertEqual(plugin_downloader.load_checksums(path), {"postgres.py": SHA256})
+        with mock.patch("builtins.print"):
+            self.assertFalse(plugin_downloader.load_checksums(os.path.join(root, "missing")))
+
+
+class VerifiedDownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-checksums-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.downloader=plugin_downloader.Downloader()
+        self.addCleanup(self.downloader.close)
+        for patcher in (mock.patch.dict(os.environ, {"no_proxy": "127.0.0.1", "NO_PROXY": "127.0.0.1"}), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_download_is_verified_on_the_fly(self):
+        with FileServer({"/postgres/postgres.py": DATA}) as server:
+            path=os.path.join(self.root, "postgres.py")
+            self.assertEqual(self.downloader.fetch(server.url("/postgres/postgres.py"), path, checksums={"postgres.py": SHA256}), "downloaded")
+            self.assertFalse(self.downloader.fetch(server.url("/postgres/postgres.py"), os.path.join(self.root, "other.py"), checksums={"postgres.py": "0"*64}))
+            self.assertEqual(sorted(os.listdir(self.root)), ["postgres.py"])
+
+            # The connection stays usable after a rejected download
+            self.assertEqual(self.downloader.fetch(server.url("/postgres/postgres.py"), path), "downloaded")
+            self.assertEqual(len(server.clients), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
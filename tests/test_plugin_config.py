@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile
+import argparse
+import unittest
+
+import batch_auto
+import plugin_engine
+from plugin_agent import read_config
+
+
+def write_config(path, sections):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("".join(f"[{section}]\n"+"".join(f"{name}={value}\n" for name, value in options.items()) for section, options in sections.items()))
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def config_sections(path):
+    config=read_config(path)
+    return dict((section, dict(config[section])) for section in config.sections())
+
+
+class MergePluginConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-config-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.staged=os.path.join(self.root, "temp", "plugin.cfg")
+        self.installed=os.path.join(self.root, "installed", "plugin.cfg")
+
+    def merge(self, installed, staged):
+        write_config(self.installed, installed)
+        write_config(self.staged, staged)
+        self.assertTrue(plugin_engine.merge_plugin_config(self.staged, self.installed))
+        return config_sections(self.staged)
+
+    def test_existing_sections_are_kept(self):
+        merged=self.merge(
+            {"primary": {"host": "db1", "port": "5432"}, "replica": {"host": "db2", "port": "5432"}},
+            {"replica": {"host": "db3", "port": "5433"}, "reporting": {"host": "db4", "port": "5432"}},
+        )
+        self.assertEqual(merged, {
+            "primary": {"host": "db1", "port": "5432"},
+            "replica": {"host": "db3", "port": "5433"},
+            "reporting": {"host": "db4", "port": "5432"},
+        })
+        self.assertEqual(list(config_sections(self.installed)), ["primary", "replica"])
+
+    def test_no_installed_config(self):
+        write_config(self.staged, {"primary": {"host": "db1"}})
+        before=read_file(self.staged)
+        self.assertTrue(plugin_engine.merge_plugin_config(self.staged, self.installed))
+        self.assertEqual(read_file(self.staged), before)
+
+    def test_option_names_keep_their_case(self):
+        merged=self.merge({"ORCL_a": {"oracle_home": "/u01", "SID": "ORCL"}}, {"ORCL_b": {"SID": "TEST"}})
+        self.assertEqual(merged["ORCL_a"], {"oracle_home": "/u01", "SID": "ORCL"})
+
+    def test_legacy_section_of_the_same_endpoint_is_replaced(self):
+        merged=self.merge(
+            {"ORCL": {"hostname": "db1", "port": "1521", "sid": "ORCL", "password": "old"}},
+            {"ORCL_db1_1521_ORCL": {"hostname": "db1", "port": "1521", "sid": "ORCL", "password": "new"}},
+        )
+        self.assertEqual(merged, {"ORCL": {"hostname": "db1", "port": "1521", "sid": "ORCL", "password": "new"}})
+
+    def test_other_databases_of_the_listener_are_kept(self):
+        merged=self.merge(
+            {"ORCL": {"hostname": "db1", "port": "1521", "sid": "ORCL"}},
+            {"ORCL_db1_1521_TEST": {"hostname": "db1", "port": "1521", "sid": "TEST"}},
+        )
+        self.assertEqual(list(merged), ["ORCL", "ORCL_db1_1521_TEST"])
+
+    def test_reinstall_under_another_name_keeps_one_section(self):
+        merged=self.merge(
+            {"postgres-1": {"host": "db1", "port": "5432"}, "postgres-2": {"host": "db2", "port": "5432"}},
+            {"postgres_db2_5432": {"host": "db2", "port": "5432", "db": "app"}},
+        )
+        self.assertEqual(merged, {"postgres-1": {"host": "db1", "port": "5432"}, "postgres-2": {"host": "db2", "port": "5432", "db": "app"}})
+
+    def test_duplicate_sections_of_an_endpoint_collapse(self):
+        merged=self.merge(
+            {"postgres-1": {"host": "db1", "port": "5432"}, "postgres_db1_5432": {"host": "db1", "port": "5432"}},
+            {"postgres_db1_5432": {"host": "db1", "port": "5432", "db": "app"}},
+        )
+        self.assertEqual(merged, {"postgres_db1_5432": {"host": "db1", "port": "5432", "db": "app"}})
+
+    def test_sections_without_an_endpoint_merge_by_name(self):
+        merged=self.merge({"mysql": {"user": "a"}, "other": {"user": "b"}}, {"mysql": {"user": "c"}})
+        self.assertEqual(merged, {"mysql": {"user": "c"}, "other": {"user": "b"}})
+
+
+class RollbackConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-config-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.agent_plugin_path=os.path.join(self.root, "monagent", "plugins", "")
+        os.makedirs(self.agent_plugin_path)
+        self.temp=os.path.join(self.root, "monagent", "temp", "plugins", "")
+
+    def install(self, sections):
+        write_config(self.temp+"postgres/postgres.cfg", sections)
+        with open(self.temp+"postgres/postgres.py", "w") as f:
+            f.write("print('{}')\n")
+        self.assertTrue(plugin_engine.move_plugin("postgres", self.temp, self.agent_plugin_path))
+
+    def test_rollback_keeps_the_instances_added_since(self):
+        self.install({"postgres_db1_5432": {"host": "db1", "port": "5432"}})
+        self.install({"postgres_db2_5432": {"host": "db2", "port": "5432"}})
+        self.assertTrue(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres"))
+        self.assertEqual(list(config_sections(self.agent_plugin_path+"postgres/postgres.cfg")), ["postgres_db1_5432", "postgres_db2_5432"])
+
+        self.install({"postgres_db3_5432": {"host": "db3", "port": "5432"}})
+        self.assertEqual(list(config_sections(self.agent_plugin_path+"postgres/postgres.cfg")), ["postgres_db1_5432", "postgres_db2_5432", "postgres_db3_5432"])
+
+    def test_rollback_without_versions(self):
+        self.assertFalse(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres"))
+
+
+class BatchInstanceNameTest(unittest.TestCase):
+
+    def test_instances_are_named_after_the_endpoint(self):
+        targets=batch_auto.build_targets({"targets": [
+            {"backend": "postgres", "superuser": "s", "superpass": "s", "password": "p", "host": "db1"},
+            {"backend": "postgres", "superuser": "s", "superpass": "s", "password": "p", "host": "db2", "instance": "reporting"},
+        ]})
+        self.assertEqual([target.name for target in targets], ["postgres-1", "postgres-2"])
+        self.assertEqual([target.backend.instance_name(target.args) for target in targets], ["postgres_db1_5432", "reporting"])
+
+    def test_oracle_instances_include_the_sid(self):
+        backend=plugin_engine.load_backend("oracle")
+        args=argparse.Namespace(instance=None, hostname="db1", port="1521", sid="ORCL")
+        self.assertEqual(backend.instance_name(args), "ORCL_db1_1521_ORCL")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_downloader
+from http_stub import FileServer
+
+
+FILES={
+    "/postgres/postgres.py": b"print('{}')\n"*100,
+    "/postgres/postgres.cfg": b"[postgres]\nhost=localhost\n",
+    "/mongoDB/modules/helper.py": b"VALUE=1\n",
+}
+
+
+class DownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-downloader-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.downloader=plugin_downloader.Downloader()
+        self.addCleanup(self.downloader.close)
+        for patcher in (mock.patch.dict(os.environ, {"no_proxy": "127.0.0.1", "NO_PROXY": "127.0.0.1"}), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def read(self, filename):
+        with open(os.path.join(self.root, filename), "rb") as f:
+            return f.read()
+
+    def test_one_connection_serves_every_file(self):
+        with FileServer(FILES) as server:
+            for path in FILES:
+                self.assertEqual(self.downloader.fetch(server.url(path), os.path.join(self.root, path.split("/")[-1])), "downloaded")
+            self.assertEqual(len(server.clients), 1)
+        for path, data in FILES.items():
+            self.assertEqual(self.read(path.split("/")[-1]), data)
+
+    def test_fetch_all_downloads_concurrently(self):
+        with FileServer(FILES) as server:
+            downloads=[(server.url(path), os.path.join(self.root, path.split("/")[-1])) for path in FILES]
+            results=self.downloader.fetch_all(downloads)
+        self.assertEqual([status for url, status in results], ["downloaded"]*len(FILES))
+        self.assertEqual([url for url, status in results], [url for url, full_path in downloads])
+
+    def test_gzip_responses_are_decoded(self):
+        with FileServer(FILES, compress=True) as server:
+            self.assertEqual(self.downloader.fetch(server.url("/postgres/postgres.py"), os.path.join(self.root, "postgres.py")), "downloaded")
+            self.assertEqual(server.requests[0][1].get("Accept-Encoding"), "gzip")
+        self.assertEqual(self.read("postgres.py"), FILES["/postgres/postgres.py"])
+
+    def test_redirects_are_followed(self):
+        with FileServer(FILES) as server:
+            server.redirects["/old/postgres.py"]="/postgres/postgres.py"
+            self.assertEqual(self.downloader.fetch(server.url("/old/postgres.py"), os.path.join(self.root, "postgres.py")), "downloaded")
+            self.assertEqual(server.paths(), ["/old/postgres.py", "/postgres/postgres.py"])
+
+    def test_redirect_loop_fails(self):
+        with FileServer(FILES) as server:
+            server.redirects["/loop"]="/loop"
+            self.assertFalse(self.downloader.fetch(server.url("/loop"), os.path.join(self.root, "loop")))
+            self.assertEqual(len(server.requests), plugin_downloader.MAX_REDIRECTS+1)
+
+    def test_missing_file_fails_without_a_partial_file(self):
+        with FileServer(FILES) as server:
+            self.assertFalse(plugin_downloader.download_files([(server.url("/postgres/missing.py"), os.path.join(self.root, "missing.py"))], downloader=self.downloader))
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_request_returns_the_body_and_status(self):
+        with FileServer(FILES) as server:
+            status, headers, body=self.downloader.request(server.url("/postgres/postgres.cfg"))
+            self.assertEqual((status, body), (200, FILES["/postgres/postgres.cfg"]))
+            status, headers, body=self.downloader.request(server.url("/postgres/postgres.cfg"), {"If-None-Match": server.etag("/postgres/postgres.cfg")})
+            self.assertEqual((status, body), (304, b""))
+            with self.assertRaises(plugin_downloader.DownloadError):
+                self.downloader.read(server.url("/missing"))
+
+    def test_unsupported_scheme(self):
+        self.assertFalse(self.downloader.fetch("ftp://example.com/postgres.py", os.path.join(self.root, "postgres.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import stat
+import errno
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_engine
+
+
+def write_file(path, text, mode=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+    if mode is not None:
+        os.chmod(path, mode)
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+class PluginFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-files-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.agent_plugin_path=os.path.join(self.root, "monagent", "plugins", "")
+        os.makedirs(self.agent_plugin_path)
+
+    def staged_plugin(self, base, name="postgres"):
+        plugin_dir=os.path.join(base, name)
+        write_file(os.path.join(plugin_dir, name+".py"), "#! /usr/bin/python3\nprint('{}')\n", 0o755)
+        write_file(os.path.join(plugin_dir, "lib", "helper.py"), "VALUE=1\n", 0o644)
+        os.symlink(name+".py", os.path.join(plugin_dir, "entry.py"))
+        return plugin_dir
+
+    def assert_moved(self, source, destination):
+        self.assertFalse(os.path.exists(source))
+        self.assertEqual(read_file(os.path.join(destination, "postgres.py")), "#! /usr/bin/python3\nprint('{}')\n")
+        self.assertEqual(read_file(os.path.join(destination, "lib", "helper.py")), "VALUE=1\n")
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.join(destination, "postgres.py")).st_mode), 0o755)
+        self.assertEqual(os.readlink(os.path.join(destination, "entry.py")), "postgres.py")
+        leftovers=[name for name in os.listdir(os.path.dirname(destination)) if name.endswith(".tmp")]
+        self.assertEqual(leftovers, [])
+
+
+class MoveFolderTest(PluginFilesTest):
+
+    def test_same_device_rename(self):
+        source=self.staged_plugin(os.path.join(self.root, "temp"))
+        destination=os.path.join(self.root, "moved")
+        self.assertTrue(plugin_engine.move_folder(source, destination))
+        self.assert_moved(source, destination)
+
+    def test_cross_device_copy(self):
+        source=self.staged_plugin(os.path.join(self.root, "temp"))
+        destination=os.path.join(self.root, "moved")
+        rename=os.rename
+
+        def cross_device_rename(src, dst):
+            if src==source:
+                raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+            return rename(src, dst)
+
+        with mock.patch.object(plugin_engine.os, "rename", side_effect=cross_device_rename):
+            self.assertTrue(plugin_engine.move_folder(source, destination))
+        self.assert_moved(source, destination)
+
+    def test_cross_device_copy_failure_leaves_no_partial_plugin(self):
+        source=self.staged_plugin(os.path.join(self.root, "temp"))
+        destination=os.path.join(self.root, "moved")
+        with mock.patch.object(plugin_engine.os, "rename", side_effect=OSError(errno.EXDEV, os.strerror(errno.EXDEV))):
+            with mock.patch.object(plugin_engine, "copy_file", side_effect=OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))):
+                self.assertFalse(plugin_engine.move_folder(source, destination))
+        self.assertFalse(os.path.exists(destination))
+        self.assertEqual([name for name in os.listdir(self.root) if name.endswith(".tmp")], [])
+        self.assertTrue(os.path.isfile(os.path.join(source, "postgres.py")))
+
+    def test_other_rename_errors_fail(self):
+        with mock.patch("builtins.print"):
+            self.assertFalse(plugin_engine.move_folder(os.path.join(self.root, "missing"), os.path.join(self.root, "moved")))
+
+    def test_copy_falls_back_to_sendfile(self):
+        source=os.path.join(self.root, "source.bin")
+        destination=os.path.join(self.root, "destination.bin")
+        data=os.urandom(3*1024*1024+17)
+        with open(source, "wb") as f:
+            f.write(data)
+        os.utime(source, ns=(1000000000, 2000000000))
+        with mock.patch.object(plugin_engine.os, "copy_file_range", side_effect=OSError(errno.EXDEV, os.strerror(errno.EXDEV)), create=True):
+            plugin_engine.copy_file(source, destination)
+        with open(destination, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.stat(destination).st_mtime_ns, 2000000000)
+
+    # The agent's temp directory is often a tmpfs while the plugins directory is on disk
+    def test_tmpfs_to_disk(self):
+        tmpfs="/dev/shm"
+        if not os.path.isdir(tmpfs) or not os.access(tmpfs, os.W_OK) or os.stat(tmpfs).st_dev==os.stat(self.root).st_dev:
+            self.skipTest(f"{tmpfs} is not a separate writable filesystem")
+        temp=tempfile.mkdtemp(dir=tmpfs, prefix="plugin-files-")
+        self.addCleanup(shutil.rmtree, temp, ignore_errors=True)
+        source=self.staged_plugin(temp)
+        destination=os.path.join(self.root, "moved")
+        self.assertTrue(plugin_engine.move_folder(source, destination))
+        self.assert_moved(source, destination)
+
+
+if __name__ == "__main__":
+    unittest.main()
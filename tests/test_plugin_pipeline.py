@@ -0,0 +1,92 @@
+import threading
+import unittest
+from unittest import mock
+
+import plugin_metrics
+import plugin_pipeline
+from plugin_pipeline import Step
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics=plugin_metrics.InstallMetrics("db1", "postgres")
+        self.ran=[]
+        self.lock=threading.Lock()
+        patcher=mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def step(self, name, after=(), status=True, wait=None):
+        def run():
+            if wait:
+                wait()
+            with self.lock:
+                self.ran.append(name)
+            if isinstance(status, Exception):
+                raise status
+            return status
+        return Step(name, run, after)
+
+    def test_dependencies_run_first(self):
+        steps=[self.step("config", ("download", "shebang")), self.step("shebang", ("download", )), self.step("download")]
+        self.assertTrue(plugin_pipeline.run(steps, self.metrics))
+        self.assertEqual(self.ran, ["download", "shebang", "config"])
+        self.assertEqual([step["step"] for step in self.metrics.steps], ["download", "shebang", "config"])
+
+    def test_independent_steps_overlap(self):
+        # Both steps wait for each other, so the graph only finishes when they run at the same time
+        barrier=threading.Barrier(2, timeout=5)
+        steps=[self.step("driver", wait=barrier.wait), self.step("user", wait=barrier.wait), self.step("validate", ("driver", "user"))]
+        self.assertTrue(plugin_pipeline.run(steps, self.metrics))
+        self.assertEqual(sorted(self.ran[:2]), ["driver", "user"])
+        self.assertEqual(self.ran[2], "validate")
+
+    def test_failure_stops_the_dependents(self):
+        steps=[self.step("download", status=False), self.step("shebang", ("download", )), self.step("config", ("shebang", ))]
+        self.assertFalse(plugin_pipeline.run(steps, self.metrics))
+        self.assertEqual(self.ran, ["download"])
+        self.assertEqual(self.metrics.failed_step, "download")
+
+    def test_exception_fails_the_step(self):
+        steps=[self.step("driver", status=OSError("pip failed")), self.step("validate", ("driver", ))]
+        self.assertFalse(plugin_pipeline.run(steps, self.metrics))
+        self.assertEqual(self.ran, ["driver"])
+        self.assertEqual(self.metrics.failed_step, "driver")
+
+    def test_running_steps_finish_after_a_failure(self):
+        # The driver step only returns once the user step has failed
+        release=threading.Event()
+        completed=[]
+
+        def fail_then_release():
+            release.set()
+            return False
+
+        steps=[self.step("driver", wait=lambda: release.wait(5)), Step("user", fail_then_release, ()), self.step("validate", ("driver", "user"))]
+        self.assertFalse(plugin_pipeline.run(steps, self.metrics, on_complete=completed.append))
+        self.assertEqual(completed, ["driver"])
+        self.assertNotIn("validate", self.ran)
+        self.assertEqual(self.metrics.failed_step, "user")
+
+    def test_completed_steps_are_skipped(self):
+        completed=[]
+        steps=[self.step("user"), self.step("download"), self.step("shebang", ("download", )), self.step("validate", ("user", "shebang"))]
+        self.assertTrue(plugin_pipeline.run(steps, self.metrics, completed={"user", "download"}, on_complete=completed.append))
+        self.assertEqual(self.ran, ["shebang", "validate"])
+        self.assertEqual(completed, ["shebang", "validate"])
+
+    def test_cycle_fails_without_running(self):
+        steps=[self.step("download"), self.step("shebang", ("config", )), self.step("config", ("shebang", ))]
+        self.assertFalse(plugin_pipeline.run(steps, self.metrics))
+        self.assertEqual(self.ran, ["download"])
+        self.assertEqual(self.metrics.failed_step, "shebang")
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            plugin_pipeline.run([self.step("shebang", ("download", ))], self.metrics)
+        self.assertEqual(self.ran, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
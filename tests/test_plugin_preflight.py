@@ -0,0 +1,131 @@
+import os
+import time
+import json
+import socket
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_engine
+import plugin_preflight
+
+
+def closed_port():
+    sock=socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port=sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class ChecksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-preflight-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.listener=socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.addCleanup(self.listener.close)
+
+    def test_tcp(self):
+        self.assertEqual(plugin_preflight.check_tcp("127.0.0.1", self.listener.getsockname()[1]), [])
+        problems=plugin_preflight.check_tcp("127.0.0.1", closed_port())
+        self.assertEqual(len(problems), 1)
+        self.assertIn("is not reachable", problems[0])
+
+    def test_agent_directories(self):
+        agent_path=os.path.join(self.root, "")
+        self.assertEqual(len(plugin_preflight.check_agent(agent_path)), 2)
+        os.makedirs(agent_path+"temp")
+        os.makedirs(agent_path+"plugins")
+        self.assertEqual(plugin_preflight.check_agent(agent_path), [])
+        if os.geteuid()!=0:
+            os.chmod(agent_path+"plugins", 0o500)
+            self.addCleanup(os.chmod, agent_path+"plugins", 0o700)
+            self.assertEqual(plugin_preflight.check_agent(agent_path), [f"{agent_path}plugins/ is not writable"])
+
+    def test_disk(self):
+        self.assertEqual(plugin_preflight.check_disk(self.root, 0), [])
+        self.assertIn("MB free under", plugin_preflight.check_disk(self.root, 1024**4)[0])
+        self.assertEqual(plugin_preflight.check_disk(os.path.join(self.root, "missing"), 1024**4), [])
+
+    def test_checks_run_in_parallel(self):
+        def slow(problem):
+            time.sleep(0.3)
+            return [problem] if problem else []
+
+        start=time.monotonic()
+        results=plugin_preflight.run_checks({key: (slow, key) for key in ("", "a", "b", "c")}, timeout=2)
+        self.assertLess(time.monotonic()-start, 1)
+        self.assertEqual(results, {"": [], "a": ["a"], "b": ["b"], "c": ["c"]})
+
+    def test_stuck_check_times_out(self):
+        start=time.monotonic()
+        results=plugin_preflight.run_checks({"stuck": (time.sleep, 5), "fine": (list, ()), "broken": (int, "x")}, timeout=0.1)
+        self.assertLess(time.monotonic()-start, 2)
+        self.assertEqual(results["stuck"], ["no answer within 0.1s"])
+        self.assertEqual(results["fine"], [])
+        self.assertEqual(len(results["broken"]), 1)
+
+
+class EnginePreflightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-preflight-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.root, "temp"))
+        os.makedirs(os.path.join(self.root, "plugins"))
+        self.listener=socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.addCleanup(self.listener.close)
+        self.engine=plugin_engine.Engine(agent_path=self.root, offline=True, preflight_timeout=0.5)
+        self.addCleanup(self.engine.close)
+        for patcher in (mock.patch.object(plugin_engine.Engine, "check_driver", return_value=[]), mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def target(self, name, port):
+        backend=plugin_engine.load_backend("postgres")
+        args, missing=backend.build_args({"superuser": "s", "superpass": "s", "password": "p", "host": "127.0.0.1", "port": str(port)})
+        return plugin_engine.Target(name, backend, args)
+
+    def test_verdict_per_target(self):
+        up=self.target("db1", self.listener.getsockname()[1])
+        down=self.target("db2", closed_port())
+        verdict=self.engine.preflight([up, down])
+        self.assertEqual(verdict["db1"], [])
+        self.assertEqual(len(verdict["db2"]), 1)
+        self.assertIn("is not reachable", verdict["db2"][0])
+
+    def test_install_all_drops_the_failed_targets(self):
+        up=self.target("db1", self.listener.getsockname()[1])
+        down=self.target("db2", closed_port())
+        installed=[]
+
+        def install(engine, target, temp_subdir=None):
+            installed.append(target.name)
+            return True
+
+        with mock.patch.object(plugin_engine.Engine, "install", autospec=True, side_effect=install):
+            results=self.engine.install_all([up, down])
+        self.assertEqual(installed, ["db1"])
+        self.assertTrue(results["db1"][0])
+        self.assertEqual(results["db2"], (False, 0.0))
+        with open(os.path.join(self.root, "temp", plugin_engine.INSTALL_METRICS_FILE)) as f:
+            installs=json.load(f)["targets"]
+        self.assertEqual([(install["target"], install["failed_step"]) for install in installs], [("db2", "preflight")])
+
+    def test_skip_preflight(self):
+        self.engine.skip_preflight=True
+        with mock.patch.object(plugin_engine.Engine, "preflight") as preflight, \
+                mock.patch.object(plugin_engine.Engine, "install", return_value=True):
+            results=self.engine.install_all([self.target("db2", closed_port())])
+        preflight.assert_not_called()
+        self.assertTrue(results["db2"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+import plugin_engine
+
+
+BODY=b"import json\nprint(json.dumps({}))\n"
+
+
+class SetShebangTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-shebang-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.plugin_file=os.path.join(self.root, "postgres.py")
+
+    def write(self, data, mode=0o644):
+        with open(self.plugin_file, "wb") as f:
+            f.write(data)
+        os.chmod(self.plugin_file, mode)
+        return os.stat(self.plugin_file)
+
+    def read(self):
+        with open(self.plugin_file, "rb") as f:
+            return f.read()
+
+    def test_matching_interpreter_is_left_alone(self):
+        before=self.write(b"#!/usr/bin/python3\n"+BODY)
+        os.utime(self.plugin_file, ns=(0, 0))
+        self.assertTrue(plugin_engine.set_shebang(self.plugin_file, "/usr/bin/python3"))
+        self.assertEqual(self.read(), b"#!/usr/bin/python3\n"+BODY)
+        self.assertEqual(os.stat(self.plugin_file).st_mtime_ns, 0)
+        self.assertEqual(os.stat(self.plugin_file).st_ino, before.st_ino)
+
+    def test_line_of_the_same_length_is_patched_in_place(self):
+        before=self.write(b"#!/usr/bin/python9\n"+BODY)
+        self.assertTrue(plugin_engine.set_shebang(self.plugin_file, "/usr/bin/python3"))
+        self.assertEqual(self.read(), b"#!/usr/bin/python3\n"+BODY)
+        self.assertEqual(os.stat(self.plugin_file).st_ino, before.st_ino)
+
+    def test_shorter_interpreter_is_padded_in_place(self):
+        before=self.write(b"#!/usr/bin/env python3\n"+BODY)
+        self.assertTrue(plugin_engine.set_shebang(self.plugin_file, "/usr/bin/python3"))
+        self.assertEqual(plugin_engine.plugin_interpreter(self.plugin_file), "/usr/bin/python3")
+        self.assertEqual(len(self.read()), len(b"#!/usr/bin/env python3\n"+BODY))
+        self.assertEqual(plugin_engine.plugin_body(self.plugin_file), BODY)
+        self.assertEqual(os.stat(self.plugin_file).st_ino, before.st_ino)
+
+    def test_longer_interpreter_rewrites_the_file(self):
+        self.write(b"#!/usr/bin/python3\n"+BODY, 0o750)
+        self.assertTrue(plugin_engine.set_shebang(self.plugin_file, "/opt/site24x7/venv/bin/python3"))
+        self.assertEqual(self.read(), b"#!/opt/site24x7/venv/bin/python3\n"+BODY)
+        self.assertEqual(stat.S_IMODE(os.stat(self.plugin_file).st_mode), 0o750)
+        self.assertEqual([name for name in os.listdir(self.root) if name.endswith(".tmp")], [])
+
+    def test_missing_shebang_is_added(self):
+        self.write(BODY)
+        self.assertTrue(plugin_engine.set_shebang(self.plugin_file, "/usr/bin/python3"))
+        self.assertEqual(self.read(), b"#!/usr/bin/python3\n"+BODY)
+
+    def test_missing_file_fails(self):
+        self.assertFalse(plugin_engine.set_shebang(os.path.join(self.root, "missing.py")))
+
+    def test_make_executable(self):
+        self.write(BODY)
+        self.assertTrue(plugin_engine.make_executable(self.plugin_file))
+        self.assertEqual(stat.S_IMODE(os.stat(self.plugin_file).st_mode), plugin_engine.PLUGIN_MODE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_state
+import plugin_engine
+
+
+FILE_STEPS=("download", "shebang", "config")
+
+
+class InstallStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-state-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path=os.path.join(self.root, "plugin_install_state.json")
+        self.plugin_dir=os.path.join(self.root, "postgres")
+        os.makedirs(self.plugin_dir)
+        self.write("postgres.py", "print('{}')\n")
+
+    def write(self, filename, text):
+        with open(os.path.join(self.plugin_dir, filename), "w") as f:
+            f.write(text)
+
+    def checkpoint(self, inputs, *steps):
+        state=plugin_state.InstallState(self.path)
+        self.assertEqual(state.resume("postgres", inputs, plugin_state.files_fingerprint(self.plugin_dir), FILE_STEPS), set())
+        for step in steps:
+            state.complete("postgres", step, plugin_state.files_fingerprint(self.plugin_dir))
+
+    def resume(self, inputs):
+        return plugin_state.InstallState(self.path).resume("postgres", inputs, plugin_state.files_fingerprint(self.plugin_dir), FILE_STEPS)
+
+    def test_resume_after_restart(self):
+        inputs=plugin_state.inputs_hash("postgres", "/usr/bin/python3", False)
+        self.checkpoint(inputs, "driver", "user", "download")
+        self.assertEqual(self.resume(inputs), {"driver", "user", "download"})
+
+    def test_changed_inputs_start_over(self):
+        self.checkpoint(plugin_state.inputs_hash("postgres", "/usr/bin/python3", False), "driver", "user", "download")
+        self.assertEqual(self.resume(plugin_state.inputs_hash("postgres", "/usr/bin/python3.11", False)), set())
+        self.assertEqual(self.resume(plugin_state.inputs_hash("postgres", "/usr/bin/python3", False)), set())
+
+    def test_changed_files_redo_the_file_steps(self):
+        inputs=plugin_state.inputs_hash("postgres")
+        self.checkpoint(inputs, "driver", "user", "download", "shebang")
+        self.write("postgres.py", "print('{\"changed\": 1}')\n")
+        self.assertEqual(self.resume(inputs), {"driver", "user"})
+
+    def test_clear(self):
+        inputs=plugin_state.inputs_hash("postgres")
+        self.checkpoint(inputs, "driver")
+        plugin_state.InstallState(self.path).clear("postgres")
+        self.assertEqual(plugin_state.InstallState(self.path).targets, {})
+
+    def test_unreadable_state_starts_empty(self):
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertEqual(plugin_state.InstallState(self.path).targets, {})
+
+
+class EngineResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-state-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.plugin_dir=os.path.join(self.root, "staged", "postgres", "")
+        os.makedirs(self.plugin_dir)
+        with open(self.plugin_dir+"postgres.py", "w") as f:
+            f.write("print('{}')\n")
+        backend=plugin_engine.load_backend("postgres")
+        args, missing=backend.build_args({"superuser": "s", "superpass": "s", "password": "p", "host": "db1"})
+        self.target=plugin_engine.Target("db1", backend, args)
+        self.state_file=os.path.join(self.root, "plugin_install_state.json")
+        patcher=mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def engine(self, **options):
+        engine=plugin_engine.Engine(agent_path=self.root, **options)
+        self.addCleanup(engine.close)
+        engine.state=plugin_state.InstallState(self.state_file)
+        return engine
+
+    def checkpoint(self, *steps, **options):
+        engine=self.engine(**options)
+        self.assertEqual(engine.resume(self.target, self.plugin_dir), set())
+        for step in steps:
+            engine.state.complete(self.target.name, step, plugin_state.files_fingerprint(self.plugin_dir))
+
+    def test_rerun_skips_the_completed_steps(self):
+        self.checkpoint("user", "download", "shebang", "driver")
+        self.assertEqual(self.engine().resume(self.target, self.plugin_dir), {"user", "download", "shebang"})
+
+    def test_another_interpreter_starts_over(self):
+        self.checkpoint("user", "download", "shebang", interpreter="/bin/false")
+        self.assertEqual(self.engine().resume(self.target, self.plugin_dir), set())
+
+    def test_catalog_choice_starts_over(self):
+        self.checkpoint("user", "download")
+        self.assertEqual(self.engine(no_catalog=True).resume(self.target, self.plugin_dir), set())
+
+    def test_restart_starts_over(self):
+        self.checkpoint("user", "download")
+        self.assertEqual(self.engine(restart=True).resume(self.target, self.plugin_dir), set())
+
+    def test_changed_target_arguments_start_over(self):
+        self.checkpoint("user", "download")
+        self.target.args.password="other"
+        self.assertEqual(self.engine().resume(self.target, self.plugin_dir), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
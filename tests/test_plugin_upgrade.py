@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+import plugin_agent
+import plugin_engine
+import plugin_catalog
+import plugin_downloader
+from http_stub import FileServer
+
+
+PLUGIN=b"import json\nprint(json.dumps({'plugin_version': 1, 'heartbeat_required': 'true'}))\n"
+HELPER=b"VALUE=1\n"
+CONFIG="[postgres_db1_5432]\nhost = db1\nport = 5432\n"
+
+
+class UpgradeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-upgrade-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.root, "temp"))
+        self.installed=os.path.join(self.root, "plugins", "postgres", "")
+        os.makedirs(self.installed+"modules")
+        self.write(self.installed+"postgres.py", f"#!{sys.executable}\n".encode()+PLUGIN, 0o755)
+        self.write(self.installed+"modules/helper.py", HELPER)
+        self.write(self.installed+"postgres.cfg", CONFIG.encode())
+
+        self.server=FileServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        for patcher in (mock.patch.object(plugin_catalog, "RAW_URL", self.server.url("/")), mock.patch("builtins.print"),
+                        mock.patch.dict(os.environ, {"no_proxy": "127.0.0.1", "NO_PROXY": "127.0.0.1"})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.downloader=plugin_downloader.Downloader()
+        self.addCleanup(self.downloader.close)
+        self.publish({"postgres.py": PLUGIN, "postgres.cfg": b"[postgres]\nhost = localhost\n", "modules/helper.py": HELPER})
+
+    def write(self, path, data, mode=0o644):
+        with open(path, "wb") as f:
+            f.write(data)
+        os.chmod(path, mode)
+
+    def read(self, path):
+        with open(self.installed+path, "rb") as f:
+            return f.read()
+
+    # The upstream files go on the stub server and into a catalog as the trees API would have listed them
+    def publish(self, files):
+        self.server.files=dict((f"/site24x7/plugins/master/postgres/{path}", data) for path, data in files.items())
+        entries=sorted([path, len(data), self.sha(data)] for path, data in files.items())
+        tree=hashlib.sha1(json.dumps(entries).encode()).hexdigest()
+        self.catalog_data={
+            "format": plugin_catalog.CATALOG_FORMAT, "repository": plugin_catalog.REPOSITORY, "ref": plugin_catalog.REF,
+            "tree": "root", "checked": time.time(), "directories": {"postgres": tree},
+            "plugins": {"postgres": {"tree": tree, "files": entries}},
+        }
+
+    def sha(self, data):
+        path=os.path.join(self.root, "blob")
+        self.write(path, data)
+        return plugin_catalog.blob_sha(path)
+
+    def upgrade(self, check=False):
+        engine=plugin_engine.Engine(agent_path=self.root, downloader=self.downloader)
+        self.addCleanup(engine.close)
+        self.assertTrue(engine.prepare())
+        engine.catalog=plugin_catalog.Catalog(os.path.join(self.root, "catalog.json.gz"), downloader=self.downloader)
+        engine.catalog.data=self.catalog_data
+        requests=len(self.server.requests)
+        status, seconds=engine.upgrade_all(["postgres"], check)["postgres"]
+        return status, [path.rsplit("/postgres/", 1)[1] for path in self.server.paths()[requests:]]
+
+    def test_unrecorded_install_only_records_the_hashes(self):
+        self.assertEqual(self.upgrade(), (True, ["postgres.py"]))
+        self.assertFalse(os.path.islink(self.installed.rstrip("/")))
+        self.assertEqual(plugin_catalog.read_upstream(self.installed, "postgres")["modules/helper.py"], self.sha(HELPER))
+        self.assertEqual(self.upgrade(), (True, []))
+
+    def test_only_changed_files_are_downloaded(self):
+        self.upgrade()
+        self.publish({"postgres.py": PLUGIN, "postgres.cfg": b"[postgres]\n", "modules/helper.py": b"VALUE=2\n"})
+        self.assertEqual(self.upgrade(), (True, ["modules/helper.py"]))
+        self.assertTrue(os.path.islink(self.installed.rstrip("/")))
+        self.assertEqual(self.read("modules/helper.py"), b"VALUE=2\n")
+        config=plugin_agent.read_config(self.installed+"postgres.cfg")
+        self.assertEqual([(section, dict(config[section])) for section in config.sections()], [("postgres_db1_5432", {"host": "db1", "port": "5432"})])
+        self.assertEqual(self.read("postgres.py"), f"#!{sys.executable}\n".encode()+PLUGIN)
+        self.assertEqual(self.upgrade(), (True, []))
+
+    def test_removed_upstream_files_are_removed(self):
+        self.upgrade()
+        self.publish({"postgres.py": PLUGIN, "postgres.cfg": b"[postgres]\n"})
+        self.assertEqual(self.upgrade(), (True, []))
+        self.assertFalse(os.path.exists(self.installed+"modules/helper.py"))
+
+    def test_check_only_reports(self):
+        self.upgrade()
+        self.publish({"postgres.py": PLUGIN, "postgres.cfg": b"[postgres]\n", "modules/helper.py": b"VALUE=2\n"})
+        self.assertEqual(self.upgrade(check=True), (True, []))
+        self.assertEqual(self.read("modules/helper.py"), HELPER)
+
+    def test_broken_upgrade_keeps_the_installed_version(self):
+        self.upgrade()
+        self.publish({"postgres.py": b"import sys\nsys.exit(1)\n", "postgres.cfg": b"[postgres]\n", "modules/helper.py": HELPER})
+        self.assertEqual(self.upgrade(), (False, ["postgres.py"]))
+        self.assertFalse(os.path.islink(self.installed.rstrip("/")))
+        self.assertEqual(self.read("postgres.py"), f"#!{sys.executable}\n".encode()+PLUGIN)
+
+    def test_metrics_are_kept_apart_from_the_install_metrics(self):
+        self.upgrade()
+        temp=os.path.join(self.root, "temp")
+        self.assertFalse(os.path.exists(os.path.join(temp, plugin_engine.INSTALL_METRICS_FILE)))
+        with open(os.path.join(temp, plugin_engine.UPGRADE_METRICS_FILE)) as f:
+            targets=json.load(f)["targets"]
+        self.assertEqual([(target["target"], target["backend"], target["status"]) for target in targets], [("postgres", "upgrade", "success")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import plugin_validation
+
+
+PLUGIN="""#!/usr/bin/python3
+import json
+import argparse
+
+
+class Postgres:
+
+    def __init__(self, args):
+        self.host=args.host
+        self.port=args.port
+
+    def metricCollector(self):
+        return {"host": self.host, "port": self.port, "plugin_version": 1}
+
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser()
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+{parse}
+    print(json.dumps(Postgres(args).metricCollector()))
+"""
+
+PARSE="""    args=parser.parse_args()"""
+
+# Plugins that report a parse failure as their result instead of exiting
+GUARDED_PARSE="""    try:
+        args=parser.parse_args()
+    except Exception as e:
+        print(json.dumps({"status": 0, "msg": str(e)}))
+        raise SystemExit(0)"""
+
+
+class CollectInProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-validation-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def write_plugin(self, parse):
+        plugin_file=os.path.join(self.root, "postgres.py")
+        with open(plugin_file, "w") as f:
+            f.write(PLUGIN.replace("{parse}", parse))
+        return plugin_file
+
+    def test_collects_with_the_given_arguments(self):
+        result=plugin_validation.collect_in_process(self.write_plugin(PARSE), ["--host=db1", "--port=5433"], 10)
+        self.assertEqual(result, {"host": "db1", "port": 5433, "plugin_version": 1})
+
+    def test_broad_except_around_parse_args(self):
+        result=plugin_validation.collect_in_process(self.write_plugin(GUARDED_PARSE), ["--host=db1"], 10)
+        self.assertEqual(result, {"host": "db1", "port": 5432, "plugin_version": 1})
+
+    def test_plugin_without_argparse_is_unsupported(self):
+        plugin_file=os.path.join(self.root, "plain.py")
+        with open(plugin_file, "w") as f:
+            f.write("print('{}')\n")
+        with self.assertRaises(plugin_validation.UnsupportedPlugin):
+            plugin_validation.collect_in_process(plugin_file, [], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import plugin_engine
+from plugin_agent import read_config, list_versions, current_version, versions_path
+
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def write_config(path, sections):
+    write_file(path, "".join(f"[{section}]\n"+"".join(f"{name}={value}\n" for name, value in options.items()) for section, options in sections.items()))
+
+
+def config_sections(path):
+    config=read_config(path)
+    return dict((section, dict(config[section])) for section in config.sections())
+
+
+class VersionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root=tempfile.mkdtemp(prefix="plugin-versions-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.agent_plugin_path=os.path.join(self.root, "monagent", "plugins", "")
+        os.makedirs(self.agent_plugin_path)
+
+    def make_versions(self, *versions):
+        for version in versions:
+            write_file(versions_path(self.agent_plugin_path, "postgres")+version+"/postgres.py", version+"\n")
+
+    def test_symlink_swap(self):
+        self.make_versions("20260101-000000.000000-aaaa", "20260102-000000.000000-bbbb")
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", "20260101-000000.000000-aaaa")
+        link=self.agent_plugin_path+"postgres"
+        self.assertTrue(os.path.islink(link))
+        self.assertFalse(os.path.isabs(os.readlink(link)))
+        self.assertEqual(read_file(link+"/postgres.py"), "20260101-000000.000000-aaaa\n")
+
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", "20260102-000000.000000-bbbb")
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260102-000000.000000-bbbb")
+        self.assertEqual(read_file(link+"/postgres.py"), "20260102-000000.000000-bbbb\n")
+        self.assertEqual(os.listdir(self.agent_plugin_path), ["postgres"])
+
+    def test_rollback_to_previous_version(self):
+        self.make_versions("20260101-000000.000000-aaaa", "20260102-000000.000000-bbbb", "20260103-000000.000000-cccc")
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", "20260103-000000.000000-cccc")
+        self.assertTrue(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260102-000000.000000-bbbb")
+        self.assertTrue(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260101-000000.000000-aaaa")
+
+    def test_rollback_without_earlier_version(self):
+        self.make_versions("20260101-000000.000000-aaaa", "20260102-000000.000000-bbbb")
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", "20260101-000000.000000-aaaa")
+        self.assertFalse(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260101-000000.000000-aaaa")
+
+    def test_rollback_to_given_version(self):
+        self.make_versions("20260101-000000.000000-aaaa", "20260102-000000.000000-bbbb")
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", "20260101-000000.000000-aaaa")
+        self.assertTrue(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres", "20260102-000000.000000-bbbb"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260102-000000.000000-bbbb")
+        self.assertFalse(plugin_engine.rollback_plugin(self.agent_plugin_path, "postgres", "20250101-000000.000000-zzzz"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), "20260102-000000.000000-bbbb")
+
+    def test_prune_keeps_the_replaced_version(self):
+        versions=["20260101-000000.000000-aaaa", "20260102-000000.000000-bbbb", "20260103-000000.000000-cccc", "20260104-000000.000000-dddd"]
+        self.make_versions(*versions)
+        plugin_engine.activate_version(self.agent_plugin_path, "postgres", versions[-1])
+        plugin_engine.prune_versions(self.agent_plugin_path, "postgres", keep=1, replaced=versions[0])
+        self.assertEqual(list_versions(self.agent_plugin_path, "postgres"), [versions[0], versions[2], versions[3]])
+
+    def test_move_plugin_adopts_unversioned_install(self):
+        write_config(self.agent_plugin_path+"postgres/postgres.cfg", {"primary": {"host": "db1"}})
+        write_file(self.agent_plugin_path+"postgres/postgres.py", "old\n")
+        temp=os.path.join(self.root, "temp", "")
+        write_file(temp+"postgres/postgres.py", "new\n")
+        write_config(temp+"postgres/postgres.cfg", {"replica": {"host": "db2"}})
+
+        self.assertTrue(plugin_engine.move_plugin("postgres", temp, self.agent_plugin_path, keep_versions=0))
+        versions=list_versions(self.agent_plugin_path, "postgres")
+        self.assertEqual(len(versions), 2)
+        self.assertTrue(versions[0].endswith("-unversioned"))
+        self.assertEqual(current_version(self.agent_plugin_path, "postgres"), versions[1])
+        self.assertEqual(list(config_sections(self.agent_plugin_path+"postgres/postgres.cfg")), ["primary", "replica"])
+        self.assertEqual(read_file(versions_path(self.agent_plugin_path, "postgres")+versions[0]+"/postgres.py"), "old\n")
+
+
+    def test_versions_sort_in_install_order(self):
+        versions=[plugin_engine.new_version(timestamp) for timestamp in (1700000000.5, 1700000000.25, 1800000000.0)]
+        self.assertEqual(sorted(versions), [versions[1], versions[0], versions[2]])
+        self.assertTrue(plugin_engine.new_version(1700000000.5, "unversioned").startswith("20231114-221320.500000-"))
+
+    def test_move_plugin_keeps_the_newest_versions(self):
+        temp=os.path.join(self.root, "temp", "")
+        for run in range(4):
+            write_file(temp+"postgres/postgres.py", f"{run}\n")
+            self.assertTrue(plugin_engine.move_plugin("postgres", temp, self.agent_plugin_path, keep_versions=2))
+        versions=list_versions(self.agent_plugin_path, "postgres")
+        self.assertEqual([read_file(versions_path(self.agent_plugin_path, "postgres")+version+"/postgres.py") for version in versions], ["1\n", "2\n", "3\n"])
+        self.assertEqual(read_file(self.agent_plugin_path+"postgres/postgres.py"), "3\n")
+
+
+if __name__ == "__main__":
+    unittest.main()